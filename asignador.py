@@ -0,0 +1,380 @@
+from collections import deque
+from contextlib import ExitStack
+import threading
+
+from config import RECURSOS_CONFIG
+
+
+class PoolRecursos:
+    """Pool de recursos direccionados por índice con lista libre y mapa de ocupación"""
+    def __init__(self, prefijo, cantidad, primero=1, por_edificio=None):
+        self.prefijo = prefijo
+        self.cantidad = cantidad
+        # Un fragmento solo administra los índices primero..primero+cantidad-1
+        self.primero = primero
+        self.ultimo = primero + cantidad - 1
+        # Recursos consecutivos por edificio (1..por_edificio en el edificio 0); None sin edificios
+        self.por_edificio = por_edificio
+
+        # Índices libres en orden de entrega (S1, S2, ...). Los que se toman fuera
+        # de turno (`tomar_cercanos`, `ocupar`) quedan en la cola y se descartan
+        # al salir: el mapa de ocupación es el que manda y `num_libres` lleva la cuenta
+        self.libres = deque(range(primero, self.ultimo + 1))
+        self.num_libres = cantidad
+        # Mapa de ocupación indexado por número de recurso desde `primero`
+        self.ocupados = bytearray(cantidad)
+        # Libres de cada edificio, y los edificios agrupados según cuántos libres
+        # tienen (dicts usados como conjuntos ordenados): elegir edificios no recorre el mapa
+        self.libres_edificio = {}
+        self.por_libres = []
+        self._contar_edificios()
+        # Lo toman quienes planifican y toman sobre este pool (ver AsignadorRecursos.bloquear)
+        self.lock = threading.Lock()
+
+    def id_recurso(self, indice):
+        """Convierte un índice en su identificador (p. ej. 3 -> 'S3')"""
+        return f"{self.prefijo}{indice}"
+
+    def indice(self, id_recurso):
+        """Convierte un identificador en su índice, o None si no pertenece al pool"""
+        if not isinstance(id_recurso, str) or not id_recurso.startswith(self.prefijo):
+            return None
+        numero = id_recurso[len(self.prefijo):]
+        if not numero.isdigit():
+            return None
+        indice = int(numero)
+        return indice if self.primero <= indice <= self.ultimo else None
+
+    def disponibles(self):
+        return self.num_libres
+
+    def asignados(self):
+        return self.cantidad - self.num_libres
+
+    def esta_asignado(self, id_recurso):
+        indice = self.indice(id_recurso)
+        return indice is not None and self.ocupados[indice - self.primero] == 1
+
+    def ids_libres(self):
+        """Identificadores libres, en orden de índice; recorre el mapa completo"""
+        return [
+            self.id_recurso(indice) for indice in range(self.primero, self.ultimo + 1)
+            if not self.ocupados[indice - self.primero]
+        ]
+
+    def tomar(self, cantidad):
+        """Toma hasta `cantidad` recursos libres en O(k) amortizado y devuelve sus identificadores"""
+        tomados = []
+        cantidad = min(cantidad, self.num_libres)
+        while len(tomados) < cantidad:
+            indice = self.libres.popleft()
+            if self.ocupados[indice - self.primero]:
+                continue  # tomado fuera de turno
+            self.ocupados[indice - self.primero] = 1
+            self._ajustar_edificio(indice, -1)
+            tomados.append(self.id_recurso(indice))
+        self.num_libres -= cantidad
+        return tomados
+
+    def edificio(self, id_recurso):
+        """Edificio de un recurso del pool, o None"""
+        indice = self.indice(id_recurso)
+        if indice is None or self.por_edificio is None:
+            return None
+        return (indice - 1) // self.por_edificio
+
+    def _rango_edificio(self, edificio):
+        """Posiciones [inicio, fin) del mapa de ocupación que caen en un edificio"""
+        inicio = max(self.primero, edificio * self.por_edificio + 1)
+        fin = min(self.ultimo, (edificio + 1) * self.por_edificio)
+        return inicio - self.primero, fin - self.primero + 1
+
+    def _contar_edificios(self):
+        """Rehace los libres por edificio desde el mapa (al crear o restaurar el pool)"""
+        if self.por_edificio is None:
+            return
+        self.libres_edificio = {
+            edificio: self.ocupados.count(0, *self._rango_edificio(edificio))
+            for edificio in range((self.primero - 1) // self.por_edificio, (self.ultimo - 1) // self.por_edificio + 1)
+        }
+        self.por_libres = [{} for _ in range(self.por_edificio + 1)]
+        for edificio, libres in self.libres_edificio.items():
+            self.por_libres[libres][edificio] = None
+
+    def _ajustar_edificio(self, indice, delta, edificio=None):
+        """Suma `delta` a los libres del edificio de `indice` (o de `edificio`)"""
+        if self.por_edificio is None:
+            return
+        if edificio is None:
+            edificio = (indice - 1) // self.por_edificio
+        libres = self.libres_edificio[edificio]
+        del self.por_libres[libres][edificio]
+        self.libres_edificio[edificio] = libres + delta
+        self.por_libres[libres + delta][edificio] = None
+
+    def libres_por_edificio(self):
+        """Recursos libres de cada edificio del pool"""
+        return dict(self.libres_edificio)
+
+    def _elegir_edificios(self, cantidad, preferidos=None):
+        """Como `elegir_edificios`, sobre los grupos por libres: O(por_edificio) por edificio elegido.
+
+        Entre edificios con los mismos libres elige cualquiera (el que lleva
+        más tiempo con esa cantidad), no necesariamente el de menor número.
+        """
+        reparto = []
+        usados = set()
+        for edificio in preferidos or ():
+            n = min(cantidad, self.libres_edificio.get(edificio, 0))
+            if n > 0 and edificio not in usados:
+                reparto.append((edificio, n))
+                usados.add(edificio)
+                cantidad -= n
+        while cantidad > 0:
+            # El que menos libres tiene entre los que alcanzan; si ninguno, el que más tiene.
+            # Un edificio ya usado quedó sin libres o completó el pedido
+            libres = range(cantidad, self.por_edificio + 1) if cantidad <= self.por_edificio else ()
+            elegido = next((
+                (n, edificio) for n in libres for edificio in self.por_libres[n] if edificio not in usados
+            ), None) or next((
+                (n, edificio) for n in range(min(cantidad, self.por_edificio + 1) - 1, 0, -1)
+                for edificio in self.por_libres[n] if edificio not in usados
+            ), None)
+            if elegido is None:
+                break
+            n, edificio = elegido
+            n = min(n, cantidad)
+            reparto.append((edificio, n))
+            usados.add(edificio)
+            cantidad -= n
+        return reparto
+
+    def tomar_cercanos(self, cantidad, preferidos=None):
+        """Toma hasta `cantidad` recursos agrupados en la menor cantidad de edificios.
+
+        Sin edificios configurados equivale a `tomar`. `preferidos` son los
+        edificios que sugirió el planificador de lote, usados primero.
+        """
+        if self.por_edificio is None:
+            return self.tomar(cantidad)
+        tomados = []
+        for edificio, n in self._elegir_edificios(cantidad, preferidos):
+            inicio, fin = self._rango_edificio(edificio)
+            for _ in range(n):
+                posicion = self.ocupados.find(0, inicio, fin)
+                self.ocupados[posicion] = 1
+                tomados.append(self.id_recurso(posicion + self.primero))
+                inicio = posicion + 1
+            self._ajustar_edificio(None, -n, edificio)
+        # Siguen en la lista libre: `tomar` los descarta al llegar a ellos
+        self.num_libres -= len(tomados)
+        return tomados
+
+    def liberar(self, ids_recursos):
+        """Devuelve recursos al pool; ignora identificadores ajenos o ya libres"""
+        liberados = []
+        for id_recurso in ids_recursos:
+            indice = self.indice(id_recurso)
+            if indice is None or not self.ocupados[indice - self.primero]:
+                continue
+            self.ocupados[indice - self.primero] = 0
+            self._ajustar_edificio(indice, 1)
+            self.libres.append(indice)
+            liberados.append(id_recurso)
+        self.num_libres += len(liberados)
+        if len(self.libres) > self.num_libres + self.cantidad:
+            self._depurar()
+        return liberados
+
+    def _depurar(self):
+        """Quita de la lista libre los tomados fuera de turno y los repetidos.
+
+        Solo `liberar` alarga la lista, y se depura cuando acumula más de
+        `cantidad` entradas de sobra: el costo O(n) se reparte entre ellas.
+        """
+        vistos = bytearray(self.cantidad)
+        libres = deque()
+        for indice in self.libres:
+            posicion = indice - self.primero
+            if not self.ocupados[posicion] and not vistos[posicion]:
+                vistos[posicion] = 1
+                libres.append(indice)
+        self.libres = libres
+
+    def ocupar(self, ids_recursos):
+        """Marca como asignados recursos concretos (p. ej. tomados por otro servidor)"""
+        for id_recurso in ids_recursos:
+            indice = self.indice(id_recurso)
+            if indice is None or self.ocupados[indice - self.primero]:
+                continue
+            self.ocupados[indice - self.primero] = 1
+            self._ajustar_edificio(indice, -1)
+            self.num_libres -= 1
+            # Normalmente son los primeros de la lista libre, como los entrega `tomar`;
+            # si no, quedan en la lista y `tomar` los descarta
+            if self.libres and self.libres[0] == indice:
+                self.libres.popleft()
+
+    def ids_asignados(self):
+        return [
+            self.id_recurso(indice) for indice in range(self.primero, self.ultimo + 1)
+            if self.ocupados[indice - self.primero]
+        ]
+
+    def mapa(self):
+        """Mapa de ocupación (un byte por recurso) para el snapshot binario"""
+        return bytes(self.ocupados)
+
+    def cargar_mapa(self, mapa):
+        """Reemplaza la ocupación por un mapa de `mapa()` y reconstruye la lista libre"""
+        if len(mapa) != self.cantidad:
+            raise ValueError(f"Mapa de {len(mapa)} recursos para un pool de {self.cantidad}")
+        self.ocupados = bytearray(mapa)
+        self.libres = deque(
+            indice for indice in range(self.primero, self.ultimo + 1)
+            if not self.ocupados[indice - self.primero]
+        )
+        self.num_libres = len(self.libres)
+        self._contar_edificios()
+
+    def restaurar(self, ids_asignados):
+        """Deja asignados exactamente los recursos indicados y reconstruye la lista libre"""
+        self.ocupados = bytearray(self.cantidad)
+        for id_recurso in ids_asignados:
+            indice = self.indice(id_recurso)
+            if indice is not None:
+                self.ocupados[indice - self.primero] = 1
+        self.libres = deque(
+            indice for indice in range(self.primero, self.ultimo + 1)
+            if not self.ocupados[indice - self.primero]
+        )
+        self.num_libres = len(self.libres)
+        self._contar_edificios()
+
+
+def elegir_edificios(libres, cantidad, preferidos=None):
+    """Reparte `cantidad` entre edificios según sus libres: [(edificio, n)].
+
+    Primero los edificios preferidos. Si un solo edificio alcanza para lo
+    que falta, usa el que menos libres tiene entre los que alcanzan (así
+    los edificios vacíos quedan para pedidos grandes); si no, el que más
+    libres tiene, y repite con el resto.
+    """
+    libres = dict(libres)
+    reparto = []
+    for edificio in preferidos or ():
+        n = min(cantidad, libres.get(edificio, 0))
+        if n > 0:
+            reparto.append((edificio, n))
+            libres[edificio] -= n
+            cantidad -= n
+    while cantidad > 0:
+        candidatos = [(n, edificio) for edificio, n in libres.items() if n > 0]
+        if not candidatos:
+            break
+        alcanzan = [candidato for candidato in candidatos if candidato[0] >= cantidad]
+        n, edificio = min(alcanzan) if alcanzan else max(candidatos, key=lambda c: (c[0], -c[1]))
+        n = min(n, cantidad)
+        reparto.append((edificio, n))
+        libres[edificio] -= n
+        cantidad -= n
+    return reparto
+
+
+def planificar_lote(libres, cantidades):
+    """Edificios sugeridos para varios pedidos de un mismo pool: [[edificio, ...] por pedido].
+
+    Best fit decreasing: ubica primero los pedidos grandes, cada uno con
+    `elegir_edificios` sobre lo que dejaron los anteriores. Solo sugiere:
+    la toma real vuelve a mirar la ocupación con los locks tomados.
+    """
+    libres = dict(libres)
+    sugeridos = [[] for _ in cantidades]
+    for posicion in sorted(range(len(cantidades)), key=lambda i: -cantidades[i]):
+        for edificio, n in elegir_edificios(libres, cantidades[posicion]):
+            sugeridos[posicion].append(edificio)
+            libres[edificio] -= n
+    return sugeridos
+
+
+def rango_fragmento(cantidad, fragmento, num_fragmentos):
+    """Primer índice y cantidad de recursos que corresponden a un fragmento"""
+    base, resto = divmod(cantidad, num_fragmentos)
+    primero = 1 + fragmento * base + min(fragmento, resto)
+    return primero, base + (1 if fragmento < resto else 0)
+
+
+def bloquear_en_orden(locks, tipos=None):
+    """Toma los locks de los tipos indicados (todos con None) siempre en el orden de TIPOS.
+
+    Con un orden fijo, dos solicitudes que comparten pools no pueden
+    bloquearse mutuamente; las que no comparten ninguno no se esperan.
+    """
+    pila = ExitStack()
+    for tipo in AsignadorRecursos.TIPOS:
+        if tipos is None or tipo in tipos:
+            pila.enter_context(locks[tipo])
+    return pila
+
+
+class AsignadorRecursos:
+    """Agrupa los pools de salones, laboratorios y aulas móviles"""
+    TIPOS = ('salones', 'laboratorios', 'aulas_moviles')
+
+    def __init__(self, catalogo=None, fragmento=0, num_fragmentos=1):
+        catalogo = catalogo or RECURSOS_CONFIG
+        self.pools = {}
+        for tipo in self.TIPOS:
+            primero, cantidad = rango_fragmento(catalogo[tipo]['cantidad'], fragmento, num_fragmentos)
+            self.pools[tipo] = PoolRecursos(
+                catalogo[tipo]['prefijo'], cantidad, primero, catalogo[tipo].get('por_edificio')
+            )
+
+    def pool(self, tipo):
+        return self.pools[tipo]
+
+    def bloquear(self, tipos=None):
+        return bloquear_en_orden({tipo: pool.lock for tipo, pool in self.pools.items()}, tipos)
+
+    def disponibles(self, tipo):
+        return self.pools[tipo].disponibles()
+
+    def tomar(self, tipo, cantidad):
+        return self.pools[tipo].tomar(cantidad)
+
+    def liberar(self, tipo, ids_recursos):
+        return self.pools[tipo].liberar(ids_recursos)
+
+    def tomar_varios(self, pedidos, todo_o_nada=False, cercanos=False, preferidos=None):
+        """Toma recursos de varios tipos; con `todo_o_nada` devuelve todo si algo falta.
+
+        Con `cercanos` agrupa cada tipo por edificio (ver `PoolRecursos.tomar_cercanos`);
+        `preferidos` es {tipo: [edificio, ...]}.
+        """
+        if cercanos:
+            preferidos = preferidos or {}
+            tomados = {
+                tipo: self.pools[tipo].tomar_cercanos(cantidad, preferidos.get(tipo))
+                for tipo, cantidad in pedidos.items()
+            }
+        else:
+            tomados = {tipo: self.pools[tipo].tomar(cantidad) for tipo, cantidad in pedidos.items()}
+        if todo_o_nada and any(len(tomados[tipo]) < cantidad for tipo, cantidad in pedidos.items()):
+            for tipo, ids in tomados.items():
+                self.pools[tipo].liberar(ids)
+            return {tipo: [] for tipo in pedidos}
+        return tomados
+
+    def tipo_de(self, id_recurso):
+        """Tipo de recurso al que pertenece un identificador, o None"""
+        for tipo, pool in self.pools.items():
+            if pool.indice(id_recurso) is not None:
+                return tipo
+        return None
+
+    def ocupacion(self):
+        """Resumen de recursos asignados y totales por tipo"""
+        return {
+            tipo: {'asignados': pool.asignados(), 'total': pool.cantidad}
+            for tipo, pool in self.pools.items()
+        }
@@ -0,0 +1,284 @@
+"""Generador de carga y medición de capacidad del servidor central.
+
+Uso: python simulacion.py benchmark [opciones]   (o python benchmark.py [opciones])
+
+Levanta un servidor en localhost con un directorio de datos temporal, lanza
+un proceso generador por facultad y escribe los resultados en un archivo JSON
+para comparar corridas entre versiones.
+"""
+from datetime import datetime
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import zmq
+
+from codec import obtener_codec, detectar_codec
+from simulador import ProgramaVirtual, clasificar, liberacion, percentil
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+
+def _parsear_argumentos(argv):
+    parser = argparse.ArgumentParser(description="Benchmark del servidor central")
+    parser.add_argument('--facultades', type=int, default=3, help="procesos generadores")
+    parser.add_argument('--programas', type=int, default=10, help="programas virtuales por facultad")
+    parser.add_argument('--modo', choices=['cerrado', 'abierto'], default='cerrado',
+                        help="cerrado: cada programa espera su respuesta (sin tiempo de espera); "
+                             "abierto: llegadas de Poisson a --tasa")
+    parser.add_argument('--tasa', type=float, default=500.0, help="solicitudes/s totales (modo abierto)")
+    parser.add_argument('--duracion', type=float, default=10.0, help="segundos de medición")
+    parser.add_argument('--puerto', type=int, default=5600)
+    parser.add_argument('--liberar', action='store_true',
+                        help="devolver los recursos tras cada respuesta para no agotar el campus")
+    parser.add_argument('--codec', choices=['json', 'binario'], default='json')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--timeout', type=float, default=5.0, help="segundos antes de contar una solicitud como perdida")
+    parser.add_argument('--salida', default=f"benchmark-{datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+    return parser.parse_args(argv)
+
+
+def _leer_proc(pid):
+    """CPU acumulada (s) y memoria residente (kB) de un proceso, vía /proc (solo Linux)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            campos = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(campos[11]) + int(campos[12])) / os.sysconf('SC_CLK_TCK')
+
+        memoria = {}
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith(('VmRSS', 'VmHWM')):
+                    nombre, valor = linea.split(':')
+                    memoria[nombre] = int(valor.split()[0])
+        return cpu, memoria.get('VmRSS'), memoria.get('VmHWM')
+    except (OSError, IndexError, ValueError):
+        return None, None, None
+
+
+def generar_carga(numero, args, resultados):
+    """Proceso generador: multiplexa los programas de una facultad sobre un DEALER.
+
+    Las solicitudes son las de los programas virtuales del simulador; aquí
+    solo se ignoran sus esperas (modo cerrado) o se reemplazan por las
+    llegadas de Poisson (modo abierto).
+    """
+    rng = random.Random(args.semilla + numero)
+    codec = obtener_codec(args.codec)
+    facultad = f"Facultad-{numero}"
+    programas = [ProgramaVirtual(facultad, programa, args.semilla) for programa in range(args.programas)]
+    context = zmq.Context()
+    socket = context.socket(zmq.DEALER)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(f"tcp://localhost:{args.puerto}")
+
+    latencias = []
+    enviadas = 0
+    fallidas = 0   # respuestas con recursos no asignados
+    errores = 0
+    ocupadas = 0   # rechazadas por el ingreso del servidor
+    en_vuelo = {}  # id_peticion -> (instante de envío programado, programa)
+
+    def enviar(programa, instante):
+        nonlocal enviadas
+        _, solicitud = programas[programa].siguiente()
+        en_vuelo[solicitud['id_peticion']] = (instante, programa)
+        socket.send_multipart([b'', codec.codificar(solicitud)])
+        enviadas += 1
+
+    inicio = time.monotonic()
+    fin = inicio + args.duracion
+    # Reloj de pared para combinar las ventanas de medición de todos los procesos
+    inicio_pared = time.time()
+    respondidas_ventana = 0
+    tasa = args.tasa / args.facultades
+    proxima_llegada = inicio + rng.expovariate(tasa) if args.modo == 'abierto' else None
+
+    if args.modo == 'cerrado':
+        for programa in range(args.programas):
+            enviar(programa, time.monotonic())
+
+    while True:
+        ahora = time.monotonic()
+        if ahora >= fin and (args.modo == 'abierto' or not en_vuelo):
+            break
+        if ahora >= fin + args.timeout:
+            break
+
+        # Modo abierto: las llegadas no dependen de las respuestas
+        while proxima_llegada is not None and proxima_llegada <= ahora and ahora < fin:
+            enviar(rng.randrange(args.programas), proxima_llegada)
+            proxima_llegada += rng.expovariate(tasa)
+
+        espera = 10 if proxima_llegada is None else max(0, int((proxima_llegada - ahora) * 1000))
+        if not socket.poll(min(espera, 10)):
+            continue
+
+        while True:
+            try:
+                _, cuerpo = socket.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            respuesta = detectar_codec(cuerpo).decodificar(cuerpo)
+            if respuesta.get('tipo') == 'liberacion':
+                continue
+            pendiente = en_vuelo.pop(respuesta.get('id_peticion'), None)
+            if pendiente is None:
+                continue
+            instante, programa = pendiente
+            recibida = time.monotonic()
+            resultado = clasificar(respuesta)
+            if resultado == 'ocupado':
+                ocupadas += 1
+                if args.modo == 'cerrado' and recibida < fin:
+                    enviar(programa, recibida)
+                continue
+            latencias.append((recibida - instante) * 1000)
+            if recibida <= fin:
+                respondidas_ventana += 1
+
+            if resultado == 'error':
+                errores += 1
+            elif resultado == 'parcial':
+                fallidas += 1
+            asignacion = respuesta.get('asignacion')
+            if args.liberar and asignacion:
+                socket.send_multipart([b'', codec.codificar(liberacion(facultad, asignacion))])
+
+            if args.modo == 'cerrado' and recibida < fin:
+                enviar(programa, recibida)
+
+    resultados.put({
+        'latencias': latencias,
+        'enviadas': enviadas,
+        'fallidas': fallidas,
+        'errores': errores,
+        'ocupadas': ocupadas,
+        'perdidas': len(en_vuelo),
+        'respondidas_ventana': respondidas_ventana,
+        'inicio': inicio_pared,
+        'fin': inicio_pared + args.duracion
+    })
+    socket.close()
+    context.term()
+
+
+def _esperar_servidor(servidor, puerto, espera=10.0):
+    """Espera a que el servidor responda una solicitud inocua (una liberación vacía)"""
+    context = zmq.Context()
+    socket = context.socket(zmq.DEALER)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(f"tcp://localhost:{puerto}")
+    limite = time.monotonic() + espera
+    try:
+        while time.monotonic() < limite:
+            if servidor.poll() is not None:
+                raise RuntimeError("El servidor terminó antes de quedar listo")
+            socket.send_multipart([b'', obtener_codec('json').codificar({'tipo': 'liberacion'})])
+            if socket.poll(200):
+                socket.recv_multipart()
+                return
+        raise RuntimeError(f"El servidor no respondió en {espera} s")
+    finally:
+        socket.close()
+        context.term()
+
+
+def ejecutar(args):
+    with tempfile.TemporaryDirectory(prefix='benchmark-') as directorio_datos:
+        servidor = subprocess.Popen(
+            [sys.executable, os.path.join(DIRECTORIO, 'servidor.py'), str(args.puerto)],
+            cwd=directorio_datos,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        try:
+            _esperar_servidor(servidor, args.puerto)
+            resultados = multiprocessing.Queue()
+            generadores = [
+                multiprocessing.Process(target=generar_carga, args=(i, args, resultados))
+                for i in range(args.facultades)
+            ]
+
+            cpu_inicial, _, _ = _leer_proc(servidor.pid)
+            for generador in generadores:
+                generador.start()
+            parciales = [resultados.get() for _ in generadores]
+            for generador in generadores:
+                generador.join()
+            cpu_final, rss, rss_maximo = _leer_proc(servidor.pid)
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+    # Throughput solo sobre la ventana de medición (sin arranque de procesos ni drenaje final)
+    ventana = max(p['fin'] for p in parciales) - min(p['inicio'] for p in parciales)
+    latencias = sorted(l for parcial in parciales for l in parcial['latencias'])
+    respondidas = len(latencias)
+    fallidas = sum(p['fallidas'] for p in parciales)
+    errores = sum(p['errores'] for p in parciales)
+
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'version': _version(),
+        'configuracion': {k: v for k, v in vars(args).items() if k != 'salida'},
+        'resultados': {
+            'enviadas': sum(p['enviadas'] for p in parciales),
+            'respondidas': respondidas,
+            'perdidas': sum(p['perdidas'] for p in parciales),
+            'ventana_s': ventana,
+            'throughput_rps': sum(p['respondidas_ventana'] for p in parciales) / ventana if ventana > 0 else None,
+            'latencia_ms': {
+                'p50': percentil(latencias, 50),
+                'p95': percentil(latencias, 95),
+                'p99': percentil(latencias, 99),
+                'max': latencias[-1] if latencias else None
+            },
+            'tasa_fallo_asignacion': fallidas / respondidas if respondidas else None,
+            'errores': errores,
+            'ocupadas': sum(p['ocupadas'] for p in parciales),
+            'servidor': {
+                'cpu_s': cpu_final - cpu_inicial if cpu_inicial is not None and cpu_final is not None else None,
+                'rss_kb': rss,
+                'rss_maximo_kb': rss_maximo
+            }
+        }
+    }
+
+
+def _version():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=DIRECTORIO,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    args = _parsear_argumentos(argv)
+    informe = ejecutar(args)
+
+    with open(args.salida, 'w') as f:
+        json.dump(informe, f, indent=2)
+
+    r = informe['resultados']
+    print(f"Throughput: {r['throughput_rps']:.1f} sol/s ({r['respondidas']}/{r['enviadas']} respondidas)")
+    print("Latencia ms: " + " ".join(
+        f"{p}={v:.2f}" for p, v in r['latencia_ms'].items() if v is not None
+    ))
+    print(f"Fallos de asignación: {r['tasa_fallo_asignacion']}")
+    print(f"Servidor: {r['servidor']}")
+    print(f"Resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+from concurrent.futures import Future
+import zmq
+import threading
+import time
+import logging
+import uuid
+
+from codec import codec_extremo, detectar_codec
+from config import TIMEOUTS, CLIENTE_CONFIG, LOTE_CONFIG, REPLICA_CONFIG
+from replicacion import endpoint_eventos
+
+
+class ServidorOcupado(Exception):
+    """El servidor rechazó la solicitud por sobrecarga; puede reintentarse más tarde"""
+    def __init__(self, mensaje, reintentar_ms=None):
+        super().__init__(mensaje)
+        self.reintentar_ms = reintentar_ms
+
+
+class ClienteServidor:
+    """Conexión DEALER persistente al servidor, compartida por varios hilos.
+
+    Cada solicitud lleva un `id_peticion` que el servidor devuelve en su
+    respuesta, lo que permite tener varias solicitudes en vuelo sobre un
+    único socket. El socket solo lo usa el hilo de E/S; los demás hilos
+    entregan sus solicitudes por un socket PUSH inproc propio. El mismo id
+    va como `clave_idempotencia`: los reenvíos reciben la respuesta de la
+    original en lugar de asignar otra vez.
+
+    Con `respaldos` (lista de (ip, puerto)) el hilo de E/S sigue los
+    heartbeats del servidor actual y, si se interrumpen, pasa al siguiente
+    y le reenvía las solicitudes en vuelo. Solo cuentan los heartbeats que
+    traen el puerto del servidor actual: un respaldo promovido en la misma
+    máquina publica en el mismo puerto de eventos.
+    """
+    def __init__(self, servidor_ip, servidor_puerto, ventana=None, max_reintentos=None, context=None,
+                 respaldos=None):
+        self.logger = logging.getLogger('ClienteServidor')
+        self.servidores = [(servidor_ip, servidor_puerto)] + list(respaldos or [])
+        self.actual = 0
+        self.endpoint = f"tcp://{servidor_ip}:{servidor_puerto}"
+        self.limite_silencio = REPLICA_CONFIG['heartbeat_ms'] * REPLICA_CONFIG['heartbeats_perdidos'] / 1000
+        self.ultimo_heartbeat = None
+        self.timeout_reintento = TIMEOUTS['reintento'] / 1000
+        self.max_reintentos = CLIENTE_CONFIG['max_reintentos'] if max_reintentos is None else max_reintentos
+
+        self.codec = codec_extremo('facultad_servidor')
+        self.context = context or zmq.Context.instance()
+        self.endpoint_envio = f"inproc://cliente-servidor-{uuid.uuid4().hex}"
+
+        # Limita cuántas solicitudes pueden estar en vuelo a la vez
+        self.ventana = threading.BoundedSemaphore(ventana or CLIENTE_CONFIG['ventana'])
+
+        # id_peticion -> [solicitud codificada, future, instante límite, intentos].
+        # Lo escriben los hilos que envían y el hilo de E/S: siempre bajo lock_pendientes
+        self.pendientes = {}
+        self.lock_pendientes = threading.Lock()
+
+        # Solicitudes abandonadas tras agotar los reintentos: id_peticion -> vencimiento.
+        # Si su respuesta llega tarde nadie la usará, así que se devuelven sus recursos
+        self.abandonadas = {}
+
+        self.local = threading.local()
+        self.sockets_envio = []
+        self.lock_sockets = threading.Lock()
+        self.listo = threading.Event()
+        self.ejecutando = False
+        self.hilo = None
+
+    def iniciar(self):
+        """Arranca el hilo de E/S y espera a que el socket esté conectado"""
+        self.ejecutando = True
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+        self.listo.wait()
+
+    def enviar(self, solicitud):
+        """Encola una solicitud y devuelve un Future con la respuesta del servidor.
+
+        Bloquea si la ventana de solicitudes en vuelo está llena. No debe
+        llamarse desde un callback del Future, que corre en el hilo de E/S.
+        """
+        self.ventana.acquire()
+        future = Future()
+        id_peticion = uuid.uuid4().hex
+        solicitud = dict(solicitud, id_peticion=id_peticion)
+        solicitud.setdefault('clave_idempotencia', id_peticion)
+        future.id_peticion = id_peticion
+        future.add_done_callback(lambda _: self.ventana.release())
+
+        with self.lock_pendientes:
+            self.pendientes[id_peticion] = [self.codec.codificar(solicitud), future, None, 0]
+        self._socket_envio().send_string(id_peticion)
+        return future
+
+    def _socket_envio(self):
+        """Socket PUSH propio del hilo que llama (los sockets ZMQ no son thread-safe)"""
+        socket = getattr(self.local, 'socket', None)
+        if socket is None:
+            socket = self.context.socket(zmq.PUSH)
+            socket.connect(self.endpoint_envio)
+            self.local.socket = socket
+            with self.lock_sockets:
+                self.sockets_envio.append(socket)
+        return socket
+
+    def _bucle(self):
+        """Hilo de E/S: envía, correlaciona respuestas y reintenta por timeout"""
+        dealer, vigilancia = self._conectar()
+        entrada = self.context.socket(zmq.PULL)
+        entrada.bind(self.endpoint_envio)
+        self.listo.set()
+
+        poller = zmq.Poller()
+        poller.register(dealer, zmq.POLLIN)
+        poller.register(entrada, zmq.POLLIN)
+        if vigilancia:
+            poller.register(vigilancia, zmq.POLLIN)
+
+        try:
+            while self.ejecutando:
+                eventos = dict(poller.poll(self._espera_ms()))
+
+                if entrada in eventos:
+                    while True:
+                        try:
+                            id_peticion = entrada.recv_string(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        self._transmitir(dealer, id_peticion)
+
+                if dealer in eventos:
+                    while True:
+                        try:
+                            _, cuerpo = dealer.recv_multipart(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        self._resolver(dealer, detectar_codec(cuerpo).decodificar(cuerpo))
+
+                if vigilancia in eventos:
+                    while True:
+                        try:
+                            _, cuerpo = vigilancia.recv_multipart(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        if detectar_codec(cuerpo).decodificar(cuerpo).get('servidor') == self.servidores[self.actual][1]:
+                            self.ultimo_heartbeat = time.monotonic()
+
+                # Al arrancar, solo tras haber visto al servidor vivo: puede no estar listo aún
+                if vigilancia and self.ultimo_heartbeat and time.monotonic() - self.ultimo_heartbeat > self.limite_silencio:
+                    dealer, vigilancia = self._conmutar(poller, dealer, vigilancia)
+
+                self._revisar_timeouts(dealer)
+        finally:
+            with self.lock_pendientes:
+                abandonadas = [future for _, future, _, _ in self.pendientes.values()]
+                self.pendientes.clear()
+            for future in abandonadas:
+                future.set_exception(ConnectionError("Cliente cerrado"))
+            dealer.close()
+            entrada.close()
+            if vigilancia:
+                vigilancia.close()
+
+    def _conectar(self):
+        """DEALER hacia el servidor actual y, si hay respaldos, SUB a sus heartbeats"""
+        ip, puerto = self.servidores[self.actual]
+        self.endpoint = f"tcp://{ip}:{puerto}"
+        dealer = self.context.socket(zmq.DEALER)
+        dealer.setsockopt(zmq.LINGER, 0)
+        dealer.connect(self.endpoint)
+
+        vigilancia = None
+        if len(self.servidores) > 1:
+            vigilancia = self.context.socket(zmq.SUB)
+            vigilancia.setsockopt(zmq.LINGER, 0)
+            vigilancia.setsockopt(zmq.SUBSCRIBE, b'heartbeat')
+            vigilancia.connect(endpoint_eventos(ip))
+        self.ultimo_heartbeat = None
+        return dealer, vigilancia
+
+    def _conmutar(self, poller, dealer, vigilancia):
+        """Pasa al siguiente servidor y le reenvía las solicitudes en vuelo"""
+        for socket in (dealer, vigilancia):
+            poller.unregister(socket)
+            socket.close()
+
+        self.actual = (self.actual + 1) % len(self.servidores)
+        dealer, vigilancia = self._conectar()
+        # Un servidor que nunca envía heartbeats también se abandona
+        self.ultimo_heartbeat = time.monotonic()
+        poller.register(dealer, zmq.POLLIN)
+        poller.register(vigilancia, zmq.POLLIN)
+        self.logger.warning(f"El servidor dejó de enviar heartbeats; conmutando a {self.endpoint}")
+
+        with self.lock_pendientes:
+            en_vuelo = [id_peticion for id_peticion, pendiente in self.pendientes.items() if pendiente[2] is not None]
+        for id_peticion in en_vuelo:
+            self._transmitir(dealer, id_peticion)
+        return dealer, vigilancia
+
+    def _transmitir(self, dealer, id_peticion):
+        with self.lock_pendientes:
+            pendiente = self.pendientes.get(id_peticion)
+            if pendiente is None:
+                return
+            pendiente[2] = time.monotonic() + self.timeout_reintento
+            pendiente[3] += 1
+            cuerpo = pendiente[0]
+        # Trama vacía inicial: el servidor atiende con sockets REP
+        dealer.send_multipart([b'', cuerpo])
+
+    def _resolver(self, dealer, respuesta):
+        id_peticion = respuesta.get('id_peticion')
+        with self.lock_pendientes:
+            pendiente = self.pendientes.pop(id_peticion, None)
+            abandonada = pendiente is None and self.abandonadas.pop(id_peticion, None) is not None
+
+        if abandonada:
+            # Nadie espera esta respuesta: lo que asignó se devuelve
+            self._devolver_recursos(dealer, respuesta)
+        elif pendiente is None:
+            # Respuesta a un reenvío de una solicitud ya resuelta: es la misma
+            # respuesta (el servidor la guarda por clave de idempotencia)
+            self.logger.debug(f"Respuesta sin solicitud pendiente: {id_peticion}")
+        elif respuesta.get('tipo') == 'ocupado':
+            pendiente[1].set_exception(ServidorOcupado(respuesta.get('error'), respuesta.get('reintentar_ms')))
+        else:
+            pendiente[1].set_result(respuesta)
+
+    def _devolver_recursos(self, dealer, respuesta):
+        """Libera lo que el servidor asignó en una respuesta que nadie va a usar"""
+        # Una liberación por franja: cada franja tiene sus propios pools
+        liberaciones = {}
+        for individual in respuesta.get('respuestas', []) + [respuesta]:
+            asignacion = individual.get('asignacion') or {}
+            franja = individual.get('franja')
+            liberacion = liberaciones.setdefault(franja, {
+                'tipo': 'liberacion', 'facultad': respuesta.get('facultad', 'Desconocida'), 'franja': franja,
+                'salones': [], 'laboratorios': [], 'aulas_moviles': []
+            })
+            for tipo in ('salones', 'laboratorios', 'aulas_moviles'):
+                liberacion[tipo].extend(asignacion.get(tipo, []))
+
+        for liberacion in liberaciones.values():
+            if any(liberacion[tipo] for tipo in ('salones', 'laboratorios', 'aulas_moviles')):
+                self.logger.warning(f"Devolviendo recursos de una solicitud abandonada: {respuesta.get('id_peticion')}")
+                dealer.send_multipart([b'', self.codec.codificar(liberacion)])
+
+    def _revisar_timeouts(self, dealer):
+        ahora = time.monotonic()
+        reintentar = []
+        vencidas = []
+        with self.lock_pendientes:
+            for id_peticion, pendiente in list(self.pendientes.items()):
+                if pendiente[2] is None or pendiente[2] > ahora:
+                    continue
+                if pendiente[3] <= self.max_reintentos:
+                    reintentar.append((id_peticion, pendiente[3]))
+                else:
+                    del self.pendientes[id_peticion]
+                    self.abandonadas[id_peticion] = ahora + 60
+                    vencidas.append(pendiente[1])
+            for id_peticion, vencimiento in list(self.abandonadas.items()):
+                if vencimiento < ahora:
+                    del self.abandonadas[id_peticion]
+
+        for id_peticion, intentos in reintentar:
+            self.logger.warning(f"Timeout esperando {id_peticion}, reintento {intentos}")
+            self._transmitir(dealer, id_peticion)
+        for future in vencidas:
+            future.set_exception(TimeoutError("Timeout al esperar respuesta del servidor"))
+
+    def _espera_ms(self):
+        with self.lock_pendientes:
+            limites = [p[2] for p in self.pendientes.values() if p[2] is not None]
+        if not limites:
+            return 100
+        return max(0, min(100, int((min(limites) - time.monotonic()) * 1000) + 1))
+
+    def cerrar(self):
+        """Detiene el hilo de E/S; las solicitudes en vuelo fallan con ConnectionError"""
+        self.ejecutando = False
+        if self.hilo:
+            self.hilo.join()
+        with self.lock_sockets:
+            for socket in self.sockets_envio:
+                socket.close(linger=0)
+            self.sockets_envio.clear()
+
+
+class AgrupadorSolicitudes:
+    """Acumula solicitudes durante una ventana corta y las envía como un lote.
+
+    El lote sale al cumplirse `ventana_ms` desde su primera solicitud o al
+    llegar a `max_solicitudes`. Cada llamada a `agregar` recibe su propio
+    Future con la respuesta individual que el servidor devuelve en el lote.
+    """
+    def __init__(self, cliente, facultad, ventana_ms=None, max_solicitudes=None):
+        self.logger = logging.getLogger(f'Agrupador-{facultad}')
+        self.cliente = cliente
+        self.facultad = facultad
+        self.ventana = (ventana_ms or LOTE_CONFIG['ventana_ms']) / 1000
+        self.max_solicitudes = max_solicitudes or LOTE_CONFIG['max_solicitudes']
+
+        self.acumuladas = []  # [(solicitud, future)]
+        self.condicion = threading.Condition()
+        self.ejecutando = False
+        self.hilo = None
+
+    def iniciar(self):
+        self.ejecutando = True
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+
+    def agregar(self, solicitud):
+        """Agrega una solicitud al lote en curso y devuelve su Future"""
+        future = Future()
+        with self.condicion:
+            self.acumuladas.append((solicitud, future))
+            if len(self.acumuladas) == 1 or len(self.acumuladas) >= self.max_solicitudes:
+                self.condicion.notify()
+        return future
+
+    def _bucle(self):
+        while True:
+            with self.condicion:
+                while self.ejecutando and not self.acumuladas:
+                    self.condicion.wait()
+                if not self.acumuladas:
+                    break
+
+                # Esperar a que se llene el lote o venza la ventana
+                limite = time.monotonic() + self.ventana
+                while self.ejecutando and len(self.acumuladas) < self.max_solicitudes:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self.condicion.wait(restante)
+
+                lote = self.acumuladas[:self.max_solicitudes]
+                self.acumuladas = self.acumuladas[self.max_solicitudes:]
+
+            self._enviar_lote(lote)
+
+    def _enviar_lote(self, lote):
+        mensaje = {
+            'tipo': 'lote',
+            'facultad': self.facultad,
+            'solicitudes': [dict(solicitud, id_peticion=str(i)) for i, (solicitud, _) in enumerate(lote)]
+        }
+        futures = [future for _, future in lote]
+        self.logger.debug(f"Enviando lote de {len(lote)} solicitudes")
+
+        try:
+            envio = self.cliente.enviar(mensaje)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        envio.add_done_callback(lambda resultado: self._repartir(resultado, futures))
+
+    def _repartir(self, envio, futures):
+        """Entrega a cada solicitud del lote su respuesta individual"""
+        try:
+            respuesta = envio.result()
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        respuestas = {r.get('id_peticion'): r for r in respuesta.get('respuestas', [])}
+        for i, future in enumerate(futures):
+            individual = respuestas.get(str(i))
+            if individual is None:
+                future.set_exception(RuntimeError(respuesta.get('error', 'Respuesta ausente en el lote')))
+            else:
+                individual.pop('id_peticion', None)
+                future.set_result(individual)
+
+    def cerrar(self):
+        """Envía lo acumulado y detiene el hilo"""
+        with self.condicion:
+            self.ejecutando = False
+            self.condicion.notify()
+        if self.hilo:
+            self.hilo.join()
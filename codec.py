@@ -0,0 +1,141 @@
+"""Codificación de los mensajes ZMQ.
+
+Todos los extremos aceptan JSON. El codec binario usa msgpack (dependencia
+opcional) y compacta las listas de recursos ('S1', 'S2', ...) en rangos de
+enteros. Los mensajes binarios empiezan con un byte de marca, así que el
+receptor detecta el codec de cada mensaje y responde con el mismo.
+"""
+import json
+import logging
+import struct
+
+try:
+    import msgpack
+except ImportError:  # msgpack es opcional; sin él se usa JSON
+    msgpack = None
+
+from config import CODEC_CONFIG
+
+logger = logging.getLogger('Codec')
+
+class CodecJSON:
+    nombre = 'json'
+
+    def codificar(self, mensaje):
+        return json.dumps(mensaje).encode()
+
+    def decodificar(self, datos):
+        return json.loads(datos)
+
+
+class _ListaRecursos:
+    """Lista de identificadores con un prefijo común, pendiente de empaquetar"""
+    __slots__ = ('prefijo', 'numeros')
+
+    def __init__(self, prefijo, numeros):
+        self.prefijo = prefijo
+        self.numeros = numeros
+
+
+class CodecBinario:
+    """msgpack con las listas de recursos codificadas como rangos (inicio, longitud)"""
+    nombre = 'binario'
+    MARCA = b'\x01'
+    EXT_RECURSOS = 1
+    # Las listas cortas salen más baratas como arreglos msgpack normales
+    MIN_RANGOS = 8
+    MAX_PREFIJO = 0xFF
+    MAX_NUMERO = 0xFFFFFFFF
+
+    def codificar(self, mensaje):
+        return self.MARCA + msgpack.packb(self._compactar(mensaje), default=self._empaquetar)
+
+    def decodificar(self, datos):
+        return msgpack.unpackb(datos[1:], ext_hook=self._desempaquetar, raw=False)
+
+    def _compactar(self, valor):
+        if isinstance(valor, dict):
+            return {clave: self._compactar(v) for clave, v in valor.items()}
+        if isinstance(valor, list):
+            lista = self._como_recursos(valor)
+            return lista if lista is not None else [self._compactar(v) for v in valor]
+        return valor
+
+    def _como_recursos(self, valores):
+        if len(valores) < self.MIN_RANGOS:
+            return None
+        primero = valores[0]
+        if not isinstance(primero, str):
+            return None
+        prefijo = primero.rstrip('0123456789')
+        if not prefijo or prefijo == primero:
+            return None
+        largo = len(prefijo)
+        try:
+            numeros = [int(valor[largo:]) for valor in valores]
+        except (TypeError, ValueError):
+            return None
+        # Solo si la reconstrucción es exacta (descarta ceros a la izquierda, otros prefijos...)
+        if [f"{prefijo}{numero}" for numero in numeros] != valores or min(numeros) < 1:
+            return None
+        # Límites de los campos empaquetados: prefijo '>B' y rangos '>II'
+        if len(prefijo.encode()) > self.MAX_PREFIJO or max(numeros) > self.MAX_NUMERO:
+            return None
+        return _ListaRecursos(prefijo, numeros)
+
+    def _empaquetar(self, valor):
+        if not isinstance(valor, _ListaRecursos):
+            raise TypeError(f"Tipo no serializable: {type(valor)}")
+
+        # Tramos consecutivos ascendentes, respetando el orden original
+        rangos = []
+        inicio = anterior = valor.numeros[0]
+        for numero in valor.numeros[1:]:
+            if numero != anterior + 1:
+                rangos.append((inicio, anterior - inicio + 1))
+                inicio = numero
+            anterior = numero
+        rangos.append((inicio, anterior - inicio + 1))
+
+        prefijo = valor.prefijo.encode()
+        datos = struct.pack('>B', len(prefijo)) + prefijo
+        datos += b''.join(struct.pack('>II', inicio, longitud) for inicio, longitud in rangos)
+        return msgpack.ExtType(self.EXT_RECURSOS, datos)
+
+    def _desempaquetar(self, codigo, datos):
+        if codigo != self.EXT_RECURSOS:
+            return msgpack.ExtType(codigo, datos)
+        largo = datos[0]
+        prefijo = datos[1:1 + largo].decode()
+        ids = []
+        for inicio, longitud in struct.iter_unpack('>II', datos[1 + largo:]):
+            ids.extend(f"{prefijo}{n}" for n in range(inicio, inicio + longitud))
+        return ids
+
+
+JSON = CodecJSON()
+BINARIO = CodecBinario() if msgpack is not None else None
+
+
+def obtener_codec(nombre):
+    """Codec por nombre ('json' o 'binario'); sin msgpack el binario cae a JSON"""
+    if nombre == 'binario':
+        if BINARIO is None:
+            logger.warning("msgpack no está instalado; se usará JSON")
+            return JSON
+        return BINARIO
+    return JSON
+
+
+def codec_extremo(extremo):
+    """Codec configurado en CODEC_CONFIG para un extremo de comunicación"""
+    return obtener_codec(CODEC_CONFIG.get(extremo, 'json'))
+
+
+def detectar_codec(datos):
+    """Codec con el que se codificó un mensaje recibido"""
+    if datos[:1] == CodecBinario.MARCA:
+        if BINARIO is None:
+            raise ValueError("Mensaje binario recibido pero msgpack no está instalado")
+        return BINARIO
+    return JSON
@@ -9,11 +9,167 @@ LOG_CONFIG = {
 # Configuración de persistencia
 PERSISTENCE_CONFIG = {
     'solicitudes_file': 'solicitudes.json',
-    'no_atendidas_file': 'solicitudes_no_atendidas.json'
+    'no_atendidas_file': 'solicitudes_no_atendidas.json',  # formato anterior, solo lectura
+    'log_file': 'solicitudes.wal.jsonl',
+    'snapshot_file': 'solicitudes.snapshot.json',  # fragmentos; en el servidor, solo para importar
+    'base_file': 'solicitudes.sqlite3',  # historial del servidor (las compactaciones del log)
+    'max_cache': 10000,          # registros compactados que el servidor mantiene en memoria
+    'bloque_orden': 1000,        # números de orden de los ids que se reservan en la base de una vez
+    'intervalo_fsync_ms': 50,    # ventana de group commit
+    'snapshot_cada': 5000,       # registros en el log antes de compactar
+    'commit_sincrono': False     # True: cada solicitud espera el fsync de su lote
+}
+
+# Ocupación de los pools del servidor: snapshot binario (mmap) y diario de cambios
+OCUPACION_CONFIG = {
+    'snapshot_file': 'ocupacion.snapshot.bin',
+    'diario_file': 'ocupacion.diario.bin',
+    'intervalo_s': 0.05,      # cada cuánto se vacía el diario al disco
+    'snapshot_cada': 5000     # entradas del diario antes de reescribir el snapshot
 }
 
 # Tiempos de espera
 TIMEOUTS = {
     'confirmacion': 5000,  # 5 segundos
     'reintento': 3000     # 3 segundos
-}
\ No newline at end of file
+}
+# Catálogo de recursos físicos (prefijo del identificador y cantidad)
+# y cuántos recursos consecutivos hay por edificio (S1-S20 en el edificio 0, ...)
+RECURSOS_CONFIG = {
+    'salones': {'prefijo': 'S', 'cantidad': 380, 'por_edificio': 20},
+    'laboratorios': {'prefijo': 'L', 'cantidad': 60, 'por_edificio': 10},
+    'aulas_moviles': {'prefijo': 'AM', 'cantidad': 5}   # móviles: sin edificio
+}
+
+# Configuración del servidor central
+SERVIDOR_CONFIG = {
+    'modo': 'broker',               # 'broker' (ROUTER/DEALER + workers) o 'rep' (un solo hilo)
+    'num_workers': 4,
+    'backend': 'inproc://workers',
+    'max_consulta': 1000            # registros por respuesta a una consulta del historial
+}
+
+# Caché de respuestas por clave de idempotencia (reenvíos y conmutaciones)
+IDEMPOTENCIA_CONFIG = {
+    'ttl_s': 600,               # vigencia de una respuesta guardada
+    'max_respuestas': 50000,    # LRU: las más antiguas se descartan primero
+    'espera_s': 5.0,            # espera de un reenvío mientras la original se procesa
+    'log_file': 'respuestas.wal.jsonl',         # respuestas guardadas: sobreviven a un reinicio
+    'snapshot_file': 'respuestas.snapshot.json'
+}
+
+# Cliente persistente hacia el servidor (facultades)
+CLIENTE_CONFIG = {
+    'ventana': 32,         # solicitudes en vuelo simultáneas por facultad
+    'max_reintentos': 3    # reenvíos tras TIMEOUTS['reintento'] sin respuesta
+}
+
+# Front-end de la facultad para sus programas (ROUTER en puerto_escucha)
+FACULTAD_CONFIG = {
+    'puerto_escucha': None,   # None: un puerto aleatorio entre 6001 y 6999
+    'simular': True,          # además, generar solicitudes simuladas propias
+    'cache_s': 600,           # vigencia de la última asignación guardada por programa
+    'max_programas': 10000
+}
+
+# Agrupación de solicitudes en lotes (facultad -> servidor)
+LOTE_CONFIG = {
+    'habilitado': True,
+    'ventana_ms': 20,         # tiempo máximo que espera la primera solicitud del lote
+    'max_solicitudes': 32
+}
+
+# Simulador de programas virtuales (python simulacion.py virtual)
+SIMULACION_CONFIG = {
+    'procesos': 2,                   # procesos del pool; cada uno multiplexa sus programas
+    'programas_por_facultad': 200,
+    'espera_s': [3, 10],             # espera aleatoria entre solicitudes de un programa
+    'duracion_s': 60.0,
+    'timeout_s': 10.0,
+    'semilla': 42
+}
+
+# Codec de los mensajes por extremo: 'json' o 'binario' (requiere msgpack).
+# Los receptores detectan el codec de cada mensaje y responden con el mismo.
+CODEC_CONFIG = {
+    'facultad_servidor': 'json',
+    'programa_facultad': 'json',
+    'servidor_fragmento': 'json',
+    'replicacion': 'json'
+}
+
+# Fragmentación de los pools entre procesos (un fragmento por rango de índices)
+FRAGMENTOS_CONFIG = {
+    'habilitado': False,
+    'num_fragmentos': 4,
+    'lanzar': True,           # el servidor inicia los procesos fragmento en su máquina
+    'host': 'localhost',
+    'puerto_base': 5700,      # el fragmento i escucha en puerto_base + i
+    'timeout_ms': 1000
+}
+
+# Réplica en espera (hot standby): el primario publica sus cambios y heartbeats
+REPLICA_CONFIG = {
+    'puerto_eventos': 5560,        # PUB del primario: eventos y heartbeats
+    'puerto_sincronizacion': 5561, # REP del primario: estado completo para el respaldo
+    'heartbeat_ms': 100,
+    'heartbeats_perdidos': 3,      # sin noticias durante 3 heartbeats, el primario se da por caído
+    'prefijo_respaldo': 'respaldo.'  # archivos de persistencia propios del respaldo
+}
+
+# Métricas del servidor (contadores e histogramas de latencia)
+METRICAS_CONFIG = {
+    'habilitado': True,
+    'puerto': 5570,                # REP que responde con las métricas en JSON
+    'muestreo_solicitudes': 0.0    # fracción de solicitudes cuyo cuerpo se registra en INFO
+}
+
+# Reservas por franja horaria (cada franja tiene sus propios pools)
+FRANJAS_CONFIG = {
+    'duracion_s': 2 * 3600,        # vencimiento de una franja que no es un semestre ni trae 'vence'
+    'intervalo_barrido_s': 1.0     # cada cuánto se descartan las franjas vencidas
+}
+
+# Ingreso del modo broker: cola acotada con reparto justo entre facultades
+INGRESO_CONFIG = {
+    'habilitado': True,
+    'max_cola': 2000,              # solicitudes en espera en total; más allá se responde "ocupado"
+    'max_por_facultad': 500,
+    'pesos': {},                   # facultad -> peso en el reparto (1 por defecto)
+    # Solicitudes entregadas a los workers sin responder, por worker. Más bajo reparte
+    # con más justicia; más alto evita que los workers esperen al ingreso
+    'en_vuelo_por_worker': 8,
+    'reintentar_ms': 100           # sugerencia de espera incluida en la respuesta "ocupado"
+}
+
+# Configuración de la asignación
+ASIGNACION_CONFIG = {
+    # Modo de las solicitudes que no indican 'modo': 'mejor_esfuerzo' entrega lo
+    # que haya disponible; 'todo_o_nada' no entrega nada si falta algún recurso
+    'modo': 'mejor_esfuerzo',
+    # 'localidad' agrupa cada pedido en la menor cantidad de edificios (y los
+    # lotes se reparten con un planificador); 'fifo' toma en orden de la lista libre
+    'motor': 'localidad',
+    # Presupuesto por solicitud (ms) de la toma agrupada; si su costo medio lo
+    # excede se usa FIFO. Cada solicitud puede traer 'presupuesto_ms'; None sin límite
+    'presupuesto_ms': 2.0,
+    # Cada cuántas tomas FIFO por presupuesto se vuelve a medir la agrupada
+    'sondeo': 64
+}
+
+# Reintento de faltantes: se reasignan al liberarse recursos y se publican a la facultad
+REINTENTOS_CONFIG = {
+    'habilitado': True,
+    'puerto': 5580,                # PUB de concesiones tardías (tópico: nombre de la facultad)
+    'vigencia_s': 3600,            # un faltante sin cubrir tras este tiempo se abandona
+    'max_pendientes': 1000,        # con la cola llena los faltantes nuevos solo se registran
+    'intervalo_s': 5.0             # pasada periódica aunque no haya liberaciones (vencimientos)
+}
+
+# Tablero de capacidad: ocupación, demanda y pronóstico de agotamiento publicados por PUB
+TABLERO_CONFIG = {
+    'habilitado': True,
+    'puerto': 5590,                # PUB del resumen (tópico: b'tablero')
+    'intervalo_s': 2.0,            # cada cuánto se cierra el intervalo y se publica
+    'alfa': 0.3                    # peso del último intervalo en las tasas (EWMA)
+}
@@ -3,12 +3,19 @@ import json
 import threading
 import time
 import logging
+import os
 import sys
 import random
+import uuid
+from collections import OrderedDict, deque
 from datetime import datetime
 
 
-from config import TIMEOUTS
+from cliente import ClienteServidor, AgrupadorSolicitudes, ServidorOcupado
+from codec import detectar_codec, JSON
+from franjas import semestre
+from reintentos import endpoint_concesiones
+from config import LOTE_CONFIG, REINTENTOS_CONFIG, FACULTAD_CONFIG
 
 # Configuración de logging
 logging.basicConfig(
@@ -16,21 +23,91 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+class ProgramasEnCurso:
+    """Solicitudes de los programas en vuelo y última asignación de cada programa.
+
+    Un programa que reenvía una solicitud (mismo `id_peticion`) mientras la
+    original sigue en vuelo espera la misma respuesta; si ya se respondió,
+    recibe la última asignación guardada sin volver al servidor.
+    """
+    def __init__(self, vigencia_s=None, max_programas=None):
+        self.vigencia_s = vigencia_s or FACULTAD_CONFIG['cache_s']
+        self.max_programas = max_programas or FACULTAD_CONFIG['max_programas']
+        # (programa, id_peticion) -> destinos que esperan la respuesta
+        self.en_curso = {}
+        # programa -> (id_peticion, respuesta, instante); LRU acotado
+        self.ultimas = OrderedDict()
+        self.lock = threading.Lock()
+
+    def recibir(self, programa, id_peticion, destino):
+        """Registra una solicitud; devuelve (clave, None) si hay que enviarla al servidor.
+
+        Un reenvío devuelve (None, respuesta guardada) si ya se respondió, o
+        (None, None) si se espera la respuesta de la original.
+        """
+        with self.lock:
+            ultima = self.ultima(programa)
+            if id_peticion is not None and ultima is not None and ultima[0] == id_peticion:
+                return None, ultima[1]
+            clave = (programa, id_peticion if id_peticion is not None else uuid.uuid4().hex)
+            destinos = self.en_curso.get(clave)
+            if destinos is not None:
+                destinos.append(destino)
+                return None, None
+            self.en_curso[clave] = [destino]
+            return clave, None
+
+    def completar(self, clave, respuesta):
+        """Destinos que esperaban la respuesta; guarda la asignación del programa"""
+        with self.lock:
+            destinos = self.en_curso.pop(clave, [])
+            if 'asignacion' in respuesta:
+                programa = clave[0]
+                self.ultimas[programa] = (clave[1], respuesta, time.monotonic())
+                self.ultimas.move_to_end(programa)
+                if len(self.ultimas) > self.max_programas:
+                    self.ultimas.popitem(last=False)
+            return destinos
+
+    def ultima(self, programa):
+        """(id_peticion, respuesta) de la última asignación vigente del programa, o None"""
+        ultima = self.ultimas.get(programa)
+        if ultima is None or time.monotonic() - ultima[2] > self.vigencia_s:
+            return None
+        return ultima[0], ultima[1]
+
+
 class Facultad:
-    def __init__(self, nombre, servidor_ip="localhost", servidor_puerto=5555, puerto_escucha=None):
+    def __init__(self, nombre, servidor_ip="localhost", servidor_puerto=5555, puerto_escucha=None, respaldo=None,
+                 simular=None):
         self.logger = logging.getLogger(f'Facultad-{nombre}')
         self.nombre = nombre
         self.servidor_ip = servidor_ip
         self.servidor_puerto = servidor_puerto
-        self.puerto_escucha = puerto_escucha or (6000 + random.randint(1, 999))
+        self.respaldo = respaldo
+        self.puerto_escucha = (puerto_escucha or FACULTAD_CONFIG['puerto_escucha']
+                               or (6000 + random.randint(1, 999)))
+        self.simular = FACULTAD_CONFIG['simular'] if simular is None else simular
         
         # Almacenamiento de solicitudes y respuestas
         self.programas_solicitudes = {}
         self.respuestas_asignaciones = {}
         
-        # Configuración ZMQ para comunicación con el servidor
+        # Front-end de los programas: dedup por programa y respuestas hacia el hilo del ROUTER
+        self.programas = ProgramasEnCurso()
+        self.respuestas_programas = deque()
+        self.lectura_programas, self.aviso_programas = os.pipe()
+        
+        # Conexión persistente con el servidor, compartida por los hilos de la facultad
         self.context_servidor = zmq.Context()
-        self.socket_servidor = self.context_servidor.socket(zmq.REQ)
+        # Con un servidor de respaldo (ip, puerto), el cliente conmuta si el primario cae
+        self.cliente = ClienteServidor(
+            servidor_ip, servidor_puerto, context=self.context_servidor,
+            respaldos=[respaldo] if respaldo else None
+        )
+        
+        # Agrupa solicitudes simultáneas de los programas en lotes
+        self.agrupador = AgrupadorSolicitudes(self.cliente, nombre) if LOTE_CONFIG['habilitado'] else None
         
         # Flag para controlar el ciclo de ejecución
         self.ejecutando = True
@@ -38,12 +115,22 @@ class Facultad:
     def iniciar(self):
         """Inicia la facultad y se conecta con el servidor"""
         # Conectar al servidor
-        self.socket_servidor.connect(f"tcp://{self.servidor_ip}:{self.servidor_puerto}")
+        self.cliente.iniciar()
+        if self.agrupador:
+            self.agrupador.iniciar()
         self.logger.info(f"Facultad {self.nombre} conectada al servidor {self.servidor_ip}:{self.servidor_puerto}")
         self.logger.info(f"Puerto de la facultad {self.puerto_escucha}")
         
+        # Recursos que el servidor concede más tarde, al liberarse
+        if REINTENTOS_CONFIG['habilitado']:
+            threading.Thread(target=self.escuchar_concesiones, daemon=True).start()
+        
+        # Programas académicos conectados al puerto de la facultad
+        threading.Thread(target=self.atender_programas, daemon=True).start()
+        
         # Iniciar hilo para simular solicitudes
-        threading.Thread(target=self.simular_solicitudes, daemon=True).start()
+        if self.simular:
+            threading.Thread(target=self.simular_solicitudes, daemon=True).start()
         
         try:
             # En esta versión simplificada, simplemente esperamos
@@ -53,8 +140,147 @@ class Facultad:
             self.ejecutando = False
             self.logger.info(f"Facultad {self.nombre} detenida")
         finally:
-            self.socket_servidor.close()
+            if self.agrupador:
+                self.agrupador.cerrar()
+            self.cliente.cerrar()
+            # term() espera a que el hilo de los programas cierre su ROUTER; ya nadie usa el pipe
             self.context_servidor.term()
+            os.close(self.lectura_programas)
+            os.close(self.aviso_programas)
+    
+    def escuchar_concesiones(self):
+        """Recibe los faltantes que el servidor cubre tras liberarse recursos"""
+        suscriptor = self.context_servidor.socket(zmq.SUB)
+        suscriptor.setsockopt(zmq.LINGER, 0)
+        topico = self.nombre.encode()
+        suscriptor.setsockopt(zmq.SUBSCRIBE, topico)
+        # También al respaldo: tras una conmutación es quien concede
+        for ip in [self.servidor_ip] + ([self.respaldo[0]] if self.respaldo else []):
+            suscriptor.connect(endpoint_concesiones(ip))
+        try:
+            while self.ejecutando:
+                if not suscriptor.poll(500):
+                    continue
+                recibido, cuerpo = suscriptor.recv_multipart()
+                # La suscripción es por prefijo: "Artes" también recibiría "Artes Plásticas"
+                if recibido == topico:
+                    self.recibir_concesion(detectar_codec(cuerpo).decodificar(cuerpo))
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            suscriptor.close()
+    
+    def atender_programas(self):
+        """ROUTER en `puerto_escucha` para los programas de la facultad.
+        
+        Sus solicitudes salen por el mismo cliente (y agrupador) que el resto
+        de la facultad, así que el servidor ve un solo flujo por facultad.
+        Las respuestas vuelven por este hilo: los callbacks solo las encolan
+        y avisan por un pipe que el poller vigila junto al ROUTER.
+        """
+        router = self.context_servidor.socket(zmq.ROUTER)
+        router.setsockopt(zmq.LINGER, 0)
+        router.bind(f"tcp://*:{self.puerto_escucha}")
+        lectura = self.lectura_programas
+        poller = zmq.Poller()
+        poller.register(router, zmq.POLLIN)
+        poller.register(lectura, zmq.POLLIN)
+        try:
+            while self.ejecutando:
+                eventos = dict(poller.poll(500))
+                if lectura in eventos:
+                    os.read(lectura, 4096)
+                while self.respuestas_programas:
+                    destinos, respuesta = self.respuestas_programas.popleft()
+                    for identidad, codec in destinos:
+                        router.send_multipart([identidad, b'', codec.codificar(respuesta)])
+                if router in eventos:
+                    while True:
+                        try:
+                            identidad, _, cuerpo = router.recv_multipart(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        self.recibir_programa(router, identidad, cuerpo)
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            router.close()
+    
+    def recibir_programa(self, router, identidad, cuerpo):
+        """Reenvía al servidor la solicitud de un programa, salvo que sea un reenvío"""
+        codec = JSON
+        try:
+            codec = detectar_codec(cuerpo)
+            mensaje = codec.decodificar(cuerpo)
+            programa = str(mensaje.get('programa', 'Desconocido'))
+        except Exception as e:
+            router.send_multipart([identidad, b'', codec.codificar({'error': f"Solicitud inválida: {e}"})])
+            return
+        id_peticion = mensaje.get('id_peticion')
+        
+        if mensaje.get('tipo') == 'ultima_asignacion':
+            # Consulta local: no llega al servidor
+            ultima = self.programas.ultima(programa)
+            respuesta = ultima[1] if ultima else {'error': f"Sin asignaciones recientes para {programa}"}
+            router.send_multipart([identidad, b'', codec.codificar(self._para_programa(respuesta, id_peticion))])
+            return
+        
+        clave, guardada = self.programas.recibir(programa, id_peticion, (identidad, codec))
+        if guardada is not None:
+            self.logger.info(f"Solicitud repetida de {programa} ({id_peticion}): se reenvía la última asignación")
+            router.send_multipart([identidad, b'', codec.codificar(self._para_programa(guardada, id_peticion))])
+            return
+        if clave is None:
+            # Reenvío de una solicitud aún en vuelo: recibirá la misma respuesta
+            return
+        
+        solicitud = {
+            'facultad': self.nombre,
+            'programa': programa,
+            'num_salones': mensaje.get('num_salones', 0),
+            'num_laboratorios': mensaje.get('num_laboratorios', 0),
+            'num_aulas_moviles': mensaje.get('num_aulas_moviles', 0),
+            'franja': mensaje.get('franja') or semestre()[0]
+        }
+        self.programas_solicitudes[programa] = solicitud
+        future = self.enviar_solicitud_servidor(solicitud)
+        future.add_done_callback(lambda resultado: self._responder_programa(clave, id_peticion, resultado))
+    
+    def _responder_programa(self, clave, id_peticion, future):
+        """Callback: entrega la respuesta del servidor al hilo del ROUTER"""
+        try:
+            respuesta = future.result()
+        except ServidorOcupado as e:
+            respuesta = {'tipo': 'ocupado', 'error': str(e), 'reintentar_ms': e.reintentar_ms}
+        except Exception as e:
+            respuesta = {'error': f"Error al comunicarse con el servidor: {e}"}
+        destinos = self.programas.completar(clave, respuesta)
+        self.respuestas_programas.append((destinos, self._para_programa(respuesta, id_peticion)))
+        os.write(self.aviso_programas, b'.')
+    
+    def _para_programa(self, respuesta, id_peticion):
+        if id_peticion is None:
+            return respuesta
+        return dict(respuesta, id_peticion=id_peticion)
+    
+    def recibir_concesion(self, concesion):
+        """Agrega una concesión tardía a la respuesta original de la solicitud"""
+        id_solicitud = concesion.get('id_solicitud')
+        tardia = concesion.get('asignacion', {})
+        respuesta = self.respuestas_asignaciones.get(id_solicitud)
+        if respuesta is not None:
+            asignacion = respuesta.setdefault('asignacion', {})
+            for tipo in ('salones', 'laboratorios', 'aulas_moviles'):
+                asignacion[tipo] = asignacion.get(tipo, []) + tardia.get(tipo, [])
+            asignacion['no_asignados'] = tardia.get('no_asignados')
+        
+        self.logger.info(
+            f"Asignación tardía para {concesion.get('programa')} ({id_solicitud}): "
+            f"salones {tardia.get('salones', [])}, laboratorios {tardia.get('laboratorios', [])}, "
+            f"aulas móviles {tardia.get('aulas_moviles', [])}"
+        )
+        if tardia.get('no_asignados'):
+            self.logger.warning(f"Aún sin asignar: {tardia['no_asignados']}")
     
     def simular_solicitudes(self):
         """Simula solicitudes de programas académicos"""
@@ -80,7 +306,9 @@ class Facultad:
                 'programa': programa,
                 'num_salones': random.randint(5, 8),  # Ajustar para que la suma esté entre 7 y 10
                 'num_laboratorios': random.randint(2, 4),
-                'num_aulas_moviles': 0  # Opcional, según necesidad
+                'num_aulas_moviles': 0,  # Opcional, según necesidad
+                # Reserva para el semestre en curso: se libera sola al terminar
+                'franja': semestre()[0]
             }
             
             # Registrar solicitud
@@ -93,31 +321,34 @@ class Facultad:
         """Envía una solicitud al servidor de forma asíncrona"""
         self.logger.info(f"Enviando solicitud al servidor: {solicitud}")
         
-        context = zmq.Context()
-        socket = context.socket(zmq.REQ)
-        socket.setsockopt(zmq.RCVTIMEO, TIMEOUTS['confirmacion'])
-        
+        if self.agrupador:
+            future = self.agrupador.agregar(solicitud)
+        else:
+            future = self.cliente.enviar(solicitud)
+        future.add_done_callback(self._respuesta_servidor)
+        return future
+    
+    def _respuesta_servidor(self, future):
+        """Callback del cliente al completarse una solicitud"""
         try:
-            socket.connect(f"tcp://{self.servidor_ip}:{self.servidor_puerto}")
-            socket.send_json(solicitud)
-            
-            # Esperar respuesta
-            respuesta = socket.recv_json()
-            self.confirmar_recepcion(respuesta)
-            
-        except zmq.Again:
-            self.logger.warning("Timeout al esperar respuesta del servidor")
-            # Lógica de reintento podría ir aquí
+            self.confirmar_recepcion(future.result())
+        except TimeoutError:
+            self.logger.warning("Timeout al esperar respuesta del servidor (reintentos agotados)")
+        except ServidorOcupado as e:
+            self.logger.warning(f"Servidor ocupado, solicitud rechazada (reintentar en {e.reintentar_ms} ms)")
         except Exception as e:
             self.logger.error(f"Error al comunicarse con el servidor: {e}")
-        finally:
-            socket.close()
-            context.term()
     
     def confirmar_recepcion(self, respuesta):
         """Procesa la respuesta recibida del servidor"""
         self.logger.info(f"Respuesta recibida del servidor: {respuesta}")
         
+        # Un lote trae una respuesta por programa
+        if respuesta.get('tipo') == 'lote':
+            for respuesta_programa in respuesta.get('respuestas', []):
+                self.confirmar_recepcion(respuesta_programa)
+            return
+        
         # Guardar respuesta
         id_solicitud = respuesta.get('id_solicitud')
         if id_solicitud:
@@ -138,13 +369,22 @@ class Facultad:
                 self.logger.warning(f"Recursos no asignados por falta de disponibilidad: {no_asignados}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Uso: python facultad.py <nombre_facultad> [servidor_ip] [servidor_puerto]")
+    # Opciones clave=valor al final: escucha=<puerto> simular=no
+    argumentos = [a for a in sys.argv[1:] if '=' not in a]
+    opciones = dict(a.split('=', 1) for a in sys.argv[1:] if '=' in a)
+    if len(argumentos) < 1:
+        print("Uso: python facultad.py <nombre_facultad> [servidor_ip] [servidor_puerto] [respaldo_ip] [respaldo_puerto] "
+              "[escucha=<puerto>] [simular=no]")
         sys.exit(1)
     
-    nombre_facultad = sys.argv[1]
-    servidor_ip = sys.argv[2] if len(sys.argv) > 2 else "localhost"
-    servidor_puerto = int(sys.argv[3]) if len(sys.argv) > 3 else 5555
+    nombre_facultad = argumentos[0]
+    servidor_ip = argumentos[1] if len(argumentos) > 1 else "localhost"
+    servidor_puerto = int(argumentos[2]) if len(argumentos) > 2 else 5555
+    respaldo = (argumentos[3], int(argumentos[4])) if len(argumentos) > 4 else None
     
-    facultad = Facultad(nombre_facultad, servidor_ip, servidor_puerto)
+    facultad = Facultad(
+        nombre_facultad, servidor_ip, servidor_puerto, respaldo=respaldo,
+        puerto_escucha=int(opciones['escucha']) if 'escucha' in opciones else None,
+        simular=opciones['simular'] != 'no' if 'simular' in opciones else None
+    )
     facultad.iniciar()
\ No newline at end of file
@@ -0,0 +1,444 @@
+"""Reparto de los pools de recursos entre varios procesos (fragmentos).
+
+Cada fragmento es dueño de un rango contiguo de índices de cada tipo de
+recurso, con su propio asignador y su propia persistencia. El servidor
+central usa `AsignadorFragmentado` como coordinador: reparte cada pedido
+entre los fragmentos y deshace las tomas parciales cuando uno falla.
+"""
+from bisect import bisect_right
+import multiprocessing
+import zmq
+import threading
+import time
+import logging
+import sys
+import uuid
+
+from asignador import AsignadorRecursos, bloquear_en_orden, rango_fragmento
+from codec import codec_extremo, detectar_codec
+from config import FRAGMENTOS_CONFIG, PERSISTENCE_CONFIG, RECURSOS_CONFIG
+from persistencia import RegistroPersistente
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+class ErrorFragmento(Exception):
+    """Un fragmento no respondió o respondió con error"""
+
+
+class ServidorFragmento:
+    """Proceso dueño de un rango de recursos de cada tipo"""
+    def __init__(self, numero, num_fragmentos, endpoint):
+        self.logger = logging.getLogger(f'Fragmento-{numero}')
+        self.numero = numero
+        self.endpoint = endpoint
+        self.asignador = AsignadorRecursos(fragmento=numero, num_fragmentos=num_fragmentos)
+
+        # Estado de cada recurso y recursos tomados por operación, hasta que el
+        # coordinador la confirma o la anula
+        self.registro = RegistroPersistente(
+            dict(PERSISTENCE_CONFIG,
+                 log_file=f"fragmento-{numero}.wal.jsonl",
+                 snapshot_file=f"fragmento-{numero}.snapshot.json",
+                 commit_sincrono=True),
+            colecciones=('recursos', 'operaciones')
+        )
+        self.registro.cargar()
+        self._restaurar()
+        self.registro.iniciar()
+
+    def _restaurar(self):
+        """Reconstruye la ocupación de los pools desde la persistencia"""
+        asignados = {tipo: [] for tipo in AsignadorRecursos.TIPOS}
+        for id_recurso, asignado in self.registro.datos['recursos'].items():
+            tipo = self.asignador.tipo_de(id_recurso)
+            if asignado and tipo:
+                asignados[tipo].append(id_recurso)
+        for tipo, ids in asignados.items():
+            self.asignador.pool(tipo).restaurar(ids)
+
+    def iniciar(self):
+        context = zmq.Context()
+        socket = context.socket(zmq.REP)
+        socket.setsockopt(zmq.RCVTIMEO, 1000)
+        socket.bind(self.endpoint)
+        self.logger.info(f"Fragmento {self.numero} escuchando en {self.endpoint}: {self.asignador.ocupacion()}")
+
+        try:
+            while True:
+                try:
+                    datos = socket.recv()
+                except zmq.error.Again:
+                    continue
+                codec = detectar_codec(datos)
+                try:
+                    respuesta = self.atender(codec.decodificar(datos))
+                except Exception as e:
+                    self.logger.error(f"Error atendiendo operación: {e}")
+                    respuesta = {'error': str(e)}
+                socket.send(codec.codificar(respuesta))
+        except KeyboardInterrupt:
+            self.logger.info(f"Fragmento {self.numero} detenido")
+        finally:
+            self.registro.cerrar()
+            socket.close()
+            context.term()
+
+    def atender(self, mensaje):
+        """Ejecuta una operación del coordinador"""
+        op = mensaje.get('op')
+        # Tomas cuyo resultado llegó al coordinador: ya no se anularán
+        registros = [('operaciones', id_operacion, None) for id_operacion in mensaje.get('confirmar', [])]
+
+        if op == 'tomar':
+            ids = {
+                tipo: self.asignador.tomar(tipo, cantidad)
+                for tipo, cantidad in mensaje['pedidos'].items()
+            }
+            registros.extend(('recursos', id_recurso, 1) for lista in ids.values() for id_recurso in lista)
+            registros.append(('operaciones', mensaje['id_operacion'], ids))
+            self.registro.registrar_lote(registros)
+            return {'ids': ids, 'disponibles': self._disponibles()}
+
+        if op == 'liberar':
+            liberados = self._liberar(mensaje['ids'], registros)
+            self.registro.registrar_lote(registros)
+            return {'liberados': liberados, 'disponibles': self._disponibles()}
+
+        if op == 'anular':
+            # Deshace una toma cuyo resultado el coordinador no llegó a recibir
+            ids = self.registro.datos['operaciones'].get(mensaje['id_operacion'], {})
+            liberados = self._liberar(ids, registros)
+            registros.append(('operaciones', mensaje['id_operacion'], None))
+            self.registro.registrar_lote(registros)
+            return {'liberados': liberados, 'disponibles': self._disponibles()}
+
+        if op == 'estado':
+            if registros:
+                self.registro.registrar_lote(registros)
+            return {'disponibles': self._disponibles()}
+
+        return {'error': f"Operación desconocida: {op}"}
+
+    def _liberar(self, ids, registros):
+        liberados = {}
+        for tipo, lista in ids.items():
+            liberados[tipo] = self.asignador.liberar(tipo, lista)
+            registros.extend(('recursos', id_recurso, 0) for id_recurso in liberados[tipo])
+        return liberados
+
+    def _disponibles(self):
+        return {tipo: self.asignador.disponibles(tipo) for tipo in AsignadorRecursos.TIPOS}
+
+
+class PoolFragmentado:
+    """Vista de un tipo de recurso repartido entre fragmentos (misma interfaz que PoolRecursos)"""
+    def __init__(self, coordinador, tipo):
+        self.coordinador = coordinador
+        self.tipo = tipo
+        self.cantidad = RECURSOS_CONFIG[tipo]['cantidad']
+
+    def disponibles(self):
+        return self.coordinador.disponibles(self.tipo)
+
+    def asignados(self):
+        return self.cantidad - self.disponibles()
+
+    def tomar(self, cantidad):
+        return self.coordinador.tomar(self.tipo, cantidad)
+
+    def liberar(self, ids_recursos):
+        return self.coordinador.liberar(self.tipo, ids_recursos)
+
+
+class AsignadorFragmentado:
+    """Coordinador que reparte los pedidos entre los procesos fragmento"""
+    TIPOS = AsignadorRecursos.TIPOS
+
+    def __init__(self, endpoints, context=None, timeout_ms=None):
+        self.logger = logging.getLogger('AsignadorFragmentado')
+        self.endpoints = endpoints
+        self.context = context or zmq.Context.instance()
+        self.timeout_ms = timeout_ms or FRAGMENTOS_CONFIG['timeout_ms']
+        self.codec = codec_extremo('servidor_fragmento')
+
+        # Rangos de índices de cada fragmento, para enrutar liberaciones
+        self.rangos = {}
+        for tipo in self.TIPOS:
+            self.rangos[tipo] = [
+                rango_fragmento(RECURSOS_CONFIG[tipo]['cantidad'], i, len(endpoints))[0]
+                for i in range(len(endpoints))
+            ]
+        self.pools = {tipo: PoolFragmentado(self, tipo) for tipo in self.TIPOS}
+
+        # Disponibles informados por cada fragmento en su última respuesta; cada
+        # tipo se escribe solo con su lock de `locks` tomado
+        self.disponibles_fragmento = [dict.fromkeys(self.TIPOS, 0) for _ in endpoints]
+        self.caidos = {}          # fragmento -> instante del último intento
+        self.anulaciones = []     # (fragmento, id_operacion) pendientes de enviar
+        # Tomas recibidas que el fragmento aún no sabe confirmadas; viajan en su próximo mensaje
+        self.confirmaciones = {fragmento: [] for fragmento in range(len(endpoints))}
+        self.lock = threading.Lock()
+        # Un lock por tipo para planificar y tomar, como en PoolRecursos
+        self.locks = {tipo: threading.Lock() for tipo in self.TIPOS}
+        self.local = threading.local()
+        self.sockets = []
+
+    def iniciar(self, espera=10.0):
+        """Consulta el estado inicial de todos los fragmentos"""
+        limite = time.monotonic() + espera
+        for fragmento in range(len(self.endpoints)):
+            while True:
+                try:
+                    self._llamar(fragmento, {'op': 'estado'})
+                    break
+                except ErrorFragmento:
+                    if time.monotonic() > limite:
+                        self._marcar_caido(fragmento)
+                        break
+        self.logger.info(f"Coordinando {len(self.endpoints)} fragmentos: {self.ocupacion()}")
+
+    def pool(self, tipo):
+        return self.pools[tipo]
+
+    def bloquear(self, tipos=None):
+        pila = bloquear_en_orden(self.locks, tipos)
+        # Tipos cuyo lock tiene este hilo, para actualizar sus disponibles
+        self.local.tipos = set(self.TIPOS if tipos is None else tipos)
+        pila.callback(setattr, self.local, 'tipos', set())
+        return pila
+
+    def disponibles(self, tipo):
+        return sum(
+            disponibles[tipo] for fragmento, disponibles in enumerate(self.disponibles_fragmento)
+            if fragmento not in self.caidos
+        )
+
+    def tomar(self, tipo, cantidad):
+        return self.tomar_varios({tipo: cantidad})[tipo]
+
+    def tomar_varios(self, pedidos, todo_o_nada=False):
+        """Toma recursos de varios tipos repartiendo el pedido entre fragmentos.
+
+        Si un fragmento falla se anula lo que pudo haber tomado y se reintenta
+        el faltante en los demás. Con `todo_o_nada`, si no se cubre el pedido
+        completo se devuelve todo lo tomado y el resultado queda vacío.
+        """
+        self._recuperar_caidos()
+        tomados = {tipo: [] for tipo in pedidos}
+
+        for _ in range(2):
+            faltantes = {tipo: cantidad - len(tomados[tipo]) for tipo, cantidad in pedidos.items()}
+            plan = self._planificar(faltantes)
+            if not plan:
+                break
+
+            for fragmento, respuesta in self._llamar_varios(
+                {fragmento: {'op': 'tomar', 'pedidos': pedido, 'id_operacion': uuid.uuid4().hex}
+                 for fragmento, pedido in plan.items()}
+            ).items():
+                if respuesta is None:
+                    continue
+                for tipo, ids in respuesta['ids'].items():
+                    tomados[tipo].extend(ids)
+
+        incompleto = any(len(tomados[tipo]) < cantidad for tipo, cantidad in pedidos.items())
+        if todo_o_nada and incompleto:
+            for tipo, ids in tomados.items():
+                self.liberar(tipo, ids)
+            return {tipo: [] for tipo in pedidos}
+        return tomados
+
+    def _planificar(self, faltantes):
+        """Reparte los faltantes entre fragmentos vivos, primero los más libres"""
+        plan = {}
+        for tipo, faltan in faltantes.items():
+            candidatos = sorted(
+                (f for f in range(len(self.endpoints)) if f not in self.caidos),
+                key=lambda f: -self.disponibles_fragmento[f][tipo]
+            )
+            for fragmento in candidatos:
+                if faltan <= 0:
+                    break
+                cantidad = min(faltan, self.disponibles_fragmento[fragmento][tipo])
+                if cantidad > 0:
+                    plan.setdefault(fragmento, {})[tipo] = cantidad
+                    faltan -= cantidad
+        return plan
+
+    def liberar(self, tipo, ids_recursos):
+        """Devuelve recursos al fragmento dueño de cada índice"""
+        por_fragmento = {}
+        for id_recurso in ids_recursos:
+            fragmento = self._fragmento_de(tipo, id_recurso)
+            if fragmento is not None:
+                por_fragmento.setdefault(fragmento, []).append(id_recurso)
+
+        liberados = []
+        for fragmento, respuesta in self._llamar_varios(
+            {fragmento: {'op': 'liberar', 'ids': {tipo: ids}} for fragmento, ids in por_fragmento.items()},
+            anular=False
+        ).items():
+            if respuesta is not None:
+                liberados.extend(respuesta['liberados'].get(tipo, []))
+        return liberados
+
+    def _fragmento_de(self, tipo, id_recurso):
+        prefijo = RECURSOS_CONFIG[tipo]['prefijo']
+        numero = id_recurso[len(prefijo):] if isinstance(id_recurso, str) and id_recurso.startswith(prefijo) else ''
+        if not numero.isdigit():
+            return None
+        return bisect_right(self.rangos[tipo], int(numero)) - 1
+
+    def ocupacion(self):
+        return {
+            tipo: {'asignados': pool.asignados(), 'total': pool.cantidad}
+            for tipo, pool in self.pools.items()
+        }
+
+    def _socket(self, fragmento):
+        """Socket REQ del hilo actual hacia un fragmento"""
+        sockets = getattr(self.local, 'sockets', None)
+        if sockets is None:
+            sockets = self.local.sockets = {}
+        if fragmento not in sockets:
+            socket = self.context.socket(zmq.REQ)
+            socket.setsockopt(zmq.LINGER, 0)
+            socket.connect(self.endpoints[fragmento])
+            sockets[fragmento] = socket
+            with self.lock:
+                self.sockets.append(socket)
+        return sockets[fragmento]
+
+    def _descartar_socket(self, fragmento):
+        # Un REQ sin respuesta queda bloqueado: se cierra y se crea otro
+        socket = self.local.sockets.pop(fragmento)
+        with self.lock:
+            self.sockets.remove(socket)
+        socket.close()
+
+    def _llamar(self, fragmento, mensaje):
+        return self._llamar_varios({fragmento: mensaje}, anular=False, lanzar=True)[fragmento]
+
+    def _llamar_varios(self, mensajes, anular=True, lanzar=False):
+        """Envía a todos los fragmentos antes de esperar, para que trabajen en paralelo"""
+        for fragmento, mensaje in mensajes.items():
+            with self.lock:
+                confirmar, self.confirmaciones[fragmento] = self.confirmaciones[fragmento], []
+            if confirmar:
+                mensaje['confirmar'] = confirmar
+            self._socket(fragmento).send(self.codec.codificar(mensaje))
+
+        respuestas = {}
+        limite = time.monotonic() + self.timeout_ms / 1000
+        for fragmento, mensaje in mensajes.items():
+            socket = self._socket(fragmento)
+            espera = max(0, int((limite - time.monotonic()) * 1000))
+            if socket.poll(espera):
+                datos = socket.recv()
+                respuesta = detectar_codec(datos).decodificar(datos)
+                if 'error' not in respuesta:
+                    self._actualizar_disponibles(fragmento, respuesta['disponibles'])
+                    if mensaje.get('op') == 'tomar':
+                        with self.lock:
+                            self.confirmaciones[fragmento].append(mensaje['id_operacion'])
+                    respuestas[fragmento] = respuesta
+                    continue
+                self.logger.error(f"Fragmento {fragmento} respondió con error: {respuesta['error']}")
+            else:
+                self._descartar_socket(fragmento)
+                self._marcar_caido(fragmento)
+            if mensaje.get('confirmar'):
+                # No se sabe si el fragmento las procesó: se reenvían (borrar dos veces no importa)
+                with self.lock:
+                    self.confirmaciones[fragmento].extend(mensaje['confirmar'])
+
+            if lanzar:
+                raise ErrorFragmento(f"Fragmento {fragmento} no disponible")
+            if anular and mensaje.get('op') == 'tomar':
+                with self.lock:
+                    self.anulaciones.append((fragmento, mensaje['id_operacion']))
+            respuestas[fragmento] = None
+        return respuestas
+
+    def _actualizar_disponibles(self, fragmento, disponibles):
+        """Guarda los disponibles de un fragmento, tipo por tipo, con el lock del tipo"""
+        propios = getattr(self.local, 'tipos', set())
+        for tipo, cantidad in disponibles.items():
+            if tipo in propios:
+                self.disponibles_fragmento[fragmento][tipo] = cantidad
+            elif self.locks[tipo].acquire(blocking=False):
+                try:
+                    self.disponibles_fragmento[fragmento][tipo] = cantidad
+                finally:
+                    self.locks[tipo].release()
+            # Con el lock en otro hilo se omite: ese tipo solo cambia con su lock
+            # tomado, y quien lo tiene actualiza la cifra con su propia respuesta
+
+    def _marcar_caido(self, fragmento):
+        with self.lock:
+            if fragmento not in self.caidos:
+                self.logger.warning(f"Fragmento {fragmento} no responde; se excluye del reparto")
+            self.caidos[fragmento] = time.monotonic()
+
+    def _recuperar_caidos(self):
+        """Reintenta los fragmentos caídos (como mucho una vez por segundo) y envía sus anulaciones"""
+        with self.lock:
+            vencidos = [f for f, instante in self.caidos.items() if time.monotonic() - instante > 1.0]
+            for fragmento in vencidos:
+                self.caidos[fragmento] = time.monotonic()
+
+        for fragmento in vencidos:
+            try:
+                self._llamar(fragmento, {'op': 'estado'})
+            except ErrorFragmento:
+                continue
+
+            with self.lock:
+                self.caidos.pop(fragmento, None)
+                pendientes = [a for a in self.anulaciones if a[0] == fragmento]
+                self.anulaciones = [a for a in self.anulaciones if a[0] != fragmento]
+            for _, id_operacion in pendientes:
+                try:
+                    self._llamar(fragmento, {'op': 'anular', 'id_operacion': id_operacion})
+                except ErrorFragmento:
+                    with self.lock:
+                        self.anulaciones.append((fragmento, id_operacion))
+            self.logger.info(f"Fragmento {fragmento} recuperado")
+
+    def cerrar(self):
+        """Cierra los sockets de todos los hilos (necesario antes de terminar el contexto)"""
+        with self.lock:
+            for socket in self.sockets:
+                socket.close()
+            self.sockets.clear()
+
+
+def endpoint_fragmento(numero):
+    return f"tcp://{FRAGMENTOS_CONFIG['host']}:{FRAGMENTOS_CONFIG['puerto_base'] + numero}"
+
+
+def servir_fragmento(numero, num_fragmentos):
+    ServidorFragmento(numero, num_fragmentos, f"tcp://*:{FRAGMENTOS_CONFIG['puerto_base'] + numero}").iniciar()
+
+
+def lanzar_fragmentos(num_fragmentos):
+    """Inicia un proceso por fragmento en esta máquina"""
+    procesos = []
+    for numero in range(num_fragmentos):
+        proceso = multiprocessing.Process(target=servir_fragmento, args=(numero, num_fragmentos), daemon=True)
+        proceso.start()
+        procesos.append(proceso)
+    return procesos
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Uso: python fragmentos.py <numero_fragmento> <total_fragmentos>")
+        sys.exit(1)
+
+    servir_fragmento(int(sys.argv[1]), int(sys.argv[2]))
@@ -0,0 +1,120 @@
+"""Reservas por franja horaria: un juego de pools por franja, con vencimiento.
+
+Cada franja (p. ej. un semestre "2025-1" o un bloque "2025-1/lunes-07")
+tiene sus propios pools, así que lo asignado en una franja no agota las
+demás. Al vencer, la franja se descarta completa: sus recursos vuelven a
+estar libres sin liberarlos uno por uno. Los vencimientos se guardan en
+un heap y se barren fuera del camino de las solicitudes.
+"""
+from datetime import datetime
+import heapq
+import re
+import threading
+import time
+
+from asignador import AsignadorRecursos
+from config import FRANJAS_CONFIG, RECURSOS_CONFIG
+
+SEMESTRE = re.compile(r'^(\d{4})-([12])(?:/|$)')
+
+
+def semestre(fecha=None):
+    """Franja del semestre de `fecha` y el instante (epoch) en que termina"""
+    fecha = fecha or datetime.now()
+    franja = f"{fecha.year}-{1 if fecha.month <= 6 else 2}"
+    return franja, vencimiento_por_defecto(franja)
+
+
+def vencimiento_por_defecto(franja, ahora=None):
+    """Las franjas de semestre ("2025-1", "2025-1/...") vencen al terminar el semestre"""
+    ahora = ahora or time.time()
+    coincidencia = SEMESTRE.match(franja)
+    if coincidencia:
+        anio, periodo = int(coincidencia.group(1)), int(coincidencia.group(2))
+        return datetime(anio, 7, 1).timestamp() if periodo == 1 else datetime(anio + 1, 1, 1).timestamp()
+    return ahora + FRANJAS_CONFIG['duracion_s']
+
+
+class FranjasReserva:
+    """Índice franja -> pools de recursos, con un heap de vencimientos.
+
+    `lock` protege solo el índice: cada franja tiene los locks de sus
+    propios pools, así que las reservas en franjas distintas no se esperan.
+    Quien necesite a la vez el índice y los pools toma primero el índice.
+    """
+    def __init__(self, catalogo=None):
+        self.catalogo = catalogo or RECURSOS_CONFIG
+        self.asignadores = {}
+        self.vencimientos = {}
+        # (vence, franja); las entradas desactualizadas se descartan al barrer
+        self.heap = []
+        self.lock = threading.RLock()
+        # Pools de una franja que nadie reservó: solo se leen, nunca se toman
+        self.vacia = AsignadorRecursos(self.catalogo)
+
+    def obtener(self, franja, vence=None, crear=True):
+        """Pools de la franja; la crea si hace falta y extiende su vencimiento"""
+        asignador = self.asignadores.get(franja)
+        if asignador is not None and not (vence and vence > self.vencimientos.get(franja, vence)):
+            return asignador
+        with self.lock:
+            asignador = self.asignadores.get(franja)
+            if asignador is None:
+                if not crear:
+                    return None
+                asignador = self.asignadores[franja] = AsignadorRecursos(self.catalogo)
+                self._programar(franja, vence or vencimiento_por_defecto(franja))
+            elif vence and vence > self.vencimientos[franja]:
+                self._programar(franja, vence)
+            return asignador
+
+    def vigente(self, franja, asignador):
+        """True si `asignador` sigue siendo el de la franja (no vencida ni reemplazada)"""
+        return self.asignadores.get(franja) is asignador
+
+    def _programar(self, franja, vence):
+        self.vencimientos[franja] = vence
+        heapq.heappush(self.heap, (vence, franja))
+
+    def vence(self, franja):
+        return self.vencimientos.get(franja)
+
+    def vencidas(self, ahora=None):
+        """Retira y devuelve las franjas cuyo vencimiento ya pasó"""
+        ahora = ahora or time.time()
+        vencidas = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= ahora:
+                vence, franja = heapq.heappop(self.heap)
+                if self.vencimientos.get(franja) == vence:
+                    self.eliminar(franja)
+                    vencidas.append(franja)
+        return vencidas
+
+    def eliminar(self, franja):
+        with self.lock:
+            self.asignadores.pop(franja, None)
+            self.vencimientos.pop(franja, None)
+
+    def restaurar(self, franja, vence, recursos):
+        """Recrea una franja con exactamente los recursos indicados asignados"""
+        asignador = self.obtener(franja, vence)
+        with asignador.bloquear():
+            for tipo, ids in recursos.items():
+                asignador.pool(tipo).restaurar(ids)
+
+    def disponibilidad(self, franja):
+        """Cantidad de recursos libres de cada tipo en la franja (todos si nadie la ha reservado)"""
+        asignador = self.asignadores.get(franja) or self.vacia
+        return {tipo: asignador.disponibles(tipo) for tipo in AsignadorRecursos.TIPOS}
+
+    def libres(self, franja):
+        """Identificadores libres de cada tipo en la franja; recorre los pools completos"""
+        asignador = self.asignadores.get(franja) or self.vacia
+        return {
+            tipo: asignador.pool(tipo).ids_libres()
+            for tipo in AsignadorRecursos.TIPOS
+        }
+
+    def __len__(self):
+        return len(self.asignadores)
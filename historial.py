@@ -0,0 +1,395 @@
+"""Historial de solicitudes del servidor en SQLite, con memoria acotada.
+
+Las escrituras siguen pasando por el log de escritura anticipada de
+`RegistroPersistente` (group commit). Al compactar, las entradas del log
+se vuelcan en una sola transacción a una base SQLite indexada por
+facultad, programa, timestamp y estado, y salen de memoria: solo quedan
+las entradas aún no compactadas y un LRU de las leídas hace poco.
+"""
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+import json
+import logging
+import sqlite3
+import sys
+import threading
+
+import zmq
+
+from config import PERSISTENCE_CONFIG
+from persistencia import RegistroPersistente
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS registros (
+    coleccion TEXT NOT NULL,
+    id TEXT NOT NULL,
+    orden INTEGER NOT NULL,
+    facultad TEXT,
+    programa TEXT,
+    timestamp TEXT,
+    estado TEXT,
+    datos TEXT NOT NULL,
+    PRIMARY KEY (coleccion, id)
+);
+CREATE INDEX IF NOT EXISTS registros_facultad ON registros (coleccion, facultad, orden);
+CREATE INDEX IF NOT EXISTS registros_programa ON registros (coleccion, programa, orden);
+CREATE INDEX IF NOT EXISTS registros_timestamp ON registros (coleccion, timestamp);
+CREATE INDEX IF NOT EXISTS registros_estado ON registros (coleccion, estado, orden);
+CREATE TABLE IF NOT EXISTS contadores (
+    nombre TEXT PRIMARY KEY,
+    valor INTEGER NOT NULL
+);
+"""
+
+# Conserva el orden de la primera vez que se registró cada id
+INSERTAR = """
+INSERT INTO registros (coleccion, id, orden, facultad, programa, timestamp, estado, datos)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (coleccion, id) DO UPDATE SET
+    facultad = excluded.facultad, programa = excluded.programa, timestamp = excluded.timestamp,
+    estado = excluded.estado, datos = excluded.datos
+"""
+
+
+def columnas(datos):
+    """Valores indexados de un registro: (facultad, programa, timestamp, estado)"""
+    if not isinstance(datos, dict):
+        return None, None, None, None
+    estado = datos.get('estado')
+    if estado is None and 'pendiente' in datos:
+        # Alertas de solicitudes no atendidas
+        estado = 'pendiente' if datos['pendiente'] else 'cerrada'
+    return datos.get('facultad'), datos.get('programa'), datos.get('timestamp'), estado
+
+
+class HistorialSolicitudes(RegistroPersistente):
+    """Registro del servidor con SQLite como snapshot y memoria acotada.
+
+    Cada id recibe un número de orden creciente la primera vez que se
+    registra; `nuevo_orden` entrega números de la misma secuencia para
+    construir ids que no se repiten. Los números se reservan en la base por
+    bloques de `bloque_orden`: tras un reinicio se sigue después del último
+    bloque reservado, aunque lo entregado no haya llegado a registrarse.
+    """
+    def __init__(self, config=None):
+        config = config or PERSISTENCE_CONFIG
+        super().__init__(config)
+        self.logger = logging.getLogger('HistorialSolicitudes')
+        self.archivo_base = config['base_file']
+        self.max_cache = config['max_cache']
+
+        # Entradas registradas desde la última compactación: id -> (secuencia, orden, datos)
+        self.recientes = {coleccion: {} for coleccion in self.colecciones}
+        self.ultimo_orden = 0
+        self.orden_reservado = 0
+        self.bloque_orden = config['bloque_orden']
+
+        # LRU de entradas ya compactadas: (coleccion, id) -> (orden, datos)
+        self.cache = OrderedDict()
+        self.lock_cache = threading.Lock()
+
+        # sqlite3 no comparte conexiones entre hilos: una por hilo
+        self.local = threading.local()
+        self.conexiones = []
+        self.lock_conexiones = threading.Lock()
+
+    @property
+    def solicitudes(self):
+        return VistaColeccion(self, 'solicitudes')
+
+    @property
+    def solicitudes_no_atendidas(self):
+        return VistaColeccion(self, 'solicitudes_no_atendidas')
+
+    def _conexion(self):
+        conexion = getattr(self.local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.archivo_base, check_same_thread=False)
+            # Las consultas no esperan a la transacción de la compactación
+            conexion.execute('PRAGMA journal_mode=WAL')
+            self.local.conexion = conexion
+            with self.lock_conexiones:
+                self.conexiones.append(conexion)
+        return conexion
+
+    def cargar(self):
+        """Abre la base y reproduce encima la cola del log"""
+        nueva = not Path(self.archivo_base).exists()
+        self._conexion().executescript(ESQUEMA)
+        if nueva:
+            self._importar_formato_anterior()
+        conexion = self._conexion()
+        self.ultimo_orden = max(
+            conexion.execute('SELECT COALESCE(MAX(orden), 0) FROM registros').fetchone()[0],
+            conexion.execute("SELECT COALESCE(MAX(valor), 0) FROM contadores WHERE nombre = 'orden'").fetchone()[0]
+        )
+        self.orden_reservado = self.ultimo_orden
+
+        def reproducir(coleccion, id_registro, datos):
+            self._aplicar(coleccion, id_registro, datos, 0)
+
+        self.registros_en_log = self._reproducir_log(reproducir, reparar=True)
+        self.logger.info(f"Historial abierto en {self.archivo_base} ({self.registros_en_log} del log)")
+
+    def _importar_formato_anterior(self):
+        """Pasa a la base el snapshot JSON (o los archivos completos) de versiones anteriores"""
+        if Path(self.archivo_snapshot).exists():
+            datos = self._leer_snapshot()
+        elif self._cargar_legados():
+            datos, self.datos = self.datos, {coleccion: {} for coleccion in self.colecciones}
+        else:
+            return
+        filas = []
+        for coleccion, registros in datos.items():
+            for id_registro, valor in registros.items():
+                self.ultimo_orden += 1
+                filas.append((coleccion, id_registro, self.ultimo_orden, valor))
+        self._volcar(filas)
+        self.logger.info(f"Importados {len(filas)} registros del formato anterior")
+
+    def nuevo_orden(self):
+        with self.condicion:
+            self.ultimo_orden += 1
+            if self.ultimo_orden > self.orden_reservado:
+                self._reservar_ordenes(self.ultimo_orden + self.bloque_orden - 1)
+            return self.ultimo_orden
+
+    def _reservar_ordenes(self, hasta):
+        """Guarda en la base el mayor número que puede entregarse antes de reservar otro bloque"""
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute(
+                "INSERT INTO contadores (nombre, valor) VALUES ('orden', ?) "
+                "ON CONFLICT (nombre) DO UPDATE SET valor = excluded.valor", (hasta,)
+            )
+        self.orden_reservado = hasta
+
+    def _aplicar(self, coleccion, id_registro, datos, secuencia):
+        anterior = self.recientes[coleccion].get(id_registro)
+        if anterior is not None:
+            orden = anterior[1]
+        else:
+            # Una actualización de algo ya compactado conserva su orden, como en la base
+            with self.lock_cache:
+                cacheado = self.cache.get((coleccion, id_registro))
+            if cacheado is not None:
+                orden = cacheado[0]
+            else:
+                fila = self._conexion().execute(
+                    'SELECT orden FROM registros WHERE coleccion = ? AND id = ?', (coleccion, id_registro)
+                ).fetchone()
+                if fila is not None:
+                    orden = fila[0]
+                else:
+                    self.ultimo_orden += 1
+                    orden = self.ultimo_orden
+        self.recientes[coleccion][id_registro] = (secuencia, orden, datos)
+
+    def _volcar(self, filas):
+        """Inserta o actualiza (coleccion, id, orden, datos) en una sola transacción"""
+        conexion = self._conexion()
+        with conexion:
+            conexion.executemany(INSERTAR, [
+                (coleccion, id_registro, orden, *columnas(datos), json.dumps(datos, separators=(',', ':')))
+                for coleccion, id_registro, orden, datos in filas
+            ])
+
+    def compactar(self):
+        """Vuelca a la base lo que ya está en el log, trunca el log y lo saca de memoria.
+
+        Corre en el hilo de escritura, después de confirmar el último lote,
+        así que todo lo registrado hasta `secuencia_durable` está en el log.
+        Lo registrado después sigue en memoria y va al log nuevo.
+        """
+        with self.condicion:
+            limite = self.secuencia_durable
+            filas = [
+                (coleccion, id_registro, orden, datos)
+                for coleccion, registros in self.recientes.items()
+                for id_registro, (secuencia, orden, datos) in registros.items()
+                if secuencia <= limite
+            ]
+        try:
+            self._volcar(filas)
+            self.log.close()
+            self.log = open(self.archivo_log, 'w')
+            self.registros_en_log = 0
+        except Exception as e:
+            self.logger.error(f"Error compactando el log: {e}")
+            if self.log.closed:
+                self.log = open(self.archivo_log, 'a')
+            return
+
+        with self.condicion:
+            for coleccion, id_registro, _, _ in filas:
+                actual = self.recientes[coleccion].get(id_registro)
+                if actual is not None and actual[0] <= limite:
+                    del self.recientes[coleccion][id_registro]
+        for coleccion, id_registro, orden, datos in filas:
+            self._cachear((coleccion, id_registro), orden, datos)
+        self.logger.info(f"{len(filas)} registros compactados en {self.archivo_base}")
+
+    def _cachear(self, clave, orden, datos):
+        with self.lock_cache:
+            self.cache[clave] = (orden, datos)
+            self.cache.move_to_end(clave)
+            if len(self.cache) > self.max_cache:
+                self.cache.popitem(last=False)
+
+    def obtener(self, coleccion, id_registro):
+        """Un registro por id, o None"""
+        reciente = self.recientes[coleccion].get(id_registro)
+        if reciente is not None:
+            return reciente[2]
+        clave = (coleccion, id_registro)
+        with self.lock_cache:
+            if clave in self.cache:
+                self.cache.move_to_end(clave)
+                return self.cache[clave][1]
+        fila = self._conexion().execute(
+            'SELECT orden, datos FROM registros WHERE coleccion = ? AND id = ?', clave
+        ).fetchone()
+        if fila is None:
+            return None
+        datos = json.loads(fila[1])
+        self._cachear(clave, fila[0], datos)
+        return datos
+
+    def consultar(self, coleccion='solicitudes', facultad=None, programa=None, estado=None,
+                  desde=None, hasta=None, limite=100):
+        """Registros que cumplen los filtros, del más reciente al más antiguo: [(id, datos)].
+
+        `desde` y `hasta` comparan con el timestamp ('YYYY-MM-DD HH:MM:SS').
+        Con `limite` None se devuelven todos.
+        """
+        filtros = {'facultad': facultad, 'programa': programa, 'estado': estado}
+
+        def cumple(datos):
+            valores = dict(zip(('facultad', 'programa', 'timestamp', 'estado'), columnas(datos)))
+            if any(valor is not None and valores[columna] != valor for columna, valor in filtros.items()):
+                return False
+            timestamp = valores['timestamp'] or ''
+            return (desde is None or timestamp >= desde) and (hasta is None or timestamp <= hasta)
+
+        # Primero la memoria: si la compactación mueve algo mientras tanto, lo trae la base
+        with self.condicion:
+            recientes = dict(self.recientes[coleccion])
+        encontrados = [
+            (orden, id_registro, datos) for id_registro, (_, orden, datos) in recientes.items() if cumple(datos)
+        ]
+
+        condiciones, parametros = ['coleccion = ?'], [coleccion]
+        for columna, valor in filtros.items():
+            if valor is not None:
+                condiciones.append(f"{columna} = ?")
+                parametros.append(valor)
+        if desde is not None:
+            condiciones.append('timestamp >= ?')
+            parametros.append(desde)
+        if hasta is not None:
+            condiciones.append('timestamp <= ?')
+            parametros.append(hasta)
+        cursor = self._conexion().execute(
+            f"SELECT orden, id, datos FROM registros WHERE {' AND '.join(condiciones)} ORDER BY orden DESC",
+            parametros
+        )
+        de_la_base = 0
+        for orden, id_registro, datos in cursor:
+            if limite is not None and de_la_base >= limite:
+                break
+            # La versión en memoria es más nueva que la de la base
+            if id_registro not in recientes:
+                encontrados.append((orden, id_registro, json.loads(datos)))
+                de_la_base += 1
+        cursor.close()
+
+        encontrados.sort(key=lambda encontrado: encontrado[0], reverse=True)
+        return [(id_registro, datos) for _, id_registro, datos in encontrados[:limite]]
+
+    def ids(self, coleccion):
+        with self.condicion:
+            recientes = list(self.recientes[coleccion])
+        en_base = [fila[0] for fila in self._conexion().execute(
+            'SELECT id FROM registros WHERE coleccion = ? ORDER BY orden', (coleccion,)
+        )]
+        vistos = set(en_base)
+        return en_base + [id_registro for id_registro in recientes if id_registro not in vistos]
+
+    def copia(self):
+        """Historial completo (p. ej. para sincronizar una réplica)"""
+        with self.condicion:
+            recientes = {coleccion: dict(registros) for coleccion, registros in self.recientes.items()}
+        copia = {coleccion: {} for coleccion in self.colecciones}
+        for coleccion, id_registro, datos in self._conexion().execute('SELECT coleccion, id, datos FROM registros'):
+            if coleccion in copia:
+                copia[coleccion][id_registro] = json.loads(datos)
+        for coleccion, registros in recientes.items():
+            for id_registro, (_, _, datos) in registros.items():
+                copia[coleccion][id_registro] = datos
+        return copia
+
+    def tamanios(self):
+        """Entradas en memoria, para las métricas"""
+        return {
+            'recientes': sum(len(registros) for registros in self.recientes.values()),
+            'cache': len(self.cache)
+        }
+
+    def cerrar(self):
+        super().cerrar()
+        with self.lock_conexiones:
+            for conexion in self.conexiones:
+                conexion.close()
+            self.conexiones.clear()
+        self.local = threading.local()
+
+
+class VistaColeccion(Mapping):
+    """Acceso de solo lectura a una colección del historial, como un dict"""
+    def __init__(self, historial, coleccion):
+        self.historial = historial
+        self.coleccion = coleccion
+
+    def __getitem__(self, id_registro):
+        datos = self.historial.obtener(self.coleccion, id_registro)
+        if datos is None:
+            raise KeyError(id_registro)
+        return datos
+
+    def __iter__(self):
+        return iter(self.historial.ids(self.coleccion))
+
+    def __len__(self):
+        return len(self.historial.ids(self.coleccion))
+
+
+def consultar_servidor(host='localhost', puerto=5555, timeout_ms=5000, **filtros):
+    """Consulta el historial de un servidor central; None si no responde"""
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(f"tcp://{host}:{puerto}")
+    try:
+        socket.send_string(json.dumps(dict(filtros, tipo='consulta')))
+        if not socket.poll(timeout_ms):
+            return None
+        return json.loads(socket.recv())
+    finally:
+        socket.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python historial.py <host> [puerto] [campo=valor ...]  (facultad, programa, estado, desde, hasta, limite, coleccion)")
+        sys.exit(1)
+    host = sys.argv[1]
+    puerto = int(sys.argv[2]) if len(sys.argv) > 2 and '=' not in sys.argv[2] else 5555
+    filtros = dict(argumento.split('=', 1) for argumento in sys.argv[2:] if '=' in argumento)
+    if 'limite' in filtros:
+        filtros['limite'] = int(filtros['limite'])
+    respuesta = consultar_servidor(host, puerto, **filtros)
+    if respuesta is None:
+        print(f"El servidor {host}:{puerto} no respondió")
+        sys.exit(1)
+    print(json.dumps(respuesta, indent=2, ensure_ascii=False))
@@ -0,0 +1,154 @@
+"""Respuestas recientes del servidor por clave de idempotencia.
+
+Los clientes marcan cada solicitud con una `clave_idempotencia` que se
+mantiene en sus reenvíos (por timeout o al conmutar al respaldo). El
+servidor guarda la respuesta bajo esa clave en un LRU con vencimiento: un
+reenvío recibe la misma respuesta sin volver a tomar recursos ni escribir
+en el historial. Si el reenvío llega mientras la original se procesa en
+otro worker, espera su resultado en lugar de procesarse dos veces.
+
+Con un `RegistroPersistente` (colección 'respuestas') cada respuesta se
+anota en su log antes de entregarse, con el vencimiento en hora de pared,
+y se restaura al arrancar: un reenvío que llega después de un reinicio
+tampoco se procesa dos veces. Las claves que salen del LRU se borran del
+registro en el lote de la respuesta siguiente.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future
+import threading
+import time
+
+from config import IDEMPOTENCIA_CONFIG
+
+
+def clave_de(mensaje):
+    """Clave de caché de una solicitud, o None si no trae clave de idempotencia.
+
+    La clave del cliente se acota por facultad: dos facultades pueden
+    generar la misma.
+    """
+    clave = mensaje.get('clave_idempotencia')
+    if clave is None:
+        return None
+    return f"{mensaje.get('facultad', '')}\x00{clave}"
+
+
+class CacheRespuestas:
+    """LRU de respuestas con vencimiento y registro de las solicitudes en proceso"""
+    def __init__(self, config=None, registro=None):
+        config = config or IDEMPOTENCIA_CONFIG
+        self.ttl_s = config['ttl_s']
+        self.max_respuestas = config['max_respuestas']
+        # clave -> (vence, respuesta), de la menos a la más reciente
+        self.respuestas = OrderedDict()
+        # clave -> Future de la solicitud que se está procesando
+        self.en_proceso = {}
+        self.lock = threading.Lock()
+        # Persistencia opcional de las respuestas, y claves descartadas aún no borradas de ella
+        self.registro = registro
+        self.descartadas = []
+
+    def cargar(self):
+        """Restaura las respuestas vigentes del registro y empieza a anotar las nuevas"""
+        if self.registro is None:
+            return
+        self.registro.cargar()
+        ahora, reloj = time.time(), time.monotonic()
+        # El vencimiento se fija al guardar: ordenar por él recupera el orden del LRU
+        guardadas = sorted(self.registro.datos['respuestas'].items(), key=lambda entrada: entrada[1]['vence'])
+        with self.lock:
+            self.respuestas.clear()
+            for clave, entrada in guardadas:
+                if entrada['vence'] > ahora:
+                    self.respuestas[clave] = (reloj + entrada['vence'] - ahora, entrada['respuesta'])
+            while len(self.respuestas) > self.max_respuestas:
+                self.respuestas.popitem(last=False)
+            self.descartadas = [clave for clave, _ in guardadas if clave not in self.respuestas]
+        self.registro.iniciar()
+
+    def cerrar(self):
+        if self.registro is not None:
+            self.registro.cerrar()
+
+    def reservar(self, clave):
+        """None si la clave es nueva y quien llama debe procesarla.
+
+        Si no, devuelve la respuesta guardada o el Future de la solicitud
+        original que sigue en proceso.
+        """
+        with self.lock:
+            entrada = self.respuestas.get(clave)
+            if entrada is not None:
+                if entrada[0] > time.monotonic():
+                    self.respuestas.move_to_end(clave)
+                    return entrada[1]
+                self._descartar(clave)
+            future = self.en_proceso.get(clave)
+            if future is not None:
+                return future
+            self.en_proceso[clave] = Future()
+            return None
+
+    def completar(self, clave, respuesta, guardar=True):
+        """Entrega la respuesta a los reenvíos en espera y la guarda (salvo errores)"""
+        if guardar:
+            # Antes de entregarla: un reenvío tras un reinicio la encuentra
+            self._persistir({clave: respuesta})
+        with self.lock:
+            future = self.en_proceso.pop(clave, None)
+            if guardar:
+                self._guardar(clave, respuesta)
+        if future is not None:
+            future.set_result(respuesta)
+
+    def guardar(self, clave, respuesta):
+        """Guarda una respuesta procesada en otro servidor (réplica)"""
+        self._persistir({clave: respuesta})
+        with self.lock:
+            self._guardar(clave, respuesta)
+
+    def _guardar(self, clave, respuesta):
+        self.respuestas[clave] = (time.monotonic() + self.ttl_s, respuesta)
+        self.respuestas.move_to_end(clave)
+        while len(self.respuestas) > self.max_respuestas:
+            self._descartar(next(iter(self.respuestas)))
+
+    def _descartar(self, clave):
+        del self.respuestas[clave]
+        if self.registro is not None:
+            self.descartadas.append(clave)
+
+    def _persistir(self, respuestas):
+        """Anota respuestas {clave: respuesta} en el registro, junto con los borrados pendientes"""
+        if self.registro is None:
+            return
+        vence = time.time() + self.ttl_s
+        with self.lock:
+            # Una clave que volvió a guardarse después de descartarse no se borra
+            descartadas = [clave for clave in self.descartadas if clave not in self.respuestas]
+            self.descartadas = []
+        registros = (
+            [('respuestas', clave, None) for clave in descartadas if clave not in respuestas]
+            + [('respuestas', clave, {'vence': vence, 'respuesta': respuesta}) for clave, respuesta in respuestas.items()]
+        )
+        if registros:
+            self.registro.registrar_lote(registros)
+
+    def copia(self):
+        """Respuestas vigentes {clave: respuesta}, de la menos a la más reciente"""
+        ahora = time.monotonic()
+        with self.lock:
+            return {clave: respuesta for clave, (vence, respuesta) in self.respuestas.items() if vence > ahora}
+
+    def restaurar(self, respuestas):
+        """Reemplaza las respuestas por las de otro servidor (sincronización de la réplica)"""
+        with self.lock:
+            for clave in list(self.respuestas):
+                self._descartar(clave)
+        self._persistir(respuestas)
+        with self.lock:
+            for clave, respuesta in respuestas.items():
+                self._guardar(clave, respuesta)
+
+    def __len__(self):
+        return len(self.respuestas)
@@ -0,0 +1,188 @@
+"""Etapa de ingreso del servidor en modo broker: cola acotada y reparto justo.
+
+Reemplaza al `zmq.proxy` entre el ROUTER de los clientes y los workers.
+Las solicitudes esperan en una cola por facultad y salen hacia los
+workers por Deficit Round Robin ponderado, de modo que una facultad que
+inunda el servidor no deja sin turno a las demás. Si la cola total o la
+de una facultad está llena, la solicitud se rechaza de inmediato con una
+respuesta "ocupado" en lugar de dejar crecer la latencia sin límite.
+"""
+from collections import OrderedDict, deque
+import asyncio
+import time
+import logging
+
+import zmq
+
+from codec import JSON, detectar_codec
+from config import INGRESO_CONFIG
+
+
+class ColaJusta:
+    """Colas por flujo atendidas con Deficit Round Robin ponderado (costo 1 por mensaje)"""
+    def __init__(self, max_total, max_por_flujo, pesos=None):
+        self.max_total = max_total
+        self.max_por_flujo = max_por_flujo
+        self.pesos = pesos or {}
+        self.colas = {}
+        self.deficit = {}
+        # Flujos con mensajes en espera, en orden de turno
+        self.activos = deque()
+        self.total = 0
+
+    def peso(self, flujo):
+        return self.pesos.get(flujo, 1)
+
+    def agregar(self, flujo, elemento):
+        """Encola un elemento; False si no hay lugar (admisión rechazada)"""
+        cola = self.colas.get(flujo)
+        if self.total >= self.max_total or (cola is not None and len(cola) >= self.max_por_flujo):
+            return False
+        if cola is None:
+            cola = self.colas[flujo] = deque()
+            self.deficit[flujo] = self.peso(flujo)
+            self.activos.append(flujo)
+        cola.append(elemento)
+        self.total += 1
+        return True
+
+    def siguiente(self):
+        """Siguiente elemento según el turno; None si no hay nada en espera"""
+        while self.activos:
+            flujo = self.activos[0]
+            if self.deficit[flujo] >= 1:
+                self.deficit[flujo] -= 1
+                cola = self.colas[flujo]
+                elemento = cola.popleft()
+                self.total -= 1
+                if not cola:
+                    # Un flujo que se vacía no acumula crédito para después
+                    self.activos.popleft()
+                    del self.colas[flujo]
+                    del self.deficit[flujo]
+                return elemento
+            # Agotó su cuota en esta ronda: pasa al final con una cuota nueva
+            self.activos.rotate(-1)
+            self.deficit[flujo] += self.peso(flujo)
+        return None
+
+    def __len__(self):
+        return self.total
+
+
+class IngresoJusto:
+    """Ingreso asíncrono entre el ROUTER de clientes y el DEALER de los workers.
+
+    Solo deja `max_en_vuelo` solicitudes en los workers; el resto espera en
+    la `ColaJusta`. El flujo de cada conexión es la facultad que nombra su
+    primera solicitud: solo esa se decodifica aquí, las demás pasan intactas.
+    """
+    def __init__(self, context, endpoint_frontend, endpoint_backend, num_workers, metricas=None, config=None):
+        self.logger = logging.getLogger('IngresoJusto')
+        config = config or INGRESO_CONFIG
+        # Mismo contexto que los workers: el backend es inproc
+        self.context = context
+        self.endpoint_frontend = endpoint_frontend
+        self.endpoint_backend = endpoint_backend
+        self.frontend = None
+        self.backend = None
+        self.metricas = metricas
+
+        self.cola = ColaJusta(config['max_cola'], config['max_por_facultad'], config['pesos'])
+        self.max_en_vuelo = num_workers * config['en_vuelo_por_worker']
+        self.reintentar_ms = config['reintentar_ms']
+        self.en_vuelo = 0
+        # Mensajes de clientes leídos por vuelta, para no postergar las respuestas de los workers
+        self.max_rafaga = 256
+
+        # Identidad de conexión -> facultad (acotado: el ROUTER no avisa desconexiones)
+        self.flujos = OrderedDict()
+        self.max_flujos = 10000
+
+    async def ejecutar(self):
+        self.frontend = self.context.socket(zmq.ROUTER)
+        self.frontend.bind(self.endpoint_frontend)
+        self.backend = self.context.socket(zmq.DEALER)
+        self.backend.bind(self.endpoint_backend)
+
+        # El descriptor de ZMQ avisa por flanco: ante cada aviso se trabaja hasta
+        # que una vuelta completa no reciba ni envíe nada
+        loop = asyncio.get_running_loop()
+        aviso = asyncio.Event()
+        for socket in (self.frontend, self.backend):
+            loop.add_reader(socket.getsockopt(zmq.FD), aviso.set)
+        try:
+            while True:
+                await aviso.wait()
+                aviso.clear()
+                while self._recibir_workers() + self._recibir_clientes() + self._despachar():
+                    pass
+        finally:
+            for socket in (self.frontend, self.backend):
+                loop.remove_reader(socket.getsockopt(zmq.FD))
+                socket.close(linger=0)
+
+    def _recibir_clientes(self):
+        for recibidos in range(self.max_rafaga):
+            try:
+                tramas = self.frontend.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return recibidos
+            flujo = self._flujo(tramas[0], tramas[-1])
+            if not self.cola.agregar(flujo, (tramas, time.perf_counter())):
+                self._rechazar(tramas, flujo)
+        return self.max_rafaga
+
+    def _recibir_workers(self):
+        recibidos = 0
+        while True:
+            try:
+                tramas = self.backend.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return recibidos
+            recibidos += 1
+            self.en_vuelo -= 1
+            self.frontend.send_multipart(tramas)
+
+    def _despachar(self):
+        enviados = 0
+        while self.en_vuelo < self.max_en_vuelo and len(self.cola):
+            tramas, llegada = self.cola.siguiente()
+            if self.metricas:
+                self.metricas.observar('espera_cola', time.perf_counter() - llegada)
+            self.en_vuelo += 1
+            enviados += 1
+            self.backend.send_multipart(tramas)
+        return enviados
+
+    def _flujo(self, identidad, cuerpo):
+        flujo = self.flujos.get(identidad)
+        if flujo is not None:
+            self.flujos.move_to_end(identidad)
+            return flujo
+        try:
+            mensaje = detectar_codec(cuerpo).decodificar(cuerpo)
+            flujo = str(mensaje.get('facultad') or identidad.hex())
+        except Exception:
+            flujo = identidad.hex()
+        self.flujos[identidad] = flujo
+        if len(self.flujos) > self.max_flujos:
+            self.flujos.popitem(last=False)
+        return flujo
+
+    def _rechazar(self, tramas, flujo):
+        """Responde "ocupado" sin pasar por los workers"""
+        cuerpo = tramas[-1]
+        codec = JSON
+        respuesta = {'tipo': 'ocupado', 'error': 'Servidor ocupado', 'reintentar_ms': self.reintentar_ms}
+        try:
+            codec = detectar_codec(cuerpo)
+            mensaje = codec.decodificar(cuerpo)
+            if isinstance(mensaje, dict) and 'id_peticion' in mensaje:
+                respuesta['id_peticion'] = mensaje['id_peticion']
+        except Exception:
+            pass
+        if self.metricas:
+            self.metricas.incrementar('rechazadas_ocupado')
+        self.logger.debug(f"Solicitud de {flujo} rechazada: cola llena ({len(self.cola)})")
+        self.frontend.send_multipart(tramas[:-1] + [codec.codificar(respuesta)])
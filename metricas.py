@@ -0,0 +1,176 @@
+"""Contadores e histogramas de latencia del servidor, servidos por un socket ZMQ.
+
+Registrar una muestra cuesta O(1): los histogramas usan cubetas de
+potencias de 2 en microsegundos. Los percentiles se calculan al pedir
+las estadísticas, fuera del camino de las solicitudes.
+"""
+from contextlib import contextmanager
+import zmq
+import json
+import threading
+import time
+import logging
+import sys
+
+from config import METRICAS_CONFIG
+
+
+class Histograma:
+    """Histograma de latencias con cubetas [2^(i-1), 2^i) µs"""
+    CUBETAS = 26  # hasta ~33 s
+
+    def __init__(self):
+        self.cubetas = [0] * self.CUBETAS
+        self.cantidad = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+        self.lock = threading.Lock()
+
+    def observar(self, segundos):
+        microsegundos = int(segundos * 1_000_000)
+        cubeta = min(microsegundos.bit_length(), self.CUBETAS - 1)
+        with self.lock:
+            self.cubetas[cubeta] += 1
+            self.cantidad += 1
+            self.suma += segundos
+            if segundos > self.maximo:
+                self.maximo = segundos
+
+    def resumen(self):
+        with self.lock:
+            cubetas, cantidad, suma, maximo = list(self.cubetas), self.cantidad, self.suma, self.maximo
+        return {
+            'cantidad': cantidad,
+            'media_ms': round(suma / cantidad * 1000, 3) if cantidad else 0.0,
+            'p50_ms': _percentil(cubetas, cantidad, 50),
+            'p95_ms': _percentil(cubetas, cantidad, 95),
+            'p99_ms': _percentil(cubetas, cantidad, 99),
+            'max_ms': round(maximo * 1000, 3),
+            'cubetas_us': {str(1 << cubeta): n for cubeta, n in enumerate(cubetas) if n}
+        }
+
+
+def _percentil(cubetas, cantidad, p):
+    """Límite superior (en ms) de la cubeta que contiene el percentil `p`"""
+    objetivo = p / 100 * cantidad
+    acumulado = 0
+    for cubeta, n in enumerate(cubetas):
+        acumulado += n
+        if n and acumulado >= objetivo:
+            return (1 << cubeta) / 1000
+    return 0.0
+
+
+class Metricas:
+    """Registro de contadores e histogramas por nombre"""
+    def __init__(self):
+        self.contadores = {}
+        self.histogramas = {}
+        self.lock = threading.Lock()
+        self.inicio = time.time()
+
+    def incrementar(self, nombre, cantidad=1):
+        with self.lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+
+    def histograma(self, nombre):
+        histograma = self.histogramas.get(nombre)
+        if histograma is None:
+            with self.lock:
+                histograma = self.histogramas.setdefault(nombre, Histograma())
+        return histograma
+
+    def observar(self, nombre, segundos):
+        self.histograma(nombre).observar(segundos)
+
+    @contextmanager
+    def medir(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histograma(nombre).observar(time.perf_counter() - inicio)
+
+    def resumen(self):
+        with self.lock:
+            contadores = dict(self.contadores)
+            histogramas = dict(self.histogramas)
+        return {
+            'desde': self.inicio,
+            'contadores': contadores,
+            'latencias': {nombre: histograma.resumen() for nombre, histograma in sorted(histogramas.items())}
+        }
+
+
+class ServidorMetricas:
+    """Hilo con un socket REP que responde cada petición con las métricas en JSON.
+
+    `medidores` es un dict nombre -> función sin argumentos cuyos valores
+    (p. ej. la ocupación de los pools) se calculan en el momento de la consulta.
+    """
+    def __init__(self, context, metricas, puerto=None, medidores=None):
+        self.logger = logging.getLogger('ServidorMetricas')
+        self.context = context
+        self.metricas = metricas
+        self.puerto = puerto or METRICAS_CONFIG['puerto']
+        self.medidores = medidores or {}
+        self.ejecutando = False
+        self.hilo = None
+
+    def iniciar(self):
+        self.ejecutando = True
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+
+    def _bucle(self):
+        socket = self.context.socket(zmq.REP)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.bind(f"tcp://*:{self.puerto}")
+        self.logger.info(f"Métricas disponibles en puerto {self.puerto}")
+        try:
+            while self.ejecutando:
+                if not socket.poll(200):
+                    continue
+                socket.recv()
+                socket.send_string(json.dumps(self.estadisticas()))
+        finally:
+            socket.close()
+
+    def estadisticas(self):
+        estadisticas = self.metricas.resumen()
+        for nombre, medidor in self.medidores.items():
+            try:
+                estadisticas[nombre] = medidor()
+            except Exception as e:
+                estadisticas[nombre] = {'error': str(e)}
+        return estadisticas
+
+    def cerrar(self):
+        self.ejecutando = False
+        if self.hilo:
+            self.hilo.join()
+
+
+def consultar(host='localhost', puerto=None, timeout_ms=2000):
+    """Pide las métricas a un servidor; None si no responde"""
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(f"tcp://{host}:{puerto or METRICAS_CONFIG['puerto']}")
+    try:
+        socket.send(b'')
+        if not socket.poll(timeout_ms):
+            return None
+        return json.loads(socket.recv())
+    finally:
+        socket.close()
+
+
+if __name__ == "__main__":
+    host = sys.argv[1] if len(sys.argv) > 1 else 'localhost'
+    puerto = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    estadisticas = consultar(host, puerto)
+    if estadisticas is None:
+        print(f"El servidor {host} no respondió")
+        sys.exit(1)
+    print(json.dumps(estadisticas, indent=2, ensure_ascii=False))
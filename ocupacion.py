@@ -0,0 +1,212 @@
+"""Ocupación de los pools en disco: snapshot binario más un diario de cambios.
+
+El snapshot guarda, por franja (y para los pools permanentes), el mapa de
+ocupación de cada pool tal como está en memoria: un byte por recurso. Al
+arrancar se lee con mmap y cada mapa se copia directo al pool, así que
+restaurar no depende de cuántas solicitudes tenga el historial. Los
+cambios posteriores van a un diario binario que se escribe con los locks
+del pool tomados (en el mismo orden en que ocurrieron) y se vacía al disco
+cada `intervalo_s`. Cada `snapshot_cada` entradas se reescribe el snapshot
+y se trunca el diario.
+
+Formato del snapshot: b'OCU1', cantidad de secciones (uint32) y, por
+sección, la franja (uint16 + utf-8; vacía para los pools permanentes), su
+vencimiento (float64) y, por tipo en el orden de TIPOS, la cantidad de
+recursos (uint32) seguida del mapa.
+
+Entrada del diario: operación (b'T' toma, b'L' liberación, b'V'
+vencimiento), índice del tipo (uint8), vencimiento (float64), franja
+(uint16 + utf-8) y los índices de los recursos (uint32 + uint32 cada uno).
+"""
+from pathlib import Path
+import logging
+import mmap
+import os
+import struct
+import threading
+
+from asignador import AsignadorRecursos
+from config import OCUPACION_CONFIG
+
+MARCA = b'OCU1'
+CABECERA = struct.Struct('<4sI')
+SECCION = struct.Struct('<H')
+VENCE = struct.Struct('<d')
+CANTIDAD = struct.Struct('<I')
+ENTRADA = struct.Struct('<cBd')
+
+
+class EstadoOcupacion:
+    """Snapshot mapeado en memoria y diario de la ocupación de los pools locales"""
+    def __init__(self, config=None):
+        config = config or OCUPACION_CONFIG
+        self.logger = logging.getLogger('EstadoOcupacion')
+        self.archivo_snapshot = config['snapshot_file']
+        self.archivo_diario = config['diario_file']
+        self.snapshot_cada = config['snapshot_cada']
+        self.diario = None
+        self.entradas = 0
+        self.lock = threading.Lock()
+
+    def restaurar(self, asignador, franjas):
+        """Carga el snapshot y aplica el diario sobre los pools; devuelve las entradas aplicadas"""
+        if Path(self.archivo_snapshot).exists() and os.path.getsize(self.archivo_snapshot) > 0:
+            with open(self.archivo_snapshot, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+                self._leer_snapshot(datos, asignador, franjas)
+
+        aplicadas = 0
+        if Path(self.archivo_diario).exists():
+            with open(self.archivo_diario, 'rb') as f:
+                datos = f.read()
+            posicion = 0
+            while posicion < len(datos):
+                try:
+                    posicion = self._aplicar_entrada(datos, posicion, asignador, franjas)
+                except (struct.error, UnicodeDecodeError):
+                    # Cola truncada por una caída a mitad de escritura: se descarta
+                    self.logger.warning(f"Diario de ocupación truncado en el byte {posicion}; se repara")
+                    with open(self.archivo_diario, 'r+b') as f:
+                        f.truncate(posicion)
+                    break
+                aplicadas += 1
+        self.entradas = aplicadas
+        self.diario = open(self.archivo_diario, 'ab')
+        return aplicadas
+
+    def _leer_snapshot(self, datos, asignador, franjas):
+        marca, secciones = CABECERA.unpack_from(datos, 0)
+        if marca != MARCA:
+            raise ValueError(f"{self.archivo_snapshot} no es un snapshot de ocupación")
+        posicion = CABECERA.size
+        for _ in range(secciones):
+            franja, posicion = self._leer_texto(datos, posicion)
+            vence, = VENCE.unpack_from(datos, posicion)
+            posicion += VENCE.size
+            destino = asignador if not franja else franjas.obtener(franja, vence)
+            for tipo in AsignadorRecursos.TIPOS:
+                cantidad, = CANTIDAD.unpack_from(datos, posicion)
+                posicion += CANTIDAD.size
+                destino.pool(tipo).cargar_mapa(datos[posicion:posicion + cantidad])
+                posicion += cantidad
+
+    def _leer_texto(self, datos, posicion):
+        largo, = SECCION.unpack_from(datos, posicion)
+        posicion += SECCION.size
+        if posicion + largo > len(datos):
+            raise struct.error("texto incompleto")
+        return bytes(datos[posicion:posicion + largo]).decode('utf-8'), posicion + largo
+
+    def _aplicar_entrada(self, datos, posicion, asignador, franjas):
+        operacion, numero_tipo, vence = ENTRADA.unpack_from(datos, posicion)
+        franja, posicion = self._leer_texto(datos, posicion + ENTRADA.size)
+        cantidad, = CANTIDAD.unpack_from(datos, posicion)
+        posicion += CANTIDAD.size
+        indices = struct.unpack_from(f'<{cantidad}I', datos, posicion)
+        posicion += 4 * cantidad
+
+        if operacion == b'V':
+            franjas.eliminar(franja)
+            return posicion
+        if not franja:
+            destino = asignador
+        else:
+            destino = franjas.obtener(franja, vence, crear=operacion == b'T')
+            if destino is None:
+                return posicion
+        pool = destino.pool(AsignadorRecursos.TIPOS[numero_tipo])
+        ids = [pool.id_recurso(indice) for indice in indices]
+        if operacion == b'T':
+            pool.ocupar(ids)
+        else:
+            pool.liberar(ids)
+        return posicion
+
+    def tomados(self, franja, vence, recursos, asignador):
+        """Anota una toma; llamar con los locks de los pools tomados"""
+        self._anotar(b'T', franja, vence, recursos, asignador)
+
+    def liberados(self, franja, recursos, asignador):
+        """Anota una liberación; llamar con los locks de los pools tomados"""
+        self._anotar(b'L', franja, 0.0, recursos, asignador)
+
+    def vencidas(self, franjas):
+        with self.lock:
+            if self.diario is None:
+                return
+            for franja in franjas:
+                self._escribir(b'V', 0, 0.0, franja, ())
+
+    def _anotar(self, operacion, franja, vence, recursos, asignador):
+        with self.lock:
+            if self.diario is None:
+                # Cerrado: el snapshot final ya se escribió
+                return
+            for tipo, ids in recursos.items():
+                if ids:
+                    pool = asignador.pool(tipo)
+                    self._escribir(operacion, AsignadorRecursos.TIPOS.index(tipo), vence or 0.0, franja or '',
+                                   [pool.indice(id_recurso) for id_recurso in ids])
+
+    def _escribir(self, operacion, numero_tipo, vence, franja, indices):
+        franja = franja.encode('utf-8')
+        self.diario.write(
+            ENTRADA.pack(operacion, numero_tipo, vence) + SECCION.pack(len(franja)) + franja
+            + CANTIDAD.pack(len(indices)) + struct.pack(f'<{len(indices)}I', *indices)
+        )
+        self.entradas += 1
+
+    def sincronizar(self):
+        """Vacía el diario al disco"""
+        with self.lock:
+            if not self.diario:
+                return
+            self.diario.flush()
+            # Copia del descriptor: `guardar` puede cerrar el diario mientras se espera al disco
+            descriptor = os.dup(self.diario.fileno())
+        # Fuera del lock: las tomas siguen anotando mientras se espera al disco
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def necesita_snapshot(self):
+        return self.entradas >= self.snapshot_cada
+
+    def guardar(self, asignador, franjas):
+        """Reescribe el snapshot y trunca el diario.
+
+        Llamar con los locks de todos los pools tomados: así ninguna entrada
+        del diario queda a medias entre el snapshot viejo y el nuevo.
+        """
+        secciones = [('', 0.0, asignador)] + [
+            (franja, franjas.vence(franja), asignador_franja)
+            for franja, asignador_franja in franjas.asignadores.items()
+        ]
+        partes = [CABECERA.pack(MARCA, len(secciones))]
+        for franja, vence, destino in secciones:
+            franja = franja.encode('utf-8')
+            partes.append(SECCION.pack(len(franja)) + franja + VENCE.pack(vence))
+            for tipo in AsignadorRecursos.TIPOS:
+                mapa = destino.pool(tipo).mapa()
+                partes.append(CANTIDAD.pack(len(mapa)) + mapa)
+
+        temporal = f"{self.archivo_snapshot}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(b''.join(partes))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.archivo_snapshot)
+
+        with self.lock:
+            if self.diario:
+                self.diario.close()
+            self.diario = open(self.archivo_diario, 'wb')
+            self.entradas = 0
+
+    def cerrar(self):
+        self.sincronizar()
+        with self.lock:
+            if self.diario:
+                self.diario.close()
+                self.diario = None
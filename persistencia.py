@@ -0,0 +1,278 @@
+from pathlib import Path
+import json
+import logging
+import os
+import threading
+
+from config import PERSISTENCE_CONFIG
+
+
+class RegistroPersistente:
+    """Registro de solicitudes con log de escritura anticipada (JSONL) y snapshots compactados"""
+    COLECCIONES = ('solicitudes', 'solicitudes_no_atendidas')
+
+    def __init__(self, config=None, colecciones=None):
+        config = config or PERSISTENCE_CONFIG
+        self.logger = logging.getLogger('RegistroPersistente')
+        self.colecciones = colecciones or self.COLECCIONES
+
+        self.archivo_log = config['log_file']
+        self.archivo_snapshot = config['snapshot_file']
+        self.archivos_legados = {
+            coleccion: config[clave]
+            for coleccion, clave in (('solicitudes', 'solicitudes_file'),
+                                     ('solicitudes_no_atendidas', 'no_atendidas_file'))
+            if coleccion in self.colecciones and clave in config
+        }
+        self.intervalo_fsync = config['intervalo_fsync_ms'] / 1000
+        self.snapshot_cada = config['snapshot_cada']
+        self.commit_sincrono = config['commit_sincrono']
+
+        # Estado en memoria reconstruido a partir de snapshot + log
+        self.datos = {coleccion: {} for coleccion in self.colecciones}
+
+        # Líneas pendientes de escribir y números de secuencia para group commit
+        self.pendientes = []
+        self.secuencia = 0
+        self.secuencia_durable = 0
+        self.registros_en_log = 0
+        self.condicion = threading.Condition()
+
+        self.log = None
+        self.escritor = None
+        self.escritor_activo = False
+        self.ejecutando = False
+
+    @property
+    def solicitudes(self):
+        return self.datos.get('solicitudes')
+
+    @property
+    def solicitudes_no_atendidas(self):
+        return self.datos.get('solicitudes_no_atendidas')
+
+    def copia(self):
+        """Copia consistente del estado en memoria (p. ej. para sincronizar una réplica)"""
+        with self.condicion:
+            return {coleccion: dict(registros) for coleccion, registros in self.datos.items()}
+
+    def cargar(self):
+        """Reconstruye el estado desde el snapshot y la cola del log"""
+        if not Path(self.archivo_snapshot).exists() and not Path(self.archivo_log).exists():
+            if self._cargar_legados():
+                # Pasar al formato nuevo para no volver a leer los archivos completos
+                self._escribir_snapshot(self.datos)
+        else:
+            self.datos, self.registros_en_log = self._leer_archivos(reparar=True)
+
+        resumen = ", ".join(f"{len(registros)} {coleccion}" for coleccion, registros in self.datos.items())
+        self.logger.info(f"Estado cargado: {resumen} ({self.registros_en_log} del log)")
+
+    def _leer_archivos(self, reparar=False):
+        """Lee el snapshot y reproduce el log encima; devuelve (datos, registros del log).
+
+        Solo se tolera una última línea incompleta (caída a mitad de escritura);
+        con `reparar` se recorta del archivo para que no se mezcle con lo que
+        se escriba después. Una línea ilegible en medio del log es un error.
+        """
+        datos = self._leer_snapshot()
+
+        def aplicar(coleccion, id_registro, valor):
+            if valor is None:
+                datos[coleccion].pop(id_registro, None)
+            else:
+                datos[coleccion][id_registro] = valor
+
+        return datos, self._reproducir_log(aplicar, reparar)
+
+    def _leer_snapshot(self):
+        datos = {coleccion: {} for coleccion in self.colecciones}
+        if Path(self.archivo_snapshot).exists():
+            with open(self.archivo_snapshot, 'r') as f:
+                contenido = json.load(f)
+            for coleccion in self.colecciones:
+                datos[coleccion] = contenido.get(coleccion, {})
+        return datos
+
+    def _reproducir_log(self, aplicar, reparar=False):
+        """Llama a `aplicar(coleccion, id, datos)` por cada línea del log; devuelve cuántas hubo"""
+        registros_en_log = 0
+        if not Path(self.archivo_log).exists():
+            return registros_en_log
+
+        with open(self.archivo_log, 'rb') as f:
+            contenido = f.read()
+        lineas = contenido.split(b'\n')
+        fin_valido = 0
+        for numero, linea in enumerate(lineas):
+            if not linea.strip():
+                fin_valido += len(linea) + 1
+                continue
+            try:
+                registro = json.loads(linea)
+                aplicar(registro['coleccion'], registro['id'], registro['datos'])
+            except (ValueError, KeyError, TypeError):
+                if any(resto.strip() for resto in lineas[numero + 1:]):
+                    raise ValueError(f"Log corrupto en {self.archivo_log}, línea {numero + 1}")
+                self.logger.warning("Registro incompleto al final del log descartado")
+                break
+            registros_en_log += 1
+            fin_valido += len(linea) + 1
+
+        if reparar and fin_valido != len(contenido):
+            # Recortar la línea incompleta o completar el salto de línea final
+            with open(self.archivo_log, 'r+b') as f:
+                f.truncate(min(fin_valido, len(contenido)))
+                if fin_valido > len(contenido):
+                    f.seek(0, os.SEEK_END)
+                    f.write(b'\n')
+        return registros_en_log
+
+    def _cargar_legados(self):
+        """Importa los archivos JSON completos del formato anterior"""
+        importados = False
+        for coleccion, archivo in self.archivos_legados.items():
+            if Path(archivo).exists():
+                with open(archivo, 'r') as f:
+                    self.datos[coleccion] = json.load(f)
+                importados = True
+        return importados
+
+    def iniciar(self):
+        """Abre el log en modo append e inicia el hilo de escritura"""
+        self.log = open(self.archivo_log, 'a')
+        self.ejecutando = True
+        self.escritor_activo = True
+        self.escritor = threading.Thread(target=self._escribir, daemon=True)
+        self.escritor.start()
+
+    def registrar(self, coleccion, id_registro, datos):
+        """Registra una entrada; devuelve su número de secuencia en el log"""
+        return self.registrar_lote([(coleccion, id_registro, datos)])
+
+    def registrar_lote(self, registros):
+        """Registra varias entradas en un único commit"""
+        with self.condicion:
+            self.secuencia += 1
+            secuencia = self.secuencia
+            for coleccion, id_registro, datos in registros:
+                self._aplicar(coleccion, id_registro, datos, secuencia)
+                self.pendientes.append(json.dumps(
+                    {'coleccion': coleccion, 'id': id_registro, 'datos': datos},
+                    separators=(',', ':')
+                ))
+            self.condicion.notify_all()
+
+            if self.commit_sincrono:
+                while self.secuencia_durable < secuencia and self.escritor_activo:
+                    self.condicion.wait()
+                if self.secuencia_durable < secuencia and self.escritor is not None:
+                    raise OSError("No se pudo persistir el registro en el log")
+        return secuencia
+
+    def _aplicar(self, coleccion, id_registro, datos, secuencia):
+        """Refleja una entrada en el estado en memoria (con el lock de registros tomado).
+
+        Una entrada con datos None borra el registro.
+        """
+        if datos is None:
+            self.datos[coleccion].pop(id_registro, None)
+        else:
+            self.datos[coleccion][id_registro] = datos
+
+    def _escribir(self):
+        """Hilo de escritura: agrupa las líneas pendientes en un solo fsync"""
+        try:
+            self._bucle_escritura()
+        finally:
+            with self.condicion:
+                self.escritor_activo = False
+                self.condicion.notify_all()
+
+    def _bucle_escritura(self):
+        while True:
+            with self.condicion:
+                if self.ejecutando and not self.pendientes:
+                    self.condicion.wait(self.intervalo_fsync)
+                if not self.ejecutando and not self.pendientes:
+                    break
+                lineas, self.pendientes = self.pendientes, []
+                secuencia = self.secuencia
+
+            if lineas and not self._escribir_lineas(lineas):
+                with self.condicion:
+                    if not self.ejecutando:
+                        # Cierre con el disco fallando: no se puede hacer más
+                        self.logger.error(f"Se descartan {len(lineas) + len(self.pendientes)} registros no persistidos")
+                        self.pendientes = []
+                        self.condicion.notify_all()
+                        break
+                    # Reintentar en la próxima vuelta, sin confirmar nada a quien espera
+                    self.pendientes = lineas + self.pendientes
+                    self.condicion.wait(self.intervalo_fsync)
+                continue
+
+            with self.condicion:
+                self.secuencia_durable = secuencia
+                self.condicion.notify_all()
+
+            if self.registros_en_log >= self.snapshot_cada:
+                self.compactar()
+
+    def _escribir_lineas(self, lineas):
+        """Agrega líneas al log con fsync; si falla, deja el archivo como estaba"""
+        posicion = self.log.tell()
+        try:
+            self.log.write('\n'.join(lineas) + '\n')
+            self.log.flush()
+            os.fsync(self.log.fileno())
+        except Exception as e:
+            self.logger.error(f"Error escribiendo el log: {e}")
+            try:
+                self.log.seek(posicion)
+                self.log.truncate()
+            except Exception:
+                pass
+            return False
+        self.registros_en_log += len(lineas)
+        return True
+
+    def compactar(self):
+        """Rehace el snapshot a partir del snapshot anterior y el log, y trunca el log.
+
+        Corre en el hilo de escritura, el único que escribe el log, y trabaja
+        sobre los archivos: no toma el lock de los registros, así que las
+        solicitudes en curso no esperan a la compactación. Lo que aún no se
+        escribió queda en `pendientes` y va al log nuevo.
+        """
+        try:
+            estado, _ = self._leer_archivos()
+            self._escribir_snapshot(estado)
+            self.log.close()
+            self.log = open(self.archivo_log, 'w')
+            self.registros_en_log = 0
+        except Exception as e:
+            self.logger.error(f"Error compactando el log: {e}")
+            if self.log.closed:
+                self.log = open(self.archivo_log, 'a')
+            return
+        self.logger.info(f"Snapshot compactado en {self.archivo_snapshot}")
+
+    def _escribir_snapshot(self, estado):
+        temporal = f"{self.archivo_snapshot}.tmp"
+        with open(temporal, 'w') as f:
+            json.dump(estado, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.archivo_snapshot)
+
+    def cerrar(self):
+        """Vacía el log pendiente y detiene el hilo de escritura"""
+        with self.condicion:
+            self.ejecutando = False
+            self.condicion.notify_all()
+        if self.escritor:
+            self.escritor.join()
+        if self.log:
+            self.log.close()
+            self.log = None
@@ -1,9 +1,12 @@
 import zmq
-import json
 import logging
 import sys
 import time
 import random
+import uuid
+
+from codec import codec_extremo
+from config import TIMEOUTS, CLIENTE_CONFIG
 
 # Configuración de logging
 logging.basicConfig(
@@ -19,24 +22,37 @@ class ProgramaAcademico:
         self.facultad_puerto = facultad_puerto
         
         # Configuración ZMQ
+        self.codec = codec_extremo('programa_facultad')
         self.context = zmq.Context()
+        self.socket = None
+        self._conectar()
+    
+    def _conectar(self):
+        """(Re)crea el REQ: tras un timeout el socket queda esperando una respuesta"""
+        if self.socket is not None:
+            self.socket.close(linger=0)
         self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect(f"tcp://{facultad_ip}:{facultad_puerto}")
+        self.socket.connect(f"tcp://{self.facultad_ip}:{self.facultad_puerto}")
     
     def enviar_solicitud(self, num_salones, num_laboratorios):
         solicitud = {
             'programa': self.nombre,
             'num_salones': num_salones,
-            'num_laboratorios': num_laboratorios
+            'num_laboratorios': num_laboratorios,
+            # Un reenvío lleva el mismo id: la facultad no lo vuelve a pedir al servidor
+            'id_peticion': uuid.uuid4().hex
         }
         
         self.logger.info(f"Enviando solicitud a facultad: {solicitud}")
-        self.socket.send_json(solicitud)
-        
-        # Esperar respuesta (síncrono)
-        respuesta = self.socket.recv_json()
-        self.logger.info(f"Respuesta recibida: {respuesta}")
-        return respuesta
+        for intento in range(CLIENTE_CONFIG['max_reintentos'] + 1):
+            self.socket.send(self.codec.codificar(solicitud))
+            if self.socket.poll(TIMEOUTS['confirmacion']):
+                respuesta = self.codec.decodificar(self.socket.recv())
+                self.logger.info(f"Respuesta recibida: {respuesta}")
+                return respuesta
+            self.logger.warning(f"Timeout esperando a la facultad, reintento {intento + 1}")
+            self._conectar()
+        raise TimeoutError("La facultad no respondió")
 
 if __name__ == "__main__":
     if len(sys.argv) < 4:
@@ -51,8 +67,11 @@ if __name__ == "__main__":
     
     # Ejemplo: enviar solicitud cada 10 segundos
     while True:
-        programa.enviar_solicitud(
-            num_salones=random.randint(5, 8),  
-            num_laboratorios=random.randint(2, 4)
-        )
+        try:
+            programa.enviar_solicitud(
+                num_salones=random.randint(5, 8),  
+                num_laboratorios=random.randint(2, 4)
+            )
+        except TimeoutError as e:
+            programa.logger.error(str(e))
         time.sleep(10)
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""Cola de reintento de las solicitudes no atendidas por completo.
+
+Cada faltante queda en un heap ordenado por antigüedad. Cuando se liberan
+recursos, el servidor vuelve a intentar todos los pendientes de una vez
+y publica lo concedido tarde por un socket PUB cuyo tópico es el nombre
+de la facultad, así las facultades no tienen que consultar.
+"""
+import heapq
+import threading
+
+from config import REINTENTOS_CONFIG
+
+
+def endpoint_concesiones(host, config=None):
+    return f"tcp://{host}:{(config or REINTENTOS_CONFIG)['puerto']}"
+
+
+class ColaReintentos:
+    """Heap de faltantes pendientes (el más antiguo primero) con aviso de liberaciones"""
+    def __init__(self):
+        # (creado, orden, id_solicitud); las entradas ya retiradas se descartan al extraer
+        self.heap = []
+        self.pendientes = {}
+        self.orden = 0
+        self.lock = threading.Lock()
+        self.aviso = threading.Event()
+
+    def agregar(self, id_solicitud, pendiente):
+        """Encola (o reemplaza) el faltante de una solicitud.
+
+        `pendiente` lleva facultad, programa, franja, modo, creado (epoch)
+        y faltantes {tipo: cantidad}.
+        """
+        with self.lock:
+            self.pendientes[id_solicitud] = pendiente
+            self.orden += 1
+            heapq.heappush(self.heap, (pendiente['creado'], self.orden, id_solicitud))
+
+    def extraer(self):
+        """Retira todos los pendientes, del más antiguo al más reciente"""
+        with self.lock:
+            extraidos = []
+            vistos = set()
+            while self.heap:
+                _, _, id_solicitud = heapq.heappop(self.heap)
+                if id_solicitud in self.pendientes and id_solicitud not in vistos:
+                    vistos.add(id_solicitud)
+                    extraidos.append((id_solicitud, self.pendientes.pop(id_solicitud)))
+            return extraidos
+
+    def avisar(self):
+        """Señala que se liberaron recursos"""
+        self.aviso.set()
+
+    def esperar(self, timeout):
+        """Espera un aviso de liberación; True si lo hubo"""
+        avisado = self.aviso.wait(timeout)
+        self.aviso.clear()
+        return avisado
+
+    def __len__(self):
+        return len(self.pendientes)
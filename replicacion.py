@@ -0,0 +1,209 @@
+"""Replicación del servidor central hacia un servidor de respaldo (hot standby).
+
+El primario publica por PUB cada cambio de estado (recursos tomados o
+liberados y registros del historial) con un número de secuencia, más un
+heartbeat periódico que identifica al servidor que lo envía (su puerto de
+atención). El respaldo se sincroniza pidiendo el estado completo por un
+socket REP aparte, aplica los eventos posteriores y, cuando dejan de llegar
+heartbeats, se promueve a primario sin leer nada del disco.
+"""
+import zmq
+import threading
+import time
+import logging
+
+from codec import codec_extremo, detectar_codec
+from config import REPLICA_CONFIG
+
+
+def endpoint_eventos(host, config=None):
+    return f"tcp://{host}:{(config or REPLICA_CONFIG)['puerto_eventos']}"
+
+
+def endpoint_sincronizacion(host, config=None):
+    return f"tcp://{host}:{(config or REPLICA_CONFIG)['puerto_sincronizacion']}"
+
+
+class PublicadorReplica:
+    """Hilo del primario que publica eventos y heartbeats y atiende sincronizaciones.
+
+    `publicar` solo encola: el socket PUB lo usa únicamente el hilo
+    publicador. `obtener_estado` se llama desde un hilo propio de las
+    sincronizaciones, para que armar un estado grande no atrase los
+    heartbeats, y debe devolver el estado completo junto con la secuencia
+    del último evento incluido. `identidad` va en cada heartbeat: los
+    clientes distinguen así al primario de un respaldo promovido en la
+    misma máquina, que publica en el mismo puerto.
+    """
+    def __init__(self, context, obtener_estado, config=None, identidad=None):
+        self.logger = logging.getLogger('PublicadorReplica')
+        self.config = config or REPLICA_CONFIG
+        self.context = context
+        self.obtener_estado = obtener_estado
+        self.codec = codec_extremo('replicacion')
+        self.intervalo = self.config['heartbeat_ms'] / 1000
+        self.identidad = identidad
+
+        self.pendientes = []
+        self.secuencia = 0
+        self.condicion = threading.Condition()
+        self.ejecutando = False
+        self.hilo = None
+        self.hilo_sincronizacion = None
+
+    def iniciar(self):
+        self.ejecutando = True
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+        self.hilo_sincronizacion = threading.Thread(target=self._atender_sincronizaciones, daemon=True)
+        self.hilo_sincronizacion.start()
+
+    def publicar(self, tipo, datos):
+        """Encola un evento y devuelve su número de secuencia"""
+        with self.condicion:
+            self.secuencia += 1
+            self.pendientes.append({'secuencia': self.secuencia, 'tipo': tipo, 'datos': datos})
+            self.condicion.notify()
+            return self.secuencia
+
+    def _bucle(self):
+        publicador = self.context.socket(zmq.PUB)
+        publicador.setsockopt(zmq.LINGER, 0)
+        # Un evento descartado obliga al respaldo a resincronizar todo el estado
+        publicador.setsockopt(zmq.SNDHWM, 100000)
+        publicador.bind(f"tcp://*:{self.config['puerto_eventos']}")
+        self.logger.info(f"Publicando réplica en puerto {self.config['puerto_eventos']}")
+
+        proximo_heartbeat = time.monotonic()
+        try:
+            while self.ejecutando:
+                with self.condicion:
+                    if not self.pendientes:
+                        self.condicion.wait(max(0, min(proximo_heartbeat - time.monotonic(), 0.01)))
+                    eventos, self.pendientes = self.pendientes, []
+                    secuencia = self.secuencia
+
+                for evento in eventos:
+                    publicador.send_multipart([b'evento', self.codec.codificar(evento)])
+
+                if time.monotonic() >= proximo_heartbeat:
+                    publicador.send_multipart([b'heartbeat', self.codec.codificar({
+                        'secuencia': secuencia, 'servidor': self.identidad
+                    })])
+                    proximo_heartbeat = time.monotonic() + self.intervalo
+        finally:
+            publicador.close()
+
+    def _atender_sincronizaciones(self):
+        """Responde con el estado completo a cada respaldo que lo pide"""
+        sincronizacion = self.context.socket(zmq.REP)
+        sincronizacion.setsockopt(zmq.LINGER, 0)
+        sincronizacion.bind(f"tcp://*:{self.config['puerto_sincronizacion']}")
+        try:
+            while self.ejecutando:
+                if not sincronizacion.poll(self.config['heartbeat_ms']):
+                    continue
+                sincronizacion.recv()
+                estado = self.obtener_estado()
+                sincronizacion.send(self.codec.codificar(estado))
+                self.logger.info(f"Respaldo sincronizado en la secuencia {estado['secuencia']}")
+        finally:
+            sincronizacion.close()
+
+    def cerrar(self):
+        with self.condicion:
+            self.ejecutando = False
+            self.condicion.notify()
+        for hilo in (self.hilo, self.hilo_sincronizacion):
+            if hilo:
+                hilo.join()
+
+
+class SuscriptorReplica:
+    """Sigue al primario desde el respaldo hasta que deja de dar señales de vida.
+
+    Sigue el esquema de "clone" de ZeroMQ: se suscribe antes de pedir el
+    estado, descarta los eventos ya incluidos en él y vuelve a sincronizar
+    si detecta un hueco en la secuencia.
+    """
+    def __init__(self, context, host, aplicar_estado, aplicar_evento, config=None):
+        self.logger = logging.getLogger('SuscriptorReplica')
+        self.config = config or REPLICA_CONFIG
+        self.context = context
+        self.host = host
+        self.aplicar_estado = aplicar_estado
+        self.aplicar_evento = aplicar_evento
+        self.codec = codec_extremo('replicacion')
+        self.limite_silencio = self.config['heartbeat_ms'] * self.config['heartbeats_perdidos'] / 1000
+
+        self.secuencia = None
+        self.ultimo_contacto = None
+
+    def seguir(self):
+        """Replica hasta detectar la caída del primario.
+
+        Mientras no se haya sincronizado nunca, espera indefinidamente: un
+        respaldo que arranca antes que el primario no debe promoverse.
+        """
+        suscriptor = self.context.socket(zmq.SUB)
+        suscriptor.setsockopt(zmq.LINGER, 0)
+        suscriptor.setsockopt(zmq.RCVHWM, 100000)
+        suscriptor.setsockopt(zmq.SUBSCRIBE, b'')
+        suscriptor.connect(endpoint_eventos(self.host, self.config))
+
+        try:
+            while True:
+                if self.secuencia is None and not self._sincronizar():
+                    if self.ultimo_contacto is not None and self._silencioso():
+                        return
+                    continue
+
+                if suscriptor.poll(self.config['heartbeat_ms']):
+                    topico, cuerpo = suscriptor.recv_multipart()
+                    self.ultimo_contacto = time.monotonic()
+                    mensaje = detectar_codec(cuerpo).decodificar(cuerpo)
+                    if topico == b'evento':
+                        self._recibir_evento(mensaje)
+                    elif mensaje['secuencia'] > self.secuencia:
+                        # Se perdieron eventos (p. ej. cola PUB desbordada)
+                        self.logger.warning("Hueco en la secuencia de réplica; resincronizando")
+                        self.secuencia = None
+                elif self._silencioso():
+                    return
+        finally:
+            suscriptor.close()
+
+    def _silencioso(self):
+        return time.monotonic() - self.ultimo_contacto > self.limite_silencio
+
+    def _recibir_evento(self, evento):
+        if evento['secuencia'] <= self.secuencia:
+            return  # ya incluido en el estado sincronizado
+        if evento['secuencia'] != self.secuencia + 1:
+            self.logger.warning("Hueco en la secuencia de réplica; resincronizando")
+            self.secuencia = None
+            return
+        self.aplicar_evento(evento['tipo'], evento['datos'])
+        self.secuencia = evento['secuencia']
+
+    def _sincronizar(self):
+        """Pide el estado completo al primario; False si no responde a tiempo"""
+        socket = self.context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(endpoint_sincronizacion(self.host, self.config))
+        try:
+            socket.send(self.codec.codificar({'tipo': 'sincronizacion'}))
+            # El estado completo puede tardar más que un heartbeat en armarse
+            if not socket.poll(max(1000, int(self.limite_silencio * 1000))):
+                return False
+            datos = socket.recv()
+        finally:
+            # Lazy Pirate: un REQ sin respuesta no se reutiliza
+            socket.close()
+
+        estado = detectar_codec(datos).decodificar(datos)
+        self.aplicar_estado(estado)
+        self.secuencia = estado['secuencia']
+        self.ultimo_contacto = time.monotonic()
+        self.logger.info(f"Sincronizado con el primario {self.host} en la secuencia {self.secuencia}")
+        return True
@@ -1,12 +1,34 @@
-from pathlib import Path
+from concurrent.futures import Future
+from contextlib import ExitStack, nullcontext
 import zmq
-import json
 import threading
 import time
 import logging
+import asyncio
+import os
+import random
+import signal
 import socket
+import sys
 from datetime import datetime
 
+from asignador import AsignadorRecursos, planificar_lote
+from codec import JSON, codec_extremo, detectar_codec
+from config import (SERVIDOR_CONFIG, FRAGMENTOS_CONFIG, PERSISTENCE_CONFIG, REPLICA_CONFIG,
+                    METRICAS_CONFIG, FRANJAS_CONFIG, INGRESO_CONFIG, ASIGNACION_CONFIG, REINTENTOS_CONFIG,
+                    OCUPACION_CONFIG, IDEMPOTENCIA_CONFIG, TABLERO_CONFIG)
+from fragmentos import AsignadorFragmentado, endpoint_fragmento, lanzar_fragmentos
+from franjas import FranjasReserva
+from ingreso import IngresoJusto
+from metricas import Metricas, ServidorMetricas
+from ocupacion import EstadoOcupacion
+from persistencia import RegistroPersistente
+from historial import HistorialSolicitudes
+from idempotencia import CacheRespuestas, clave_de
+from reintentos import ColaReintentos
+from replicacion import PublicadorReplica, SuscriptorReplica
+from tablero import Demanda, PublicadorTablero
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -14,42 +36,149 @@ logging.basicConfig(
 )
 
 class ServidorCentral:
-    def __init__(self, puerto_escucha=5555):
+    def __init__(self, puerto_escucha=5555, modo=None, num_workers=None, rol=None, host_primario='localhost'):
         self.logger = logging.getLogger('ServidorCentral')
         self.puerto_escucha = puerto_escucha
+        self.modo = modo or SERVIDOR_CONFIG['modo']
+        self.num_workers = num_workers or SERVIDOR_CONFIG['num_workers']
+        # None (sin réplica), 'primario' o 'respaldo'
+        self.rol = rol
+        self.host_primario = host_primario
         
-        # Recursos disponibles (modificar estas líneas)
-        self.salones = [f"S{i}" for i in range(1, 381)]  # 380 salones
-        self.laboratorios = [f"L{i}" for i in range(1, 61)]  # 60 laboratorios
-        self.aulas_moviles = [f"AM{i}" for i in range(1, 6)]  # 5 aulas móviles
-        
-        # Control de recursos asignados
-        self.salones_asignados = []
-        self.laboratorios_asignados = []
-        self.aulas_moviles_asignados = []
+        # Procesos fragmento (antes de crear el contexto ZMQ, que no sobrevive a un fork).
+        # El respaldo usa los mismos fragmentos que el primario
+        self.procesos_fragmentos = []
+        if FRAGMENTOS_CONFIG['habilitado'] and FRAGMENTOS_CONFIG['lanzar'] and rol != 'respaldo':
+            self.procesos_fragmentos = lanzar_fragmentos(FRAGMENTOS_CONFIG['num_fragmentos'])
         
-        # Solicitudes procesadas y no atendidas
-        self.solicitudes = {}
-        self.solicitudes_no_atendidas = {}
+        # Solicitudes procesadas y no atendidas (log de escritura anticipada + snapshots)
+        if rol == 'respaldo':
+            prefijo = REPLICA_CONFIG['prefijo_respaldo']
+            self.registro = HistorialSolicitudes({
+                clave: f"{prefijo}{valor}" if clave.endswith('_file') else valor
+                for clave, valor in PERSISTENCE_CONFIG.items()
+            })
+        else:
+            self.registro = HistorialSolicitudes()
         
-        # Locks para control de concurrencia
-        self.lock_salones = threading.Lock()
-        self.lock_laboratorios = threading.Lock()
-        self.lock_aulas_moviles = threading.Lock()
+        # Ocupación de los pools locales (snapshot binario + diario); con
+        # fragmentos la persisten los procesos fragmento
+        self.ocupacion = None
+        if not FRAGMENTOS_CONFIG['habilitado']:
+            prefijo = REPLICA_CONFIG['prefijo_respaldo'] if rol == 'respaldo' else ''
+            self.ocupacion = EstadoOcupacion({
+                clave: f"{prefijo}{valor}" if clave.endswith('_file') else valor
+                for clave, valor in OCUPACION_CONFIG.items()
+            })
         
         # Preparar contexto ZMQ
         self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REP)
+        self.socket = None
+        self.ingreso = None
+        self.ejecutando = True
+        
+        # Flujo de cambios hacia el respaldo
+        self.publicador = (PublicadorReplica(self.context, self._estado_replica, identidad=puerto_escucha)
+                           if rol == 'primario' else None)
+        
+        # Contadores e histogramas de latencia (decodificar, asignar, persistir, codificar, locks)
+        self.metricas = Metricas()
+        self.servidor_metricas = None
+        self.muestreo_solicitudes = METRICAS_CONFIG['muestreo_solicitudes']
+        
+        # Pools de recursos (380 salones, 60 laboratorios, 5 aulas móviles),
+        # locales o repartidos entre procesos fragmento
+        if FRAGMENTOS_CONFIG['habilitado']:
+            self.asignador = AsignadorFragmentado(
+                [endpoint_fragmento(i) for i in range(FRAGMENTOS_CONFIG['num_fragmentos'])],
+                self.context
+            )
+            self.asignador.iniciar()
+        else:
+            self.asignador = AsignadorRecursos()
         
-        # Archivos para persistencia
-        self.archivo_solicitudes = "solicitudes.json"
-        self.archivo_no_atendidas = "solicitudes_no_atendidas.json"
+        # Costo medio (EWMA, segundos) de la toma agrupada por edificio, para el presupuesto
+        self.costo_localidad = 0.0
+        self.tomas_fifo = 0
+        # Los actualizan todos los workers
+        self.lock_motor = threading.Lock()
+        
+        # Reservas por franja horaria: pools propios por franja, descartados al vencer
+        self.franjas = FranjasReserva()
+        self.detenido = threading.Event()
+        
+        # Faltantes que se reintentan al liberarse recursos
+        self.reintentos = ColaReintentos()
+        self.hilo_reintentos = None
+        self.hilo_ocupacion = None
+        
+        # Respuestas recientes por clave de idempotencia: los reenvíos no se procesan dos veces,
+        # tampoco después de un reinicio (se restauran de su propio log)
+        prefijo = REPLICA_CONFIG['prefijo_respaldo'] if rol == 'respaldo' else ''
+        self.respuestas = CacheRespuestas(registro=RegistroPersistente(
+            dict(PERSISTENCE_CONFIG,
+                 log_file=f"{prefijo}{IDEMPOTENCIA_CONFIG['log_file']}",
+                 snapshot_file=f"{prefijo}{IDEMPOTENCIA_CONFIG['snapshot_file']}"),
+            colecciones=('respuestas',)
+        ))
+        
+        # Tasas de solicitudes, consumo y demanda por facultad para el tablero de capacidad
+        self.demanda = Demanda()
+        self.tablero = None
         
         # Cargar datos persistentes si existen
         self._cargar_datos()
     
-    # Modificar el método iniciar para usar hilos
+    @property
+    def solicitudes(self):
+        return self.registro.solicitudes
+    
+    @property
+    def solicitudes_no_atendidas(self):
+        return self.registro.solicitudes_no_atendidas
+    
     def iniciar(self):
+        """Inicia el servidor en el modo configurado ('broker' o 'rep')"""
+        if self.ocupacion:
+            self.hilo_ocupacion = threading.Thread(target=self._mantener_ocupacion, daemon=True)
+            self.hilo_ocupacion.start()
+        if self.rol == 'respaldo':
+            try:
+                self._seguir_primario()
+            except KeyboardInterrupt:
+                self.logger.info("Servidor de respaldo detenido")
+                self._guardar_datos()
+                self.context.term()
+                return
+        
+        if self.publicador:
+            self.publicador.iniciar()
+        if METRICAS_CONFIG['habilitado']:
+            self.servidor_metricas = ServidorMetricas(self.context, self.metricas, medidores={
+                'ocupacion': self.asignador.ocupacion,
+                'franjas': lambda: len(self.franjas),
+                'cola_ingreso': lambda: len(self.ingreso.cola) if self.ingreso else None,
+                'faltantes_pendientes': lambda: len(self.reintentos),
+                'registros_en_log': lambda: self.registro.registros_en_log,
+                'historial_en_memoria': self.registro.tamanios,
+                'respuestas_en_cache': lambda: len(self.respuestas)
+            })
+            self.servidor_metricas.iniciar()
+        if TABLERO_CONFIG['habilitado']:
+            self.tablero = PublicadorTablero(self.context, self.demanda, self._ocupaciones)
+            self.tablero.iniciar()
+        threading.Thread(target=self._barrer_franjas, daemon=True).start()
+        if REINTENTOS_CONFIG['habilitado']:
+            self._iniciar_reintentos()
+        
+        if self.modo == 'broker':
+            self._iniciar_broker()
+        else:
+            self._iniciar_rep()
+    
+    def _iniciar_rep(self):
+        """Atiende todas las solicitudes en un único socket REP"""
+        self.socket = self.context.socket(zmq.REP)
         self.socket.bind(f"tcp://*:{self.puerto_escucha}")
         self.logger.info(f"Servidor iniciado en puerto {self.puerto_escucha}")
         
@@ -59,13 +188,10 @@ class ServidorCentral:
         try:
             while True:
                 try:
-                    mensaje = self.socket.recv_json()
-                    self.logger.info(f"Solicitud recibida: {mensaje}")
-                    
-                    respuesta = self.procesar_solicitud(mensaje)
-                    self.socket.send_json(respuesta)
+                    datos = self.socket.recv()
+                    self.socket.send(self._atender(datos))
                 except zmq.error.Again:
-                    # Timeout en recv_json(), continúa el ciclo para verificar interrupciones
+                    # Timeout en recv(), continúa el ciclo para verificar interrupciones
                     continue
                 
         except KeyboardInterrupt:
@@ -75,23 +201,189 @@ class ServidorCentral:
             self.socket.close()
             self.context.term()
     
+    def _iniciar_broker(self):
+        """Reparte las solicitudes de un ROUTER entre un pool de workers vía DEALER inproc.
+        
+        Con el ingreso habilitado, una cola justa por facultad reemplaza al
+        proxy y rechaza con "ocupado" lo que no cabe.
+        """
+        if INGRESO_CONFIG['habilitado']:
+            frontend = backend = None
+            self.ingreso = IngresoJusto(
+                self.context, f"tcp://*:{self.puerto_escucha}", SERVIDOR_CONFIG['backend'],
+                self.num_workers, self.metricas
+            )
+        else:
+            frontend = self.context.socket(zmq.ROUTER)
+            frontend.bind(f"tcp://*:{self.puerto_escucha}")
+            backend = self.context.socket(zmq.DEALER)
+            backend.bind(SERVIDOR_CONFIG['backend'])
+        
+        workers = []
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker, args=(i,), daemon=True)
+            worker.start()
+            workers.append(worker)
+        
+        self.logger.info(f"Servidor (broker) iniciado en puerto {self.puerto_escucha} con {self.num_workers} workers")
+        
+        try:
+            if frontend is None:
+                asyncio.run(self.ingreso.ejecutar())
+            else:
+                zmq.proxy(frontend, backend)
+        except (KeyboardInterrupt, zmq.ContextTerminated):
+            self.logger.info("Servidor detenido")
+        finally:
+            self.ejecutando = False
+            for worker in workers:
+                worker.join()
+            self._guardar_datos()
+            if frontend is not None:
+                frontend.close()
+                backend.close()
+            self.context.term()
+    
+    def _worker(self, numero):
+        """Worker REP conectado al backend del broker"""
+        socket = self.context.socket(zmq.REP)
+        socket.setsockopt(zmq.RCVTIMEO, 1000)
+        socket.connect(SERVIDOR_CONFIG['backend'])
+        
+        try:
+            while self.ejecutando:
+                try:
+                    datos = socket.recv()
+                except zmq.error.Again:
+                    continue
+                
+                socket.send(self._atender(datos, f"Worker {numero}"))
+        finally:
+            socket.close()
+    
+    def _atender(self, datos, origen="Servidor"):
+        """Decodifica, procesa y codifica una solicitud.
+        
+        Nunca lanza excepciones: un socket REP que no responde queda bloqueado.
+        La respuesta sale con el mismo codec con que llegó la solicitud.
+        """
+        inicio = time.perf_counter()
+        codec = JSON
+        mensaje = None
+        try:
+            with self.metricas.medir('decodificar'):
+                codec = detectar_codec(datos)
+                mensaje = codec.decodificar(datos)
+            if not isinstance(mensaje, dict):
+                raise ValueError("La solicitud debe ser un objeto")
+            self.metricas.incrementar(f"solicitudes.{mensaje.get('tipo', 'asignacion')}")
+            # El cuerpo completo solo en DEBUG o para una muestra: formatearlo cuesta en cada solicitud
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"{origen} - Solicitud recibida: {mensaje}")
+            elif self.muestreo_solicitudes and random.random() < self.muestreo_solicitudes:
+                self.logger.info(f"{origen} - Solicitud recibida (muestra): {mensaje}")
+            respuesta = self.procesar_solicitud(mensaje)
+        except Exception as e:
+            self.logger.error(f"{origen} - Error procesando solicitud: {e}")
+            self.metricas.incrementar('errores')
+            respuesta = {'error': str(e)}
+            if isinstance(mensaje, dict) and 'id_peticion' in mensaje:
+                respuesta['id_peticion'] = mensaje['id_peticion']
+        
+        try:
+            with self.metricas.medir('codificar'):
+                salida = codec.codificar(respuesta)
+        except Exception as e:
+            self.logger.error(f"{origen} - Error codificando respuesta: {e}")
+            self.metricas.incrementar('errores')
+            salida = JSON.codificar({'error': str(e)})
+        self.metricas.observar('atender', time.perf_counter() - inicio)
+        return salida
+    
     def procesar_solicitud(self, mensaje):
-        """Procesa una solicitud y envía respuesta"""
+        """Procesa una solicitud y envía respuesta.
+        
+        Las que cambian el estado y traen `clave_idempotencia` pasan por la
+        caché de respuestas: un reenvío recibe la respuesta de la original.
+        """
+        clave = None
+        if mensaje.get('tipo') not in ('disponibilidad', 'consulta'):
+            clave = clave_de(mensaje)
+        if clave is not None:
+            previa = self.respuestas.reservar(clave)
+            if previa is not None:
+                return self._respuesta_repetida(mensaje, previa)
+        try:
+            respuesta = self._procesar(mensaje)
+        except Exception as e:
+            if clave is not None:
+                # Un error no se guarda: el reenvío vuelve a intentarlo
+                self.respuestas.completar(clave, {'error': str(e)}, guardar=False)
+            raise
+        if clave is not None:
+            guardada = dict(respuesta)
+            self.respuestas.completar(clave, guardada)
+            # Antes de responder: si el cliente conmuta al respaldo, este ya la tiene
+            self._publicar('respuesta', {'clave': clave, 'respuesta': guardada})
+        
+        return self._correlacionar(mensaje, respuesta)  # El servidor enviará esta respuesta y esperará nueva solicitud
+    
+    def _respuesta_repetida(self, mensaje, previa):
+        """Respuesta guardada (o la de la original aún en proceso) para un reenvío"""
+        if isinstance(previa, Future):
+            previa = previa.result(timeout=IDEMPOTENCIA_CONFIG['espera_s'])
+        self.metricas.incrementar('respuestas_repetidas')
+        self.logger.info(f"Reenvío de {mensaje.get('facultad')} ({mensaje.get('clave_idempotencia')}): respuesta guardada")
+        return self._correlacionar(mensaje, dict(previa))
+    
+    def _procesar(self, mensaje):
+        tipo = mensaje.get('tipo')
+        if tipo == 'liberacion':
+            respuesta = self.procesar_liberacion(mensaje)
+        elif tipo == 'disponibilidad':
+            respuesta = self.procesar_disponibilidad(mensaje)
+        elif tipo == 'lote':
+            respuesta = self.procesar_lote(mensaje)
+        elif tipo == 'consulta':
+            respuesta = self.procesar_consulta(mensaje)
+        else:
+            respuesta = self.procesar_asignacion(mensaje)
+        return respuesta
+    
+    def _correlacionar(self, mensaje, respuesta):
+        """Devuelve el id de correlación de los clientes con varias solicitudes en vuelo"""
+        if 'id_peticion' in mensaje:
+            respuesta['id_peticion'] = mensaje['id_peticion']
+        return respuesta
+    
+    def procesar_asignacion(self, mensaje):
+        """Procesa una solicitud de asignación de recursos"""
         # Extraer información de la solicitud
         facultad = mensaje.get('facultad', 'Desconocida')
         programa = mensaje.get('programa', 'Desconocido')
         num_salones = mensaje.get('num_salones', 0)
         num_laboratorios = mensaje.get('num_laboratorios', 0)
         num_aulas_moviles = mensaje.get('num_aulas_moviles', 0)
+        franja = mensaje.get('franja')
+        self._validar_franja(franja)
+        self._validar_modo(mensaje.get('modo'))
         
-        # Registrar solicitud
-        id_solicitud = f"{facultad}-{programa}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        self.solicitudes[id_solicitud] = mensaje
+        # Procesar asignación de recursos (se registra con la asignación)
+        id_solicitud = self._nuevo_id_solicitud(facultad, programa)
+        resultado = self.asignar_recursos(
+            num_salones, num_laboratorios, num_aulas_moviles,
+            id_solicitud=id_solicitud, facultad=facultad, programa=programa,
+            franja=franja, vence=mensaje.get('vence'), modo=mensaje.get('modo'),
+            presupuesto_ms=mensaje.get('presupuesto_ms')
+        )
         
-        # Procesar asignación de recursos
-        resultado = self.asignar_recursos(num_salones, num_laboratorios, num_aulas_moviles)
-        
-        # Crear respuesta
+        return self._crear_respuesta(id_solicitud, facultad, programa, resultado, franja)
+    
+    def _nuevo_id_solicitud(self, facultad, programa):
+        """Id único y creciente: el número final lo entrega el historial"""
+        return f"{facultad}-{programa}-{datetime.now().strftime('%Y%m%d%H%M%S')}-{self.registro.nuevo_orden()}"
+    
+    def _crear_respuesta(self, id_solicitud, facultad, programa, resultado, franja=None):
         respuesta = {
             'id_solicitud': id_solicitud,
             'facultad': facultad,
@@ -99,118 +391,710 @@ class ServidorCentral:
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'asignacion': resultado
         }
+        if franja is not None:
+            respuesta['franja'] = franja
+        return respuesta
+    
+    def _validar_franja(self, franja):
+        if franja is None:
+            return
+        if not isinstance(franja, str) or not franja:
+            raise ValueError("La franja debe ser un texto no vacío")
+        if FRAGMENTOS_CONFIG['habilitado']:
+            raise ValueError("Las reservas por franja no están disponibles con pools fragmentados")
+    
+    def _validar_modo(self, modo):
+        if modo is not None and modo not in ('todo_o_nada', 'mejor_esfuerzo'):
+            raise ValueError(f"Modo de asignación desconocido: {modo}")
+    
+    def procesar_lote(self, mensaje):
+        """Asigna un lote de solicitudes con un solo commit del log.
+        
+        Cada solicitud toma solo los locks de los pools que usa, así que un
+        lote no detiene a los workers que reservan en otras franjas. Antes de
+        tomar, el planificador reparte los edificios entre todo el lote.
+        """
+        facultad_lote = mensaje.get('facultad', 'Desconocida')
+        solicitudes = mensaje.get('solicitudes', [])
+        registros = []
+        respuestas = []
+        for solicitud in solicitudes:
+            self._validar_franja(solicitud.get('franja'))
+            self._validar_modo(solicitud.get('modo', mensaje.get('modo')))
+        
+        sugeridos = self._planificar_lote(solicitudes, mensaje.get('presupuesto_ms'))
+        for solicitud, preferidos in zip(solicitudes, sugeridos):
+            facultad = solicitud.get('facultad', facultad_lote)
+            programa = solicitud.get('programa', 'Desconocido')
+            
+            id_solicitud = self._nuevo_id_solicitud(facultad, programa)
+            resultado, registros_asignacion = self._asignar(
+                solicitud.get('num_salones', 0),
+                solicitud.get('num_laboratorios', 0),
+                solicitud.get('num_aulas_moviles', 0),
+                id_solicitud=id_solicitud, facultad=facultad, programa=programa,
+                franja=solicitud.get('franja'), vence=solicitud.get('vence'),
+                modo=solicitud.get('modo', mensaje.get('modo')),
+                presupuesto_ms=solicitud.get('presupuesto_ms', mensaje.get('presupuesto_ms')),
+                preferidos=preferidos
+            )
+            registros.extend(registros_asignacion)
+            
+            respuesta = self._crear_respuesta(id_solicitud, facultad, programa, resultado, solicitud.get('franja'))
+            respuestas.append(self._correlacionar(solicitud, respuesta))
+        
+        self._persistir(registros)
+        
+        return {
+            'tipo': 'lote',
+            'facultad': facultad_lote,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'respuestas': respuestas
+        }
+    
+    def _planificar_lote(self, solicitudes, presupuesto_ms=None):
+        """Edificios sugeridos {tipo: [edificio, ...]} para cada solicitud del lote.
         
-        return respuesta  # El servidor enviará esta respuesta y esperará nueva solicitud
+        Agrupa las solicitudes por franja y reparte cada pool con
+        `planificar_lote` sobre la ocupación del momento, leída sin locks:
+        solo son sugerencias, la toma vuelve a mirar la ocupación. None para
+        las solicitudes que van por el motor FIFO.
+        """
+        sugeridos = [None] * len(solicitudes)
+        if len(solicitudes) < 2:
+            return sugeridos
+        grupos = {}
+        for posicion, solicitud in enumerate(solicitudes):
+            grupos.setdefault((solicitud.get('franja'), solicitud.get('vence')), []).append(posicion)
+        for (franja, vence), posiciones in grupos.items():
+            asignador = self._asignador_de(franja, vence)
+            if not self._usar_localidad(asignador, presupuesto_ms):
+                continue
+            for posicion in posiciones:
+                sugeridos[posicion] = {}
+            for tipo in AsignadorRecursos.TIPOS:
+                libres = asignador.pool(tipo).libres_por_edificio()
+                if not libres:
+                    continue
+                cantidades = [solicitudes[posicion].get(f"num_{tipo}", 0) for posicion in posiciones]
+                for posicion, edificios in zip(posiciones, planificar_lote(libres, cantidades)):
+                    sugeridos[posicion][tipo] = edificios
+        return sugeridos
+    
+    def procesar_consulta(self, mensaje):
+        """Consulta del historial por id o por facultad, programa, estado y rango de fechas"""
+        coleccion = mensaje.get('coleccion', 'solicitudes')
+        if coleccion not in HistorialSolicitudes.COLECCIONES:
+            raise ValueError(f"Colección desconocida: {coleccion}")
+        if mensaje.get('id_solicitud') is not None:
+            datos = self.registro.obtener(coleccion, mensaje['id_solicitud'])
+            registros = [] if datos is None else [(mensaje['id_solicitud'], datos)]
+        else:
+            registros = self.registro.consultar(
+                coleccion,
+                facultad=mensaje.get('facultad'),
+                programa=mensaje.get('programa'),
+                estado=mensaje.get('estado'),
+                desde=mensaje.get('desde'),
+                hasta=mensaje.get('hasta'),
+                limite=min(int(mensaje.get('limite', 100)), SERVIDOR_CONFIG['max_consulta'])
+            )
+        return {
+            'tipo': 'consulta',
+            'coleccion': coleccion,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'registros': [{'id': id_registro, 'datos': datos} for id_registro, datos in registros]
+        }
+    
+    def procesar_liberacion(self, mensaje):
+        """Procesa un mensaje de devolución de recursos"""
+        franja = mensaje.get('franja')
+        self._validar_franja(franja)
+        liberados = self.liberar_recursos(
+            mensaje.get('salones', []),
+            mensaje.get('laboratorios', []),
+            mensaje.get('aulas_moviles', []),
+            franja=franja
+        )
+        
+        return {
+            'tipo': 'liberacion',
+            'facultad': mensaje.get('facultad', 'Desconocida'),
+            'programa': mensaje.get('programa', 'Desconocido'),
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'liberados': liberados
+        }
+    
+    def procesar_disponibilidad(self, mensaje):
+        """Recursos libres de una franja ("¿cuántos salones quedan libres en X?").
+        
+        Responde con las cantidades por tipo; los identificadores libres
+        solo con 'ids' en True, porque listarlos recorre los pools.
+        """
+        franja = mensaje.get('franja')
+        self._validar_franja(franja)
+        _, bloqueo = self._bloquear_asignador(franja, crear=False)
+        libres = None
+        with bloqueo:
+            if franja is not None:
+                disponibles = self.franjas.disponibilidad(franja)
+                if mensaje.get('ids'):
+                    libres = self.franjas.libres(franja)
+            else:
+                disponibles = {tipo: self.asignador.disponibles(tipo) for tipo in AsignadorRecursos.TIPOS}
+                # Con fragmentos, los identificadores libres están repartidos entre sus procesos
+                if mensaje.get('ids') and not FRAGMENTOS_CONFIG['habilitado']:
+                    libres = {
+                        tipo: self.asignador.pool(tipo).ids_libres()
+                        for tipo in AsignadorRecursos.TIPOS
+                    }
+            vence = self.franjas.vence(franja) if franja is not None else None
+        
+        return {
+            'tipo': 'disponibilidad',
+            'franja': franja,
+            'vence': vence,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'disponibles': disponibles,
+            'libres': libres
+        }
         
     def _cargar_datos(self):
-        """Carga datos persistentes desde archivos"""
+        """Carga el snapshot y reproduce la cola del log de escritura anticipada.
+        
+        La ocupación de los pools no sale del historial: se copia del
+        snapshot binario y su diario, sin recorrer las solicitudes.
+        """
         try:
-            if Path(self.archivo_solicitudes).exists():
-                with open(self.archivo_solicitudes, 'r') as f:
-                    self.solicitudes = json.load(f)
-                    
-            if Path(self.archivo_no_atendidas).exists():
-                with open(self.archivo_no_atendidas, 'r') as f:
-                    self.solicitudes_no_atendidas = json.load(f)
+            self.registro.cargar()
+            self.respuestas.cargar()
+            self.logger.info(f"{len(self.respuestas)} respuestas de idempotencia restauradas")
+            if self.ocupacion:
+                inicio = time.perf_counter()
+                aplicadas = self.ocupacion.restaurar(self.asignador, self.franjas)
+                self.logger.info(
+                    f"Ocupación restaurada en {(time.perf_counter() - inicio) * 1000:.1f} ms "
+                    f"({aplicadas} cambios del diario, {len(self.franjas)} franjas): {self.asignador.ocupacion()}"
+                )
         except Exception as e:
+            # No arrancar sobre un historial ilegible: se terminaría sobrescribiendo
             self.logger.error(f"Error cargando datos: {e}")
+            raise
+        self.registro.iniciar()
 
     def _guardar_datos(self):
-        """Guarda datos persistentes en archivos"""
+        """Vacía al disco las entradas pendientes del log y lo cierra"""
+        self.detenido.set()
+        # El hilo de reintentos persiste: debe terminar antes de cerrar el log
+        self.reintentos.avisar()
+        if self.hilo_reintentos:
+            self.hilo_reintentos.join()
+        if self.ocupacion:
+            if self.hilo_ocupacion:
+                self.hilo_ocupacion.join()
+            try:
+                # Con los locks tomados: lo que se tome después ya no se anota
+                with self._bloquear_todo():
+                    self.ocupacion.guardar(self.asignador, self.franjas)
+                    self.ocupacion.cerrar()
+            except Exception as e:
+                self.logger.error(f"Error guardando la ocupación: {e}")
         try:
-            with open(self.archivo_solicitudes, 'w') as f:
-                json.dump(self.solicitudes, f, indent=2)
-                
-            with open(self.archivo_no_atendidas, 'w') as f:
-                json.dump(self.solicitudes_no_atendidas, f, indent=2)
+            self.registro.cerrar()
         except Exception as e:
             self.logger.error(f"Error guardando datos: {e}")
+        try:
+            self.respuestas.cerrar()
+        except Exception as e:
+            self.logger.error(f"Error guardando las respuestas de idempotencia: {e}")
+        if self.publicador:
+            self.publicador.cerrar()
+        if self.servidor_metricas:
+            self.servidor_metricas.cerrar()
+        if self.tablero:
+            self.tablero.cerrar()
+        if FRAGMENTOS_CONFIG['habilitado']:
+            self.asignador.cerrar()
+        self._detener_fragmentos()
+
+    def _detener_fragmentos(self):
+        for proceso in self.procesos_fragmentos:
+            if proceso.is_alive():
+                os.kill(proceso.pid, signal.SIGINT)
+            proceso.join(timeout=3)
+            if proceso.is_alive():
+                proceso.terminate()
 
+    def _persistir(self, registros):
+        """Registra en el log (un solo commit) y replica los registros.
+        
+        Los faltantes se encolan para reintento recién aquí, ya persistidos:
+        así una concesión tardía nunca se registra antes que su alerta.
+        """
+        with self.metricas.medir('persistir'):
+            self.registro.registrar_lote(registros)
+        self._publicar('registros', registros)
+        if REINTENTOS_CONFIG['habilitado']:
+            for coleccion, id_solicitud, datos in registros:
+                if coleccion == 'solicitudes_no_atendidas' and datos.get('pendiente'):
+                    self.reintentos.agregar(id_solicitud, datos)
+    
+    def _publicar(self, tipo, datos):
+        if self.publicador:
+            self.publicador.publicar(tipo, datos)
+    
+    def _estado_replica(self):
+        """Estado completo para un respaldo, con la secuencia del último evento que incluye.
+        
+        Los eventos de recursos se publican con los locks de sus pools
+        tomados, así que la ocupación leída con todos los locks tomados
+        corresponde a esa secuencia. Los registros posteriores que ya estén
+        en la copia se reaplican sin efecto.
+        """
+        with self._bloquear_todo():
+            secuencia = self.publicador.secuencia
+            recursos = None
+            if not FRAGMENTOS_CONFIG['habilitado']:
+                # Con fragmentos la ocupación vive en los procesos fragmento
+                recursos = {tipo: self.asignador.pool(tipo).ids_asignados() for tipo in AsignadorRecursos.TIPOS}
+            franjas = {
+                franja: {
+                    'vence': self.franjas.vence(franja),
+                    'recursos': {tipo: asignador.pool(tipo).ids_asignados() for tipo in AsignadorRecursos.TIPOS}
+                }
+                for franja, asignador in self.franjas.asignadores.items()
+            }
+        return {'secuencia': secuencia, 'recursos': recursos, 'franjas': franjas, 'registros': self.registro.copia(),
+                'respuestas': self.respuestas.copia()}
+    
+    def _aplicar_estado(self, estado):
+        with self._bloquear_todo():
+            if estado['recursos'] is not None and not FRAGMENTOS_CONFIG['habilitado']:
+                for tipo, ids in estado['recursos'].items():
+                    self.asignador.pool(tipo).restaurar(ids)
+            self.franjas = FranjasReserva()
+            for franja, reservas in estado['franjas'].items():
+                self.franjas.restaurar(franja, reservas['vence'], reservas['recursos'])
+            if self.ocupacion:
+                self.ocupacion.guardar(self.asignador, self.franjas)
+        self.respuestas.restaurar(estado.get('respuestas', {}))
+        
+        # Solo se persisten los registros que el respaldo aún no tenía
+        registros = [
+            (coleccion, id_registro, datos)
+            for coleccion, entradas in estado['registros'].items()
+            for id_registro, datos in entradas.items()
+            if self.registro.obtener(coleccion, id_registro) != datos
+        ]
+        if registros:
+            self.registro.registrar_lote(registros)
+    
+    def _aplicar_evento(self, tipo, datos):
+        if tipo == 'registros':
+            self.registro.registrar_lote(datos)
+        elif tipo == 'respuesta':
+            self.respuestas.guardar(datos['clave'], datos['respuesta'])
+        elif tipo == 'vencimiento':
+            for franja in datos['franjas']:
+                self.franjas.eliminar(franja)
+            if self.ocupacion:
+                self.ocupacion.vencidas(datos['franjas'])
+        elif FRAGMENTOS_CONFIG['habilitado'] and datos.get('franja') is None:
+            return
+        elif tipo == 'asignacion':
+            asignador = self._asignador_de(datos['franja'], datos.get('vence'))
+            for tipo_recurso, ids in datos['recursos'].items():
+                asignador.pool(tipo_recurso).ocupar(ids)
+            if self.ocupacion:
+                self.ocupacion.tomados(datos['franja'], datos.get('vence'), datos['recursos'], asignador)
+        elif tipo == 'liberacion':
+            asignador = self._asignador_de(datos['franja'], crear=False)
+            if asignador:
+                liberados = {
+                    tipo_recurso: asignador.liberar(tipo_recurso, ids)
+                    for tipo_recurso, ids in datos['recursos'].items()
+                }
+                if self.ocupacion:
+                    self.ocupacion.liberados(datos['franja'], liberados, asignador)
+    
+    def _barrer_franjas(self):
+        """Descarta las franjas vencidas, fuera del camino de las solicitudes"""
+        while not self.detenido.wait(FRANJAS_CONFIG['intervalo_barrido_s']):
+            with self.franjas.lock:
+                asignadores = dict(self.franjas.asignadores)
+                vencidas = self.franjas.vencidas()
+                # Espera las tomas en curso sobre cada franja: su evento debe
+                # publicarse antes que el vencimiento
+                for franja in vencidas:
+                    with asignadores[franja].bloquear():
+                        pass
+                if vencidas:
+                    if self.ocupacion:
+                        self.ocupacion.vencidas(vencidas)
+                    self._publicar('vencimiento', {'franjas': vencidas})
+            if vencidas:
+                self.demanda.olvidar(vencidas)
+                self.metricas.incrementar('franjas_vencidas', len(vencidas))
+                self.logger.info(f"Franjas vencidas, recursos devueltos: {vencidas}")
+    
+    def _ocupaciones(self):
+        """Ocupación de los pools permanentes y de cada franja, para el tablero"""
+        with self.franjas.lock:
+            franjas = sorted(self.franjas.asignadores.items())
+        return [(None, self.asignador.ocupacion())] + [
+            (franja, asignador.ocupacion()) for franja, asignador in franjas
+        ]
+    
+    def _mantener_ocupacion(self):
+        """Vacía el diario de ocupación al disco y rehace el snapshot cuando crece"""
+        while not self.detenido.wait(OCUPACION_CONFIG['intervalo_s']):
+            try:
+                self.ocupacion.sincronizar()
+                if self.ocupacion.necesita_snapshot():
+                    with self._bloquear_todo():
+                        self.ocupacion.guardar(self.asignador, self.franjas)
+            except Exception as e:
+                self.logger.error(f"Error persistiendo la ocupación: {e}")
+    
+    def _seguir_primario(self):
+        """Replica al primario y, cuando deja de enviar heartbeats, toma su lugar"""
+        self.logger.info(f"Servidor de respaldo siguiendo al primario en {self.host_primario}")
+        SuscriptorReplica(self.context, self.host_primario, self._aplicar_estado, self._aplicar_evento).seguir()
+        
+        self.logger.warning("El primario no responde: el respaldo pasa a ser primario")
+        self.rol = 'primario'
+        self.publicador = PublicadorReplica(self.context, self._estado_replica, identidad=self.puerto_escucha)
+    
+    def _iniciar_reintentos(self):
+        """Reconstruye la cola de faltantes desde el historial y arranca su hilo"""
+        for id_solicitud, alerta in self.registro.consultar('solicitudes_no_atendidas', estado='pendiente', limite=None):
+            self.reintentos.agregar(id_solicitud, alerta)
+        if len(self.reintentos):
+            self.logger.info(f"Faltantes pendientes de reintento: {len(self.reintentos)}")
+        self.hilo_reintentos = threading.Thread(target=self._bucle_reintentos, daemon=True)
+        self.hilo_reintentos.start()
+    
+    def _bucle_reintentos(self):
+        """Reintenta los faltantes al liberarse recursos y publica lo concedido por facultad"""
+        codec = codec_extremo('facultad_servidor')
+        publicador = self.context.socket(zmq.PUB)
+        publicador.setsockopt(zmq.LINGER, 0)
+        publicador.bind(f"tcp://*:{REINTENTOS_CONFIG['puerto']}")
+        try:
+            while not self.detenido.is_set():
+                self.reintentos.esperar(REINTENTOS_CONFIG['intervalo_s'])
+                if self.detenido.is_set() or not len(self.reintentos):
+                    continue
+                for concesion in self._reintentar():
+                    publicador.send_multipart([concesion['facultad'].encode(), codec.codificar(concesion)])
+        finally:
+            publicador.close()
+    
+    def _reintentar(self):
+        """Una pasada por todos los faltantes, del más antiguo al más reciente.
+        
+        Persiste en un solo commit las alertas y solicitudes actualizadas y
+        devuelve las concesiones tardías a publicar.
+        """
+        registros = []
+        concesiones = []
+        limite = time.time() - REINTENTOS_CONFIG['vigencia_s']
+        for id_solicitud, alerta in self.reintentos.extraer():
+            tomados = restantes = None
+            if alerta['creado'] >= limite:
+                try:
+                    tomados, restantes = self._reasignar(alerta)
+                except Exception as e:
+                    self.logger.error(f"Error reintentando {id_solicitud}: {e}")
+                    self.reintentos.agregar(id_solicitud, alerta)
+                    continue
+            if restantes is None:
+                # Vencido, o su franja ya no existe: se abandona
+                registros.append(('solicitudes_no_atendidas', id_solicitud, dict(alerta, pendiente=False)))
+                self.metricas.incrementar('faltantes_abandonados')
+                continue
+            if not tomados or not any(tomados.values()):
+                self.reintentos.agregar(id_solicitud, alerta)
+                continue
+            
+            asignacion_real = {tipo: alerta['asignacion_real'][tipo] + len(tomados[tipo]) for tipo in AsignadorRecursos.TIPOS}
+            # Con 'pendiente' en True, _persistir la vuelve a encolar
+            registros.append(('solicitudes_no_atendidas', id_solicitud, dict(
+                alerta, recursos_faltantes=restantes, asignacion_real=asignacion_real, pendiente=bool(restantes)
+            )))
+            solicitud = self.registro.obtener('solicitudes', id_solicitud)
+            if solicitud:
+                asignacion = dict(solicitud['asignacion'], no_asignados=restantes or None)
+                for tipo in AsignadorRecursos.TIPOS:
+                    asignacion[tipo] = asignacion[tipo] + tomados[tipo]
+                registros.append(('solicitudes', id_solicitud, dict(
+                    solicitud, asignacion=asignacion, estado='parcial' if restantes else 'completa'
+                )))
+            concesiones.append({
+                'tipo': 'asignacion_tardia',
+                'id_solicitud': id_solicitud,
+                'facultad': alerta['facultad'],
+                'programa': alerta['programa'],
+                'franja': alerta['franja'],
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'asignacion': dict(tomados, no_asignados=restantes or None)
+            })
+            for tipo, ids in tomados.items():
+                if ids:
+                    self.metricas.incrementar(f"asignados.{tipo}", len(ids))
+        
+        if registros:
+            self._persistir(registros)
+        if concesiones:
+            self.metricas.incrementar('asignaciones_tardias', len(concesiones))
+            self.logger.info(f"Faltantes cubiertos tras liberaciones: {[c['id_solicitud'] for c in concesiones]}")
+        return concesiones
     
-    def asignar_recursos(self, num_salones, num_laboratorios, num_aulas_moviles):
+    def _reasignar(self, alerta):
+        """Intenta cubrir el faltante de una alerta; (tomados, restantes), o (None, None) sin franja"""
+        faltantes = alerta['recursos_faltantes']
+        num_salones, num_laboratorios, num_aulas_moviles = (
+            faltantes.get(tipo, 0) for tipo in AsignadorRecursos.TIPOS
+        )
+        tipos = [tipo for tipo, cantidad in (('salones', num_salones),
+                                             ('laboratorios', num_laboratorios),
+                                             ('aulas_moviles', num_aulas_moviles + num_laboratorios))
+                 if cantidad > 0]
+        asignador, bloqueo = self._bloquear_asignador(alerta['franja'], tipos=tipos, crear=False)
+        if asignador is None:
+            return None, None
+        with bloqueo:
+            tomados, no_disponibles, _ = self._tomar(
+                asignador, num_salones, num_laboratorios, num_aulas_moviles, alerta['modo'], alerta['franja']
+            )
+        restantes = {tipo: cantidad for tipo, cantidad in no_disponibles.items() if tipo != 'laboratorios_convertidos'}
+        return tomados, restantes
+    
+    def asignar_recursos(self, num_salones, num_laboratorios, num_aulas_moviles,
+                         id_solicitud=None, facultad='Desconocida', programa='Desconocido',
+                         franja=None, vence=None, modo=None, presupuesto_ms=None):
         """Asigna recursos según la solicitud y maneja casos de falta de disponibilidad"""
-        id_solicitud = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{threading.get_ident()}"
+        resultado, registros = self._asignar(
+            num_salones, num_laboratorios, num_aulas_moviles,
+            id_solicitud=id_solicitud, facultad=facultad, programa=programa,
+            franja=franja, vence=vence, modo=modo, presupuesto_ms=presupuesto_ms
+        )
+        self._persistir(registros)
+        return resultado
+    
+    def _bloquear(self, asignador, tipos=None):
+        """Toma los locks de los pools indicados del asignador, en orden fijo"""
+        inicio = time.perf_counter()
+        pila = asignador.bloquear(tipos)
+        self.metricas.observar('espera_locks', time.perf_counter() - inicio)
+        return pila
+    
+    def _bloquear_asignador(self, franja=None, vence=None, tipos=None, crear=True):
+        """Pools de la franja con sus locks tomados.
+        
+        Si el barrido descartó la franja mientras se esperaban los locks, se
+        vuelve a obtener: tomar de pools ya descartados perdería la reserva.
+        Sin franja existente (y `crear` en False) devuelve None sin locks.
+        """
+        while True:
+            asignador = self._asignador_de(franja, vence, crear)
+            if asignador is None:
+                return None, nullcontext()
+            pila = self._bloquear(asignador, tipos)
+            if franja is None or self.franjas.vigente(franja, asignador):
+                return asignador, pila
+            pila.close()
+    
+    def _bloquear_todo(self):
+        """Locks de todos los pools, permanentes y de franjas, para leer o reemplazar el estado completo"""
+        pila = ExitStack()
+        pila.enter_context(self.franjas.lock)
+        pila.enter_context(self._bloquear(self.asignador))
+        for franja in sorted(self.franjas.asignadores):
+            pila.enter_context(self.franjas.asignadores[franja].bloquear())
+        return pila
+    
+    def _asignador_de(self, franja=None, vence=None, crear=True):
+        """Pools de una franja, o los permanentes si la solicitud no nombra franja"""
+        if franja is None:
+            return self.asignador
+        return self.franjas.obtener(franja, vence, crear)
+    
+    def _planificar(self, asignador, num_salones, num_laboratorios, num_aulas_moviles):
+        """Cuánto tomar de cada pool según la disponibilidad y qué falta.
+        
+        Los laboratorios faltantes se cubren con aulas móviles si alcanzan.
+        Devuelve los pedidos por tipo, los faltantes y si falta algo.
+        """
+        recursos_no_disponibles = {}
+        alerta_generada = False
+        salones_disponibles = asignador.disponibles('salones')
+        labs_disponibles = asignador.disponibles('laboratorios')
+        am_disponibles = asignador.disponibles('aulas_moviles')
+        
+        if salones_disponibles < num_salones:
+            recursos_no_disponibles['salones'] = num_salones - salones_disponibles
+            alerta_generada = True
+        
+        # Si faltan laboratorios se intentan cubrir con aulas móviles
+        am_convertidas = 0
+        if labs_disponibles < num_laboratorios:
+            faltan_labs = num_laboratorios - labs_disponibles
+            
+            if am_disponibles >= faltan_labs:
+                am_convertidas = faltan_labs
+                recursos_no_disponibles['laboratorios_convertidos'] = faltan_labs
+            else:
+                recursos_no_disponibles['laboratorios'] = faltan_labs
+                alerta_generada = True
+        
+        # Aulas móviles solicitadas directamente
+        am_directas = num_aulas_moviles - am_convertidas
+        am_libres = am_disponibles - am_convertidas
+        if am_directas > 0 and am_libres < am_directas:
+            recursos_no_disponibles['aulas_moviles'] = am_directas - am_libres
+            alerta_generada = True
+        
+        pedidos = {
+            'salones': min(num_salones, salones_disponibles),
+            'laboratorios': min(num_laboratorios, labs_disponibles),
+            'aulas_moviles': am_convertidas + max(0, min(am_directas, am_libres))
+        }
+        return pedidos, recursos_no_disponibles, alerta_generada
+    
+    def _usar_localidad(self, asignador, presupuesto_ms=None):
+        """True si la toma debe agrupar por edificio; False para el motor FIFO.
+        
+        FIFO con pools fragmentados (los ids viven en otros procesos), con
+        ASIGNACION_CONFIG['motor'] en 'fifo', o si el costo medio de la toma
+        agrupada excede el presupuesto de la solicitud. Cada `sondeo` tomas
+        FIFO se vuelve a medir la agrupada, para no quedar fijo en FIFO.
+        """
+        if ASIGNACION_CONFIG['motor'] != 'localidad' or not isinstance(asignador, AsignadorRecursos):
+            return False
+        if presupuesto_ms is None:
+            presupuesto_ms = ASIGNACION_CONFIG['presupuesto_ms']
+        with self.lock_motor:
+            if presupuesto_ms is None or self.costo_localidad * 1000 <= presupuesto_ms:
+                return True
+            self.tomas_fifo += 1
+            return self.tomas_fifo % ASIGNACION_CONFIG['sondeo'] == 0
+    
+    def _tomar_cercanos(self, asignador, pedidos, preferidos):
+        """Toma agrupando por edificio; mide su costo y cuántos edificios usó"""
+        inicio = time.perf_counter()
+        tomados = asignador.tomar_varios(pedidos, todo_o_nada=True, cercanos=True, preferidos=preferidos)
+        costo = time.perf_counter() - inicio
+        with self.lock_motor:
+            self.costo_localidad += 0.2 * (costo - self.costo_localidad)
+        for tipo, ids in tomados.items():
+            edificios = {asignador.pool(tipo).edificio(id_recurso) for id_recurso in ids} - {None}
+            if edificios:
+                self.metricas.incrementar(f"edificios.{tipo}", len(edificios))
+        return tomados
+    
+    def _tomar(self, asignador, num_salones, num_laboratorios, num_aulas_moviles, modo, franja,
+               presupuesto_ms=None, preferidos=None):
+        """Planifica y toma, con los locks de los pools ya tomados.
+        
+        Devuelve lo tomado por tipo (None si no se tomó nada), los faltantes
+        y si falta algo. En modo 'todo_o_nada', o si la toma planificada se
+        revierte, los faltantes son la solicitud completa. El presupuesto
+        (ms) decide si se agrupa por edificio o se toma en orden FIFO.
+        """
+        pedidos, recursos_no_disponibles, alerta_generada = self._planificar(
+            asignador, num_salones, num_laboratorios, num_aulas_moviles
+        )
+        solicitados = {
+            tipo: cantidad for tipo, cantidad in (
+                ('salones', num_salones),
+                ('laboratorios', num_laboratorios),
+                ('aulas_moviles', num_aulas_moviles)
+            ) if cantidad > 0
+        }
+        if alerta_generada and modo == 'todo_o_nada':
+            # Falta algún recurso: no se toma nada y la solicitud entera queda pendiente
+            return None, solicitados, True
+        
+        cercanos = self._usar_localidad(asignador, presupuesto_ms)
+        self.metricas.incrementar('motor.localidad' if cercanos else 'motor.fifo')
+        with self.metricas.medir('asignar'):
+            if cercanos:
+                tomados = self._tomar_cercanos(asignador, pedidos, preferidos)
+            else:
+                tomados = asignador.tomar_varios(pedidos, todo_o_nada=True)
+        if any(len(tomados[tipo]) < cantidad for tipo, cantidad in pedidos.items()):
+            # La toma se revirtió completa (p. ej. un fragmento dejó de responder)
+            self.logger.error("No se pudo completar la asignación planificada; solicitud revertida")
+            return None, solicitados, True
+        
+        # Dentro de los locks: el orden de los eventos de un pool es el de sus tomas
+        if any(tomados.values()):
+            self._publicar('asignacion', {
+                'franja': franja, 'vence': self.franjas.vence(franja), 'recursos': tomados
+            })
+            if self.ocupacion:
+                self.ocupacion.tomados(franja, self.franjas.vence(franja), tomados, asignador)
+            self.demanda.tomados(franja, tomados)
+        return tomados, recursos_no_disponibles, alerta_generada
+    
+    def _asignar(self, num_salones, num_laboratorios, num_aulas_moviles, id_solicitud=None,
+                 facultad='Desconocida', programa='Desconocido', franja=None, vence=None, modo=None,
+                 presupuesto_ms=None, preferidos=None):
+        """Núcleo de la asignación; devuelve el resultado y los registros a persistir.
+        
+        Con los locks de los pools involucrados tomados (siempre en el mismo
+        orden), planifica cuánto tomar de cada pool según la disponibilidad y
+        luego lo toma en una sola operación: con pools fragmentados es un único
+        viaje (en paralelo) a los fragmentos. Si la toma planificada no se puede
+        completar, se revierte la solicitud entera. En modo 'todo_o_nada' no se
+        toma nada si falta algún recurso; en 'mejor_esfuerzo' se entrega lo que
+        haya. Con `franja` se reserva en los pools de esa franja, que se liberan
+        solos al vencer. `preferidos` son los edificios que sugirió el
+        planificador del lote.
+        """
+        id_solicitud = id_solicitud or self._nuevo_id_solicitud(facultad, programa)
+        modo = modo or ASIGNACION_CONFIG['modo']
+        # Las aulas móviles también cubren laboratorios faltantes
+        tipos = [tipo for tipo, cantidad in (('salones', num_salones),
+                                             ('laboratorios', num_laboratorios),
+                                             ('aulas_moviles', num_aulas_moviles + num_laboratorios))
+                 if cantidad > 0]
         
         salones_asignados = []
         laboratorios_asignados = []
         aulas_moviles_asignadas = []
         recursos_no_disponibles = {}
         alerta_generada = False
+        registros = []
 
-        # Asignar salones con control de concurrencia
-        with self.lock_salones:
-            try:
-                salones_disponibles = [s for s in self.salones if s not in self.salones_asignados]
-                
-                if len(salones_disponibles) >= num_salones:
-                    salones_asignados = salones_disponibles[:num_salones]
-                    self.salones_asignados.extend(salones_asignados)
-                else:
-                    recursos_no_disponibles['salones'] = num_salones - len(salones_disponibles)
-                    salones_asignados = salones_disponibles
-                    self.salones_asignados.extend(salones_disponibles)
-                    alerta_generada = True
-                    
-                    self.logger.warning(f"No hay suficientes salones disponibles. Faltan: {recursos_no_disponibles['salones']}")
-            except Exception as e:
-                self.logger.error(f"Error asignando salones: {e}")
-
-        # Asignar laboratorios con control de concurrencia
-        with self.lock_laboratorios:
+        asignador, bloqueo = self._bloquear_asignador(franja, vence, tipos)
+        with bloqueo:
             try:
-                labs_disponibles = [l for l in self.laboratorios if l not in self.laboratorios_asignados]
-                
-                if len(labs_disponibles) >= num_laboratorios:
-                    laboratorios_asignados = labs_disponibles[:num_laboratorios]
-                    self.laboratorios_asignados.extend(laboratorios_asignados)
-                else:
-                    # Intentar asignar aulas móviles si faltan laboratorios
-                    faltan_labs = num_laboratorios - len(labs_disponibles)
-                    
-                    with self.lock_aulas_moviles:
-                        am_disponibles = [am for am in self.aulas_moviles if am not in self.aulas_moviles_asignados]
-                        
-                        if len(am_disponibles) >= faltan_labs:
-                            aulas_moviles_asignadas = am_disponibles[:faltan_labs]
-                            self.aulas_moviles_asignados.extend(aulas_moviles_asignadas)
-                            laboratorios_asignados = labs_disponibles
-                            self.laboratorios_asignados.extend(labs_disponibles)
-                            recursos_no_disponibles['laboratorios_convertidos'] = faltan_labs
-                        else:
-                            recursos_no_disponibles['laboratorios'] = faltan_labs
-                            laboratorios_asignados = labs_disponibles
-                            self.laboratorios_asignados.extend(labs_disponibles)
-                            alerta_generada = True
-                            
-                    self.logger.warning(f"No hay suficientes laboratorios disponibles. Faltan: {faltan_labs}")
-            except Exception as e:
-                self.logger.error(f"Error asignando laboratorios: {e}")
-
-        # Asignar aulas móviles adicionales si fueron solicitadas directamente
-        with self.lock_aulas_moviles:
-            try:
-                am_disponibles = [am for am in self.aulas_moviles if am not in self.aulas_moviles_asignados]
-                am_directas = num_aulas_moviles - len(aulas_moviles_asignadas)
-                
-                if am_directas > 0:
-                    if len(am_disponibles) >= am_directas:
-                        aulas_moviles_asignadas.extend(am_disponibles[:am_directas])
-                        self.aulas_moviles_asignados.extend(am_disponibles[:am_directas])
-                    else:
-                        recursos_no_disponibles['aulas_moviles'] = am_directas - len(am_disponibles)
-                        aulas_moviles_asignadas.extend(am_disponibles)
-                        self.aulas_moviles_asignados.extend(am_disponibles)
-                        alerta_generada = True
-                        
-                        self.logger.warning(f"No hay suficientes aulas móviles disponibles. Faltan: {recursos_no_disponibles['aulas_moviles']}")
+                tomados, recursos_no_disponibles, alerta_generada = self._tomar(
+                    asignador, num_salones, num_laboratorios, num_aulas_moviles, modo, franja,
+                    presupuesto_ms, preferidos
+                )
+                if tomados:
+                    salones_asignados = tomados['salones']
+                    laboratorios_asignados = tomados['laboratorios']
+                    aulas_moviles_asignadas = tomados['aulas_moviles']
             except Exception as e:
-                self.logger.error(f"Error asignando aulas móviles: {e}")
+                self.logger.error(f"Error asignando recursos: {e}")
 
         # Registrar alerta si hubo falta de recursos
         if alerta_generada:
             alerta = {
                 'id_solicitud': id_solicitud,
                 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'facultad': facultad,
+                'programa': programa,
+                'franja': franja,
+                'modo': modo,
+                'creado': time.time(),
+                # Se reintenta al liberarse recursos hasta cubrirse o vencer
+                'pendiente': (REINTENTOS_CONFIG['habilitado']
+                              and len(self.reintentos) < REINTENTOS_CONFIG['max_pendientes']),
                 'recursos_faltantes': recursos_no_disponibles,
                 'solicitud_original': {
                     'salones': num_salones,
@@ -224,12 +1108,26 @@ class ServidorCentral:
                 }
             }
             
-            with threading.Lock():
-                self.solicitudes_no_atendidas[id_solicitud] = alerta
-                self._guardar_datos()
+            registros.append(('solicitudes_no_atendidas', id_solicitud, alerta))
+            self.metricas.incrementar('asignaciones_parciales')
+            if modo == 'todo_o_nada':
+                self.metricas.incrementar('rechazadas_todo_o_nada')
                 
             self.logger.warning(f"ALERTA: No se pudieron asignar todos los recursos solicitados: {alerta}")
 
+        for tipo, asignados in (('salones', salones_asignados),
+                                ('laboratorios', laboratorios_asignados),
+                                ('aulas_moviles', aulas_moviles_asignadas)):
+            if asignados:
+                self.metricas.incrementar(f"asignados.{tipo}", len(asignados))
+        for tipo, faltantes in recursos_no_disponibles.items():
+            self.metricas.incrementar(f"faltantes.{tipo}", faltantes)
+        self.demanda.registrar(
+            facultad,
+            {'salones': num_salones, 'laboratorios': num_laboratorios, 'aulas_moviles': num_aulas_moviles},
+            sum(cantidad for tipo, cantidad in recursos_no_disponibles.items() if tipo != 'laboratorios_convertidos')
+        )
+        
         # Crear respuesta con resultados
         resultado = {
             'salones': salones_asignados,
@@ -238,22 +1136,52 @@ class ServidorCentral:
             'no_asignados': recursos_no_disponibles if recursos_no_disponibles else None
         }
 
-        # Registrar asignación
-        with threading.Lock():
-            self.solicitudes[id_solicitud] = {
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'solicitud': {
-                    'salones': num_salones,
-                    'laboratorios': num_laboratorios,
-                    'aulas_moviles': num_aulas_moviles
-                },
-                'asignacion': resultado,
-                'estado': 'completa' if not recursos_no_disponibles else 'parcial'
-            }
-            self._guardar_datos()
+        # Registrar asignación (y la alerta, si la hubo) para un único commit del log
+        registros.append(('solicitudes', id_solicitud, {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'facultad': facultad,
+            'programa': programa,
+            'franja': franja,
+            'solicitud': {
+                'salones': num_salones,
+                'laboratorios': num_laboratorios,
+                'aulas_moviles': num_aulas_moviles
+            },
+            'asignacion': resultado,
+            'estado': 'completa' if not recursos_no_disponibles else 'parcial'
+        }))
 
-        return resultado
+        return resultado, registros
+
+    def liberar_recursos(self, salones=None, laboratorios=None, aulas_moviles=None, franja=None):
+        """Devuelve recursos asignados a sus pools y retorna los que se liberaron"""
+        liberados = {}
+        
+        for tipo, ids in (('salones', salones),
+                          ('laboratorios', laboratorios),
+                          ('aulas_moviles', aulas_moviles)):
+            # Una franja vencida o inexistente no tiene nada que liberar
+            asignador, bloqueo = self._bloquear_asignador(franja, tipos=(tipo,), crear=False)
+            with bloqueo:
+                liberados[tipo] = asignador.liberar(tipo, ids or []) if asignador else []
+                if liberados[tipo]:
+                    self._publicar('liberacion', {'franja': franja, 'recursos': {tipo: liberados[tipo]}})
+                    if self.ocupacion:
+                        self.ocupacion.liberados(franja, {tipo: liberados[tipo]}, asignador)
+                    self.reintentos.avisar()
+            if liberados[tipo]:
+                self.metricas.incrementar(f"liberados.{tipo}", len(liberados[tipo]))
+                self.demanda.liberados(franja, tipo, len(liberados[tipo]))
+        
+        self.logger.debug(f"Recursos liberados: {liberados}")
+        return liberados
 
 if __name__ == "__main__":
-    servidor = ServidorCentral()
+    puerto = int(sys.argv[1]) if len(sys.argv) > 1 else 5555
+    rol = sys.argv[2] if len(sys.argv) > 2 else None
+    host_primario = sys.argv[3] if len(sys.argv) > 3 else 'localhost'
+    if rol not in (None, 'primario', 'respaldo'):
+        print("Uso: python servidor.py [puerto] [primario|respaldo] [host_primario]")
+        sys.exit(1)
+    servidor = ServidorCentral(puerto, rol=rol, host_primario=host_primario)
     servidor.iniciar()
\ No newline at end of file
@@ -18,6 +18,18 @@ def iniciar_facultad(nombre, servidor_ip="localhost"):
     return facultad
 
 def main():
+    # Modo benchmark: python simulacion.py benchmark [opciones]
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        import benchmark
+        benchmark.main(sys.argv[2:])
+        return
+    
+    # Programas virtuales: python simulacion.py virtual [opciones]
+    if len(sys.argv) > 1 and sys.argv[1] == 'virtual':
+        import simulador
+        simulador.main(sys.argv[2:])
+        return
+    
     # Verificar parámetros
     if len(sys.argv) > 1:
         servidor_ip = sys.argv[1]
@@ -0,0 +1,274 @@
+"""Simulador de miles de programas académicos virtuales por proceso.
+
+Uso: python simulacion.py virtual [opciones]   (o python simulador.py [opciones])
+
+Cada programa virtual es una corrutina que espera un tiempo aleatorio,
+pide recursos y espera su respuesta. Los programas de una facultad
+comparten un único DEALER (zmq.asyncio) dentro de su proceso, en lugar de
+un proceso con su propio contexto por programa, y se reparten entre un
+pool de procesos. Cada programa tiene su propio generador, sembrado con
+(semilla, facultad, programa): la secuencia de solicitudes de una corrida
+se repite en la siguiente sin importar cuántos procesos haya.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+import zmq
+import zmq.asyncio
+
+from codec import obtener_codec, detectar_codec
+from config import SIMULACION_CONFIG
+from franjas import semestre
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+FACULTADES = ["Ingeniería", "Ciencias", "Artes", "Medicina", "Derecho"]
+
+
+def _parsear_argumentos(argv):
+    parser = argparse.ArgumentParser(description="Simulación de programas académicos virtuales")
+    parser.add_argument('--servidor', default='localhost')
+    parser.add_argument('--puerto', type=int, default=5555)
+    parser.add_argument('--procesos', type=int, default=SIMULACION_CONFIG['procesos'])
+    parser.add_argument('--facultades', type=int, default=len(FACULTADES),
+                        help="facultades simuladas (las primeras de la lista; luego Facultad-N)")
+    parser.add_argument('--programas', type=int, default=SIMULACION_CONFIG['programas_por_facultad'],
+                        help="programas virtuales por facultad")
+    parser.add_argument('--espera', type=float, nargs=2, default=SIMULACION_CONFIG['espera_s'],
+                        metavar=('MIN', 'MAX'), help="segundos entre solicitudes de un programa")
+    parser.add_argument('--duracion', type=float, default=SIMULACION_CONFIG['duracion_s'])
+    parser.add_argument('--liberar', action='store_true',
+                        help="cada programa devuelve lo asignado antes de su siguiente solicitud")
+    parser.add_argument('--franja', default=None,
+                        help="franja de las reservas (por defecto, el semestre en curso)")
+    parser.add_argument('--codec', choices=['json', 'binario'], default='json')
+    parser.add_argument('--semilla', type=int, default=SIMULACION_CONFIG['semilla'])
+    parser.add_argument('--timeout', type=float, default=SIMULACION_CONFIG['timeout_s'],
+                        help="segundos antes de contar una solicitud como perdida")
+    return parser.parse_args(argv)
+
+
+def nombres_facultades(cantidad):
+    return FACULTADES[:cantidad] + [f"Facultad-{i}" for i in range(len(FACULTADES), cantidad)]
+
+
+def repartir(facultades, programas, procesos):
+    """Programas de cada proceso: [{facultad: [programa, ...]}], en turno rotativo"""
+    reparto = [{} for _ in range(procesos)]
+    numero = 0
+    for facultad in facultades:
+        for programa in range(programas):
+            reparto[numero % procesos].setdefault(facultad, []).append(programa)
+            numero += 1
+    return [asignados for asignados in reparto if asignados]
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def clasificar(respuesta):
+    """'ocupado' (rechazada por el ingreso), 'error' (sin asignación), 'parcial' o 'completa'"""
+    if respuesta.get('tipo') == 'ocupado':
+        return 'ocupado'
+    asignacion = respuesta.get('asignacion')
+    if asignacion is None:
+        return 'error'
+    return 'parcial' if asignacion.get('no_asignados') else 'completa'
+
+
+def liberacion(facultad, asignacion, franja=None):
+    """Solicitud que devuelve al servidor los recursos de una asignación"""
+    return {
+        'tipo': 'liberacion',
+        'facultad': facultad,
+        'salones': asignacion.get('salones', []),
+        'laboratorios': asignacion.get('laboratorios', []),
+        'aulas_moviles': asignacion.get('aulas_moviles', []),
+        'franja': franja
+    }
+
+
+class ProgramaVirtual:
+    """Secuencia determinista de solicitudes de un programa"""
+    def __init__(self, facultad, programa, semilla, espera=(3, 10), franja=None):
+        self.facultad = facultad
+        self.programa = f"Programa-{programa}"
+        # Semilla propia: no depende del orden en que el proceso atiende a los programas
+        self.rng = random.Random(f"{semilla}/{facultad}/{programa}")
+        self.espera = espera
+        self.franja = franja
+        self.enviadas = 0
+
+    def siguiente(self):
+        """Segundos de espera y solicitud siguientes"""
+        espera = self.rng.uniform(*self.espera)
+        self.enviadas += 1
+        solicitud = {
+            'facultad': self.facultad,
+            'programa': self.programa,
+            'num_salones': self.rng.randint(5, 8),
+            'num_laboratorios': self.rng.randint(2, 4),
+            'num_aulas_moviles': 0,
+            # Único en el DEALER de la facultad, que comparten todos sus programas
+            'id_peticion': f"{self.programa}/{self.enviadas}"
+        }
+        if self.franja is not None:
+            solicitud['franja'] = self.franja
+        return espera, solicitud
+
+
+class MotorVirtual:
+    """Programas virtuales de un proceso sobre un DEALER por facultad"""
+    def __init__(self, numero, asignados, args):
+        self.logger = logging.getLogger(f'Simulador-{numero}')
+        self.asignados = asignados
+        self.args = args
+        self.codec = obtener_codec(args.codec)
+        self.context = None
+        # id_peticion -> future de su respuesta
+        self.pendientes = {}
+        self.fin = None
+
+        self.latencias = []
+        self.enviadas = 0
+        self.parciales = 0   # respuestas con recursos no asignados
+        self.errores = 0
+        self.ocupadas = 0    # rechazadas por el ingreso del servidor (se reintentan)
+        self.perdidas = 0
+
+    async def ejecutar(self):
+        self.context = zmq.asyncio.Context()
+        self.fin = time.monotonic() + self.args.duracion
+        sockets = {}
+        tareas = []
+        try:
+            for facultad, programas in self.asignados.items():
+                socket = sockets[facultad] = self.context.socket(zmq.DEALER)
+                socket.setsockopt(zmq.LINGER, 0)
+                socket.connect(f"tcp://{self.args.servidor}:{self.args.puerto}")
+                tareas.append(asyncio.create_task(self._recibir(socket)))
+            programas = [
+                self._programa(sockets[facultad], ProgramaVirtual(
+                    facultad, programa, self.args.semilla, self.args.espera, self.args.franja
+                ))
+                for facultad, numeros in self.asignados.items() for programa in numeros
+            ]
+            self.logger.info(f"{len(programas)} programas virtuales en {len(sockets)} sockets")
+            await asyncio.gather(*programas)
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+            for socket in sockets.values():
+                socket.close()
+            self.context.term()
+        return self.resultados()
+
+    async def _recibir(self, socket):
+        while True:
+            _, cuerpo = await socket.recv_multipart()
+            respuesta = detectar_codec(cuerpo).decodificar(cuerpo)
+            # Las respuestas a las liberaciones no llevan id_peticion y se descartan
+            future = self.pendientes.pop(respuesta.get('id_peticion'), None)
+            if future is not None and not future.done():
+                future.set_result(respuesta)
+
+    async def _programa(self, socket, programa):
+        asignacion = None
+        while True:
+            espera, solicitud = programa.siguiente()
+            if time.monotonic() + espera >= self.fin:
+                break
+            await asyncio.sleep(espera)
+            if self.args.liberar and asignacion:
+                await self._liberar(socket, solicitud['facultad'], asignacion)
+            asignacion = await self._solicitar(socket, solicitud)
+        if self.args.liberar and asignacion:
+            await self._liberar(socket, programa.facultad, asignacion)
+
+    async def _solicitar(self, socket, solicitud):
+        """Envía una solicitud y espera su respuesta; reintenta si el servidor está ocupado"""
+        enviada = time.monotonic()
+        while True:
+            future = asyncio.get_running_loop().create_future()
+            self.pendientes[solicitud['id_peticion']] = future
+            await socket.send_multipart([b'', self.codec.codificar(solicitud)])
+            self.enviadas += 1
+            try:
+                respuesta = await asyncio.wait_for(future, self.args.timeout)
+            except asyncio.TimeoutError:
+                self.pendientes.pop(solicitud['id_peticion'], None)
+                self.perdidas += 1
+                return None
+            resultado = clasificar(respuesta)
+            if resultado != 'ocupado':
+                break
+            self.ocupadas += 1
+            await asyncio.sleep(respuesta.get('reintentar_ms', 100) / 1000)
+
+        self.latencias.append((time.monotonic() - enviada) * 1000)
+        if resultado == 'error':
+            self.errores += 1
+        elif resultado == 'parcial':
+            self.parciales += 1
+        return respuesta.get('asignacion')
+
+    async def _liberar(self, socket, facultad, asignacion):
+        await socket.send_multipart([b'', self.codec.codificar(liberacion(facultad, asignacion, self.args.franja))])
+
+    def resultados(self):
+        return {
+            'programas': sum(len(programas) for programas in self.asignados.values()),
+            'latencias': self.latencias,
+            'enviadas': self.enviadas,
+            'parciales': self.parciales,
+            'errores': self.errores,
+            'ocupadas': self.ocupadas,
+            'perdidas': self.perdidas
+        }
+
+
+def simular_proceso(numero, asignados, args):
+    """Punto de entrada de cada proceso del pool"""
+    return asyncio.run(MotorVirtual(numero, asignados, args).ejecutar())
+
+
+def ejecutar(args):
+    """Lanza los procesos del pool y combina sus resultados"""
+    # Misma franja en todos los procesos (y en las corridas del mismo semestre)
+    args.franja = args.franja or semestre()[0]
+    reparto = repartir(nombres_facultades(args.facultades), args.programas, args.procesos)
+    with ProcessPoolExecutor(max_workers=len(reparto)) as pool:
+        parciales = list(pool.map(simular_proceso, range(len(reparto)), reparto, [args] * len(reparto)))
+
+    latencias = sorted(latencia for parcial in parciales for latencia in parcial['latencias'])
+    resumen = {
+        clave: sum(parcial[clave] for parcial in parciales)
+        for clave in ('programas', 'enviadas', 'parciales', 'errores', 'ocupadas', 'perdidas')
+    }
+    resumen['respondidas'] = len(latencias)
+    resumen['latencia_ms'] = {p: percentil(latencias, p) for p in (50, 95, 99)}
+    return resumen
+
+
+def main(argv=None):
+    args = _parsear_argumentos(argv)
+    logger = logging.getLogger('Simulador')
+    logger.info(f"{args.facultades} facultades x {args.programas} programas en {args.procesos} procesos "
+                f"(semilla {args.semilla}, {args.duracion} s)")
+    resumen = ejecutar(args)
+    logger.info(f"Resultado: {resumen}")
+    return resumen
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Tablero de capacidad: ocupación, demanda y pronóstico de agotamiento.
+
+El servidor publica cada `intervalo_s` un resumen por un socket PUB
+(tópico b'tablero'). Incluye la utilización de cada pool (permanentes y
+por franja), la tasa de solicitudes, el consumo neto de cada pool, el
+tiempo estimado hasta agotarlo y la demanda de cada facultad. Cada
+solicitud solo suma a contadores del intervalo en curso (O(1)); al cerrar
+el intervalo los contadores se vuelven tasas suavizadas (EWMA).
+
+Uso: python tablero.py [host] [puerto]
+"""
+from collections import defaultdict
+from datetime import datetime
+import logging
+import sys
+import threading
+import time
+
+import zmq
+
+from codec import JSON, detectar_codec
+from config import TABLERO_CONFIG
+
+TOPICO = b'tablero'
+
+
+def endpoint_tablero(host, config=None):
+    return f"tcp://{host}:{(config or TABLERO_CONFIG)['puerto']}"
+
+
+def _suavizar(anterior, valor, alfa):
+    # Todas las medias parten de cero: así la suma de las facultades es la tasa total
+    return anterior + alfa * (valor - anterior)
+
+
+class Demanda:
+    """Contadores por intervalo y tasas suavizadas de solicitudes, consumo y demanda"""
+    def __init__(self, alfa=None):
+        self.alfa = alfa or TABLERO_CONFIG['alfa']
+        self.lock = threading.Lock()
+        self.inicio = time.monotonic()
+
+        # Intervalo en curso
+        self.solicitudes = 0
+        self.consumo = defaultdict(int)  # (franja, tipo) -> asignados - liberados
+        self.facultades = {}             # facultad -> [solicitudes, {tipo: pedidos}, faltantes]
+
+        # Tasas por segundo
+        self.tasa_solicitudes = 0.0
+        self.tasa_consumo = {}
+        self.tasa_facultades = {}
+
+    def registrar(self, facultad, solicitados, faltantes):
+        """Una solicitud atendida: lo pedido por tipo y las unidades que faltaron"""
+        with self.lock:
+            self.solicitudes += 1
+            actual = self.facultades.get(facultad)
+            if actual is None:
+                actual = self.facultades[facultad] = [0, defaultdict(int), 0]
+            actual[0] += 1
+            for tipo, cantidad in solicitados.items():
+                if cantidad:
+                    actual[1][tipo] += cantidad
+            actual[2] += faltantes
+
+    def tomados(self, franja, recursos):
+        """Recursos tomados de los pools de una franja ({tipo: ids})"""
+        with self.lock:
+            for tipo, ids in recursos.items():
+                if ids:
+                    self.consumo[(franja, tipo)] += len(ids)
+
+    def liberados(self, franja, tipo, cantidad):
+        with self.lock:
+            self.consumo[(franja, tipo)] -= cantidad
+
+    def olvidar(self, franjas):
+        """Descarta el consumo de franjas vencidas"""
+        franjas = set(franjas)
+        with self.lock:
+            for clave in [clave for clave in self.tasa_consumo if clave[0] in franjas]:
+                del self.tasa_consumo[clave]
+            for clave in [clave for clave in self.consumo if clave[0] in franjas]:
+                del self.consumo[clave]
+
+    def cerrar_intervalo(self, ahora=None):
+        """Convierte los contadores del intervalo en tasas y empieza uno nuevo"""
+        ahora = ahora or time.monotonic()
+        with self.lock:
+            segundos = ahora - self.inicio
+            if segundos <= 0:
+                return
+            self.inicio = ahora
+            solicitudes, self.solicitudes = self.solicitudes, 0
+            consumo, self.consumo = self.consumo, defaultdict(int)
+            facultades, self.facultades = self.facultades, {}
+
+            self.tasa_solicitudes = _suavizar(self.tasa_solicitudes, solicitudes / segundos, self.alfa)
+            for clave in set(self.tasa_consumo) | set(consumo):
+                self.tasa_consumo[clave] = _suavizar(
+                    self.tasa_consumo.get(clave, 0.0), consumo.get(clave, 0) / segundos, self.alfa
+                )
+            for facultad in set(self.tasa_facultades) | set(facultades):
+                cantidades = facultades.get(facultad, [0, {}, 0])
+                anterior = self.tasa_facultades.get(facultad, {'solicitudes_por_s': 0.0, 'pedidos_por_s': {},
+                                                                'faltantes_por_s': 0.0})
+                pedidos = {
+                    tipo: _suavizar(anterior['pedidos_por_s'].get(tipo, 0.0), cantidades[1].get(tipo, 0) / segundos, self.alfa)
+                    for tipo in set(anterior['pedidos_por_s']) | set(cantidades[1])
+                }
+                tasas = {
+                    'solicitudes_por_s': _suavizar(anterior['solicitudes_por_s'], cantidades[0] / segundos, self.alfa),
+                    'pedidos_por_s': pedidos,
+                    'faltantes_por_s': _suavizar(anterior['faltantes_por_s'], cantidades[2] / segundos, self.alfa)
+                }
+                # Una facultad que dejó de pedir sale del tablero cuando su tasa se apaga
+                if tasas['solicitudes_por_s'] < 1e-3 and facultad not in facultades:
+                    self.tasa_facultades.pop(facultad, None)
+                else:
+                    self.tasa_facultades[facultad] = tasas
+
+    def resumen(self, ocupaciones):
+        """Resumen publicable; `ocupaciones` es [(franja, {tipo: {'asignados', 'total'}})]"""
+        pools = []
+        for franja, ocupacion in ocupaciones:
+            for tipo, uso in ocupacion.items():
+                consumo = self.tasa_consumo.get((franja, tipo)) or 0.0
+                libres = uso['total'] - uso['asignados']
+                pools.append({
+                    'franja': franja,
+                    'tipo': tipo,
+                    'asignados': uso['asignados'],
+                    'total': uso['total'],
+                    'utilizacion': uso['asignados'] / uso['total'] if uso['total'] else None,
+                    'consumo_por_s': consumo,
+                    # Solo con consumo neto positivo; 0 si ya está agotado
+                    'agotamiento_s': libres / consumo if consumo > 0 else (0.0 if libres == 0 else None)
+                })
+        return {
+            'tipo': 'tablero',
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'solicitudes_por_s': self.tasa_solicitudes,
+            'pools': pools,
+            'facultades': dict(self.tasa_facultades)
+        }
+
+
+class PublicadorTablero:
+    """Hilo con un socket PUB que publica el resumen de la demanda cada `intervalo_s`.
+
+    `ocupaciones` es una función sin argumentos que devuelve la ocupación
+    actual de cada juego de pools (ver `Demanda.resumen`).
+    """
+    def __init__(self, context, demanda, ocupaciones, config=None):
+        self.logger = logging.getLogger('PublicadorTablero')
+        self.config = config or TABLERO_CONFIG
+        self.context = context
+        self.demanda = demanda
+        self.ocupaciones = ocupaciones
+        self.detenido = threading.Event()
+        self.hilo = None
+
+    def iniciar(self):
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+
+    def _bucle(self):
+        socket = self.context.socket(zmq.PUB)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.bind(f"tcp://*:{self.config['puerto']}")
+        self.logger.info(f"Tablero de capacidad publicado en puerto {self.config['puerto']}")
+        try:
+            while not self.detenido.wait(self.config['intervalo_s']):
+                self.demanda.cerrar_intervalo()
+                try:
+                    resumen = self.demanda.resumen(self.ocupaciones())
+                except Exception as e:
+                    self.logger.error(f"Error armando el resumen del tablero: {e}")
+                    continue
+                socket.send_multipart([TOPICO, JSON.codificar(resumen)])
+        finally:
+            socket.close()
+
+    def cerrar(self):
+        self.detenido.set()
+        if self.hilo:
+            self.hilo.join()
+
+
+def _duracion(segundos):
+    if segundos is None:
+        return '-'
+    if segundos >= 86400:
+        return f"{segundos / 86400:.1f} d"
+    horas, resto = divmod(int(segundos), 3600)
+    minutos, segundos = divmod(resto, 60)
+    return f"{horas}h {minutos:02d}m" if horas else f"{minutos}m {segundos:02d}s"
+
+
+def formatear(resumen):
+    """Texto del tablero para la terminal"""
+    lineas = [
+        f"{resumen['timestamp']}   solicitudes/s: {resumen['solicitudes_por_s']:.2f}",
+        "",
+        f"{'Franja':<20} {'Tipo':<14} {'Uso':>9} {'%':>6} {'Consumo/s':>10} {'Agotamiento':>12}"
+    ]
+    for pool in resumen['pools']:
+        utilizacion = pool['utilizacion'] * 100 if pool['utilizacion'] is not None else 0.0
+        lineas.append(
+            f"{pool['franja'] or '(permanentes)':<20} {pool['tipo']:<14} "
+            f"{pool['asignados']:>4}/{pool['total']:<4} {utilizacion:>5.1f}% "
+            f"{pool['consumo_por_s']:>10.3f} {_duracion(pool['agotamiento_s']):>12}"
+        )
+    lineas += ["", f"{'Facultad':<20} {'Solicitudes/s':>13} {'Pedidos/s':>30} {'Faltantes/s':>12}"]
+    for facultad, tasas in sorted(resumen['facultades'].items()):
+        pedidos = ' '.join(f"{tipo[:4]}={tasa:.2f}" for tipo, tasa in sorted(tasas['pedidos_por_s'].items()))
+        lineas.append(
+            f"{facultad:<20} {tasas['solicitudes_por_s']:>13.2f} {pedidos:>30} {tasas['faltantes_por_s']:>12.2f}"
+        )
+    return '\n'.join(lineas)
+
+
+if __name__ == "__main__":
+    host = sys.argv[1] if len(sys.argv) > 1 else 'localhost'
+    puerto = int(sys.argv[2]) if len(sys.argv) > 2 else TABLERO_CONFIG['puerto']
+    context = zmq.Context()
+    suscriptor = context.socket(zmq.SUB)
+    suscriptor.setsockopt(zmq.SUBSCRIBE, TOPICO)
+    suscriptor.connect(f"tcp://{host}:{puerto}")
+    try:
+        while True:
+            _, cuerpo = suscriptor.recv_multipart()
+            # Limpia la pantalla y redibuja
+            print('\x1b[2J\x1b[H' + formatear(detectar_codec(cuerpo).decodificar(cuerpo)), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        suscriptor.close()
+        context.term()
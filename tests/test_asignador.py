@@ -0,0 +1,177 @@
+import threading
+
+import pytest
+
+from asignador import AsignadorRecursos, PoolRecursos, planificar_lote, rango_fragmento
+
+CATALOGO = {
+    'salones': {'prefijo': 'S', 'cantidad': 10},
+    'laboratorios': {'prefijo': 'L', 'cantidad': 4},
+    'aulas_moviles': {'prefijo': 'AM', 'cantidad': 2},
+}
+
+
+def test_tomar_entrega_en_orden_y_hasta_agotar():
+    pool = PoolRecursos('S', 5)
+    assert pool.tomar(3) == ['S1', 'S2', 'S3']
+    assert pool.tomar(5) == ['S4', 'S5']
+    assert pool.tomar(1) == []
+    assert pool.disponibles() == 0 and pool.asignados() == 5
+
+
+def test_liberar_ignora_ajenos_y_dobles():
+    pool = PoolRecursos('S', 5)
+    pool.tomar(2)
+    assert pool.liberar(['S2', 'S2', 'S9', 'L1', 'S', 'Sx', 3]) == ['S2']
+    assert pool.liberar(['S2']) == []
+    assert pool.disponibles() == 4
+    assert not pool.esta_asignado('S2') and pool.esta_asignado('S1')
+    # El recurso devuelto vuelve al final de la lista libre
+    assert pool.tomar(4) == ['S3', 'S4', 'S5', 'S2']
+
+
+def test_restaurar_reconstruye_lista_libre():
+    pool = PoolRecursos('L', 4)
+    pool.restaurar(['L2', 'L4', 'L7', 'S1'])
+    assert pool.asignados() == 2
+    assert pool.tomar(4) == ['L1', 'L3']
+
+
+@pytest.mark.parametrize('cantidad,num_fragmentos', [(380, 4), (60, 7), (5, 4), (3, 5)])
+def test_rango_fragmento_cubre_todo_sin_solaparse(cantidad, num_fragmentos):
+    indices = []
+    for fragmento in range(num_fragmentos):
+        primero, n = rango_fragmento(cantidad, fragmento, num_fragmentos)
+        indices.extend(range(primero, primero + n))
+    assert indices == list(range(1, cantidad + 1))
+
+
+def test_pool_de_fragmento_solo_acepta_su_rango():
+    primero, cantidad = rango_fragmento(10, 1, 2)
+    pool = PoolRecursos('S', cantidad, primero)
+    assert pool.tomar(1) == ['S6']
+    assert pool.indice('S5') is None and pool.indice('S10') == 10
+    assert pool.liberar(['S1']) == []
+
+
+def test_tomar_varios_todo_o_nada_devuelve_lo_tomado():
+    asignador = AsignadorRecursos(CATALOGO)
+    tomados = asignador.tomar_varios({'salones': 3, 'laboratorios': 5}, todo_o_nada=True)
+    assert tomados == {'salones': [], 'laboratorios': []}
+    assert asignador.disponibles('salones') == 10
+    assert asignador.disponibles('laboratorios') == 4
+
+
+def test_tomar_varios_parcial_y_tipo_de():
+    asignador = AsignadorRecursos(CATALOGO)
+    tomados = asignador.tomar_varios({'laboratorios': 5, 'aulas_moviles': 1})
+    assert tomados == {'laboratorios': ['L1', 'L2', 'L3', 'L4'], 'aulas_moviles': ['AM1']}
+    assert asignador.tipo_de('AM1') == 'aulas_moviles'
+    assert asignador.tipo_de('L4') == 'laboratorios'
+    assert asignador.tipo_de('X1') is None
+    assert asignador.ocupacion()['laboratorios'] == {'asignados': 4, 'total': 4}
+
+
+def test_ocupar_replica_las_tomas_de_otro_servidor():
+    primario, respaldo = PoolRecursos('S', 6), PoolRecursos('S', 6)
+    respaldo.ocupar(primario.tomar(2))
+    respaldo.ocupar(['S5', 'S5', 'X1'])
+    primario.ocupar(['S5'])
+    assert respaldo.ids_asignados() == primario.ids_asignados() == ['S1', 'S2', 'S5']
+    assert respaldo.tomar(6) == primario.tomar(6) == ['S3', 'S4', 'S6']
+
+    # Una resincronización reemplaza la ocupación completa
+    respaldo.restaurar(['S4'])
+    assert respaldo.ids_asignados() == ['S4']
+
+
+def test_bloquear_solo_los_pools_pedidos():
+    asignador = AsignadorRecursos(CATALOGO)
+    with asignador.bloquear(['salones']):
+        # Los pools no pedidos quedan libres para otra solicitud
+        assert asignador.pool('laboratorios').lock.acquire(blocking=False)
+        asignador.pool('laboratorios').lock.release()
+        assert not asignador.pool('salones').lock.acquire(blocking=False)
+    assert asignador.pool('salones').lock.acquire(blocking=False)
+
+
+def test_tomas_concurrentes_no_entregan_dos_veces():
+    asignador = AsignadorRecursos({**CATALOGO, 'salones': {'prefijo': 'S', 'cantidad': 400}})
+    entregados = []
+
+    def tomar():
+        for _ in range(50):
+            with asignador.bloquear(['salones', 'aulas_moviles']):
+                entregados.extend(asignador.tomar_varios({'salones': 1}, todo_o_nada=True)['salones'])
+
+    hilos = [threading.Thread(target=tomar) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert sorted(entregados) == sorted(set(entregados)) and len(entregados) == 400
+    assert asignador.disponibles('salones') == 0
+
+
+def test_tomar_cercanos_agrupa_en_un_edificio():
+    pool = PoolRecursos('S', 12, por_edificio=4)
+    # Edificio 0 con un hueco, edificio 1 con dos, edificio 2 completo
+    pool.restaurar(['S1', 'S2', 'S3', 'S5', 'S6'])
+    assert pool.libres_por_edificio() == {0: 1, 1: 2, 2: 4}
+    # Best fit: el edificio más ocupado que alcanza
+    assert pool.tomar_cercanos(2) == ['S7', 'S8']
+    # Ninguno alcanza: primero el que más libres tiene
+    assert pool.tomar_cercanos(5) == ['S9', 'S10', 'S11', 'S12', 'S4']
+    assert pool.disponibles() == 0 and pool.tomar_cercanos(1) == []
+
+
+def test_tomar_cercanos_respeta_preferidos_y_rango_de_fragmento():
+    pool = PoolRecursos('L', 6, primero=3, por_edificio=4)
+    assert pool.libres_por_edificio() == {0: 2, 1: 4}
+    assert pool.tomar_cercanos(3, preferidos=[0]) == ['L3', 'L4', 'L5']
+    assert pool.edificio('L5') == 1 and pool.edificio('L1') is None
+
+
+def test_planificar_lote_ubica_primero_los_grandes():
+    # Por orden de llegada el pedido de 2 partiría el edificio que necesita el de 4
+    assert planificar_lote({0: 4, 1: 2}, [2, 4]) == [[1], [0]]
+    assert planificar_lote({0: 3, 1: 3}, [5]) == [[0, 1]]
+
+
+def test_tomar_varios_cercanos_sin_edificios_es_fifo():
+    asignador = AsignadorRecursos(CATALOGO)
+    tomados = asignador.tomar_varios({'salones': 2, 'aulas_moviles': 1}, cercanos=True)
+    assert tomados == {'salones': ['S1', 'S2'], 'aulas_moviles': ['AM1']}
+
+
+def test_tomas_fuera_de_turno_se_descartan_de_la_lista_libre():
+    pool = PoolRecursos('S', 12, por_edificio=4)
+    assert pool.tomar_cercanos(3, preferidos=[1]) == ['S5', 'S6', 'S7']
+    pool.ocupar(['S2'])
+    # FIFO salta lo que ya se tomó fuera de turno
+    assert pool.tomar(3) == ['S1', 'S3', 'S4']
+    assert pool.disponibles() == 5 and pool.asignados() == 7
+    assert pool.ids_libres() == ['S8', 'S9', 'S10', 'S11', 'S12']
+
+
+def test_lista_libre_acotada_con_tomas_cercanas_y_liberaciones():
+    pool = PoolRecursos('S', 8, por_edificio=4)
+    for _ in range(50):
+        tomados = pool.tomar_cercanos(3)
+        pool.liberar(tomados)
+        # Las entradas de sobra se depuran antes de pasar de `cantidad`
+        assert len(pool.libres) <= pool.num_libres + pool.cantidad
+    assert pool.disponibles() == 8
+    assert sorted(pool.tomar(8), key=lambda id_recurso: int(id_recurso[1:])) == [f"S{i}" for i in range(1, 9)]
+    assert pool.tomar(1) == []
+
+
+def test_libres_por_edificio_se_mantienen_al_tomar_y_liberar():
+    pool = PoolRecursos('S', 12, por_edificio=4)
+    tomados = pool.tomar_cercanos(3) + pool.tomar(2)
+    pool.ocupar(['S12'])
+    pool.liberar(tomados[1:3])
+    # Los contadores incrementales coinciden con contar sobre el mapa
+    esperado = {edificio: pool.ocupados.count(0, *pool._rango_edificio(edificio)) for edificio in range(3)}
+    assert pool.libres_por_edificio() == esperado
+    assert all(edificio in pool.por_libres[n] for edificio, n in esperado.items())
@@ -0,0 +1,164 @@
+import threading
+
+import pytest
+import zmq
+
+from cliente import ClienteServidor, ServidorOcupado
+from codec import JSON, detectar_codec
+
+
+class RouterFalso:
+    """ROUTER que hace de servidor: las pruebas deciden qué y cuándo responder"""
+    def __init__(self, context):
+        self.socket = context.socket(zmq.ROUTER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.puerto = self.socket.bind_to_random_port('tcp://127.0.0.1')
+
+    def recibir(self, timeout_ms=2000):
+        assert self.socket.poll(timeout_ms), "el cliente no envió nada"
+        identidad, vacio, cuerpo = self.socket.recv_multipart()
+        assert vacio == b''
+        return identidad, detectar_codec(cuerpo).decodificar(cuerpo)
+
+    def responder(self, identidad, respuesta):
+        self.socket.send_multipart([identidad, b'', JSON.codificar(respuesta)])
+
+    def nada_pendiente(self, timeout_ms=300):
+        return not self.socket.poll(timeout_ms)
+
+
+@pytest.fixture
+def context():
+    context = zmq.Context()
+    yield context
+    context.term()
+
+
+@pytest.fixture
+def router(context):
+    router = RouterFalso(context)
+    yield router
+    router.socket.close()
+
+
+def _cliente(context, router, timeout_s=0.2, **opciones):
+    cliente = ClienteServidor('127.0.0.1', router.puerto, context=context, **opciones)
+    cliente.timeout_reintento = timeout_s
+    cliente.iniciar()
+    return cliente
+
+
+def test_respuesta_correlacionada_por_id_peticion(context, router):
+    cliente = _cliente(context, router)
+    try:
+        primera = cliente.enviar({'facultad': 'Artes', 'num_salones': 1})
+        segunda = cliente.enviar({'facultad': 'Artes', 'num_salones': 2})
+        recibidas = [router.recibir(), router.recibir()]
+        assert all(m['clave_idempotencia'] == m['id_peticion'] for _, m in recibidas)
+
+        # Respuestas en orden inverso: cada una llega a su Future
+        for identidad, mensaje in reversed(recibidas):
+            router.responder(identidad, {'id_peticion': mensaje['id_peticion'], 'n': mensaje['num_salones']})
+        assert primera.result(2)['n'] == 1
+        assert segunda.result(2)['n'] == 2
+    finally:
+        cliente.cerrar()
+
+
+def test_timeout_reenvia_y_acepta_la_respuesta_tardia(context, router):
+    cliente = _cliente(context, router, max_reintentos=2)
+    try:
+        future = cliente.enviar({'facultad': 'Artes', 'num_salones': 1})
+        identidad, original = router.recibir()
+        _, reenvio = router.recibir()
+        assert reenvio['id_peticion'] == original['id_peticion']
+        assert reenvio['clave_idempotencia'] == original['clave_idempotencia']
+
+        # Llega la respuesta del primer envío y luego la del reenvío
+        respuesta = {'id_peticion': original['id_peticion'], 'asignacion': {'salones': ['S1']}}
+        router.responder(identidad, respuesta)
+        router.responder(identidad, respuesta)
+        assert future.result(2)['asignacion'] == {'salones': ['S1']}
+        # La segunda es la misma respuesta (idempotencia): no se liberan sus recursos
+        while not router.nada_pendiente():
+            _, mensaje = router.recibir()
+            assert mensaje.get('tipo') != 'liberacion'
+    finally:
+        cliente.cerrar()
+
+
+def test_respuesta_de_una_solicitud_abandonada_devuelve_recursos(context, router):
+    cliente = _cliente(context, router, max_reintentos=0)
+    try:
+        future = cliente.enviar({'facultad': 'Artes', 'num_salones': 2})
+        identidad, original = router.recibir()
+        with pytest.raises(TimeoutError):
+            future.result(2)
+
+        router.responder(identidad, {
+            'id_peticion': original['id_peticion'], 'facultad': 'Artes', 'franja': '2025-1',
+            'asignacion': {'salones': ['S1', 'S2'], 'laboratorios': [], 'aulas_moviles': []}
+        })
+        _, liberacion = router.recibir()
+        assert liberacion['tipo'] == 'liberacion'
+        assert liberacion['salones'] == ['S1', 'S2'] and liberacion['franja'] == '2025-1'
+        assert original['id_peticion'] not in cliente.abandonadas
+
+        # Un duplicado posterior ya no libera otra vez
+        router.responder(identidad, {'id_peticion': original['id_peticion'],
+                                     'asignacion': {'salones': ['S1', 'S2']}})
+        assert router.nada_pendiente()
+    finally:
+        cliente.cerrar()
+
+
+def test_devolver_recursos_agrupa_por_franja(context, router):
+    cliente = _cliente(context, router)
+    try:
+        enviados = []
+
+        class DealerFalso:
+            def send_multipart(self, tramas):
+                enviados.append(JSON.decodificar(tramas[1]))
+
+        cliente._devolver_recursos(DealerFalso(), {
+            'facultad': 'Artes',
+            'respuestas': [
+                {'franja': 'a', 'asignacion': {'salones': ['S1']}},
+                {'franja': 'b', 'asignacion': {'laboratorios': ['L1']}},
+                {'franja': 'a', 'asignacion': {'salones': ['S2'], 'aulas_moviles': ['AM1']}},
+                {'franja': 'c', 'asignacion': None}
+            ]
+        })
+        por_franja = {liberacion['franja']: liberacion for liberacion in enviados}
+        assert set(por_franja) == {'a', 'b'}
+        assert por_franja['a']['salones'] == ['S1', 'S2'] and por_franja['a']['aulas_moviles'] == ['AM1']
+        assert por_franja['b']['laboratorios'] == ['L1']
+    finally:
+        cliente.cerrar()
+
+
+def test_ocupado_y_ventana(context, router):
+    cliente = _cliente(context, router, timeout_s=5, ventana=1)
+    try:
+        future = cliente.enviar({'facultad': 'Artes'})
+        identidad, mensaje = router.recibir()
+
+        # Con la ventana llena, el siguiente envío espera a que se resuelva el primero
+        segundo = []
+        hilo = threading.Thread(target=lambda: segundo.append(cliente.enviar({'facultad': 'Artes'})))
+        hilo.start()
+        hilo.join(0.3)
+        assert hilo.is_alive() and router.nada_pendiente(100)
+
+        router.responder(identidad, {'id_peticion': mensaje['id_peticion'], 'tipo': 'ocupado',
+                                     'error': 'cola llena', 'reintentar_ms': 50})
+        with pytest.raises(ServidorOcupado) as error:
+            future.result(2)
+        assert error.value.reintentar_ms == 50
+        hilo.join(2)
+        identidad, mensaje = router.recibir()
+        router.responder(identidad, {'id_peticion': mensaje['id_peticion']})
+        assert segundo[0].result(2) == {'id_peticion': mensaje['id_peticion']}
+    finally:
+        cliente.cerrar()
@@ -0,0 +1,42 @@
+import pytest
+
+import codec
+from codec import JSON, detectar_codec
+
+pytest.importorskip('msgpack')
+BINARIO = codec.BINARIO
+
+
+def test_json_ida_y_vuelta():
+    mensaje = {'facultad': 'Ciencias', 'num_salones': 3, 'lista': ['S1', 'S2']}
+    datos = JSON.codificar(mensaje)
+    assert detectar_codec(datos) is JSON
+    assert JSON.decodificar(datos) == mensaje
+
+
+def test_binario_compacta_listas_de_recursos():
+    salones = [f"S{i}" for i in range(1, 381)]
+    mensaje = {'asignacion': {'salones': salones, 'laboratorios': ['L3', 'L4'], 'no_asignados': None}}
+    datos = BINARIO.codificar(mensaje)
+
+    assert detectar_codec(datos) is BINARIO
+    assert BINARIO.decodificar(datos) == mensaje
+    assert len(datos) < len(JSON.codificar(mensaje)) / 10
+
+
+def test_binario_respeta_orden_y_huecos():
+    ids = ['L9', 'L10', 'L11', 'L2', 'L3', 'L40', 'L41', 'L42', 'L7']
+    assert BINARIO.decodificar(BINARIO.codificar({'ids': ids})) == {'ids': ids}
+
+
+@pytest.mark.parametrize('valores', [
+    ['S01', 'S2', 'S3', 'S4', 'S5', 'S6', 'S7', 'S8'],                # ceros a la izquierda
+    ['S1', 'L2', 'S3', 'S4', 'S5', 'S6', 'S7', 'S8'],                 # prefijos distintos
+    ['S1', 'S2', 'S3', 'S4', 'S5', 'S6', 'S7', 3],                    # tipos mezclados
+    ['S1', 'S2', 'S3', 'S4', 'S5', 'S6', 'S7', f"S{2 ** 32}"],        # número fuera de '>I'
+    [f"{'x' * 300}{i}" for i in range(1, 9)],                         # prefijo fuera de '>B'
+    ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h'],                         # sin número
+])
+def test_binario_listas_que_no_son_rangos(valores):
+    mensaje = {'valores': valores}
+    assert BINARIO.decodificar(BINARIO.codificar(mensaje)) == mensaje
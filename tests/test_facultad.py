@@ -0,0 +1,34 @@
+from facultad import ProgramasEnCurso
+
+
+def test_reenvio_en_vuelo_espera_la_misma_respuesta():
+    programas = ProgramasEnCurso(vigencia_s=60, max_programas=10)
+    clave, guardada = programas.recibir('Medicina', 'a1', 'req-1')
+    assert clave == ('Medicina', 'a1') and guardada is None
+    assert programas.recibir('Medicina', 'a1', 'req-2') == (None, None)
+
+    respuesta = {'asignacion': {'salones': ['S1']}}
+    assert programas.completar(clave, respuesta) == ['req-1', 'req-2']
+    # Ya respondida: el reenvío recibe la asignación guardada sin ir al servidor
+    assert programas.recibir('Medicina', 'a1', 'req-3') == (None, respuesta)
+    assert programas.ultima('Medicina') == ('a1', respuesta)
+
+
+def test_solicitud_nueva_y_sin_id_van_al_servidor():
+    programas = ProgramasEnCurso(vigencia_s=60, max_programas=10)
+    clave, _ = programas.recibir('Derecho', 'a1', 'r')
+    programas.completar(clave, {'asignacion': {}})
+    assert programas.recibir('Derecho', 'a2', 'r')[0] == ('Derecho', 'a2')
+    primera, _ = programas.recibir('Derecho', None, 'r')
+    segunda, _ = programas.recibir('Derecho', None, 'r')
+    assert primera and segunda and primera != segunda
+
+
+def test_errores_no_se_guardan_y_lru_acotado():
+    programas = ProgramasEnCurso(vigencia_s=60, max_programas=2)
+    clave, _ = programas.recibir('Artes', 'x', 'r')
+    programas.completar(clave, {'tipo': 'ocupado'})
+    assert programas.ultima('Artes') is None
+    for nombre in ('A', 'B', 'C'):
+        programas.completar(programas.recibir(nombre, '1', 'r')[0], {'asignacion': {}})
+    assert programas.ultima('A') is None and programas.ultima('C') is not None
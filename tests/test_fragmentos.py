@@ -0,0 +1,129 @@
+import threading
+
+import pytest
+import zmq
+
+from codec import JSON, detectar_codec
+from fragmentos import AsignadorFragmentado, ServidorFragmento
+
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    # Cada fragmento persiste en fragmento-N.* del directorio actual
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+class FragmentoEnHilo:
+    """ServidorFragmento atendido en un hilo por un ROUTER inproc.
+
+    Con `perder` > 0 procesa las próximas tomas pero no responde, como un
+    fragmento que se cae después de tomar.
+    """
+    def __init__(self, context, numero, num_fragmentos):
+        self.servidor = ServidorFragmento(numero, num_fragmentos, None)
+        self.endpoint = f"inproc://fragmento-{numero}"
+        self.socket = context.socket(zmq.ROUTER)
+        self.socket.bind(self.endpoint)
+        self.perder = 0
+        self.detenido = threading.Event()
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+
+    def _bucle(self):
+        while not self.detenido.is_set():
+            if not self.socket.poll(20):
+                continue
+            identidad, vacio, cuerpo = self.socket.recv_multipart()
+            mensaje = detectar_codec(cuerpo).decodificar(cuerpo)
+            respuesta = self.servidor.atender(mensaje)
+            if mensaje['op'] == 'tomar' and self.perder:
+                self.perder -= 1
+                continue
+            self.socket.send_multipart([identidad, vacio, JSON.codificar(respuesta)])
+
+    def cerrar(self):
+        self.detenido.set()
+        self.hilo.join()
+        self.socket.close()
+        self.servidor.registro.cerrar()
+
+
+@pytest.fixture
+def coordinado(directorio):
+    context = zmq.Context()
+    fragmentos = [FragmentoEnHilo(context, numero, 2) for numero in range(2)]
+    coordinador = AsignadorFragmentado([f.endpoint for f in fragmentos], context, timeout_ms=300)
+    coordinador.iniciar()
+    yield coordinador, fragmentos
+    coordinador.cerrar()
+    for fragmento in fragmentos:
+        fragmento.cerrar()
+    context.term()
+
+
+def test_operaciones_se_borran_al_confirmar_o_anular(directorio):
+    fragmento = ServidorFragmento(0, 2, None)
+    primera = fragmento.atender({'op': 'tomar', 'pedidos': {'salones': 2}, 'id_operacion': 'a'})
+    assert primera['ids']['salones'] == ['S1', 'S2']
+    fragmento.atender({'op': 'tomar', 'pedidos': {'salones': 1}, 'id_operacion': 'b', 'confirmar': ['a']})
+    assert list(fragmento.registro.datos['operaciones']) == ['b']
+
+    anulada = fragmento.atender({'op': 'anular', 'id_operacion': 'b'})
+    assert anulada['liberados']['salones'] == ['S3']
+    assert fragmento.registro.datos['operaciones'] == {}
+    fragmento.registro.cerrar()
+
+    # Tras reiniciar: las tomas confirmadas siguen ocupadas y no quedan operaciones
+    reiniciado = ServidorFragmento(0, 2, None)
+    assert reiniciado.registro.datos['operaciones'] == {}
+    assert reiniciado.asignador.disponibles('salones') == 190 - 2
+    reiniciado.registro.cerrar()
+
+
+def test_tomar_varios_reparte_entre_fragmentos_y_confirma(coordinado):
+    coordinador, fragmentos = coordinado
+    with coordinador.bloquear(['salones', 'laboratorios']):
+        tomados = coordinador.tomar_varios({'salones': 250, 'laboratorios': 5})
+    assert len(tomados['salones']) == 250 and len(set(tomados['salones'])) == 250
+    assert len(tomados['laboratorios']) == 5
+    assert coordinador.disponibles('salones') == 380 - 250
+
+    # Las confirmaciones viajan en el siguiente mensaje a cada fragmento
+    with coordinador.bloquear(['salones']):
+        assert len(coordinador.liberar('salones', tomados['salones'])) == 250
+    coordinador._llamar(1, {'op': 'estado'})
+    assert all(f.servidor.registro.datos['operaciones'] == {} for f in fragmentos)
+    assert coordinador.disponibles('salones') == 380
+
+
+def test_toma_perdida_se_cubre_en_otro_fragmento_y_se_anula(coordinado):
+    coordinador, fragmentos = coordinado
+    # El fragmento 0 queda con menos libres: el pedido siguiente va al 1
+    with coordinador.bloquear(['salones']):
+        coordinador.tomar('salones', 150)
+    fragmentos[1].perder = 1
+
+    with coordinador.bloquear(['salones']):
+        tomados = coordinador.tomar_varios({'salones': 30})
+    assert len(tomados['salones']) == 30
+    assert all(int(id_recurso[1:]) <= 190 for id_recurso in tomados['salones'])
+    assert 1 in coordinador.caidos and len(coordinador.anulaciones) == 1
+    # El fragmento tomó sin que el coordinador lo supiera
+    assert fragmentos[1].servidor.asignador.disponibles('salones') == 160
+
+    # Al recuperarse, la toma perdida se anula
+    coordinador.caidos[1] = 0
+    with coordinador.bloquear(['salones']):
+        coordinador.tomar_varios({})
+    assert 1 not in coordinador.caidos and coordinador.anulaciones == []
+    assert fragmentos[1].servidor.asignador.disponibles('salones') == 190
+    assert fragmentos[1].servidor.registro.datos['operaciones'] == {}
+
+
+def test_todo_o_nada_devuelve_lo_tomado(coordinado):
+    coordinador, fragmentos = coordinado
+    with coordinador.bloquear(['aulas_moviles']):
+        assert coordinador.tomar_varios({'aulas_moviles': 6}, todo_o_nada=True) == {'aulas_moviles': []}
+    assert coordinador.disponibles('aulas_moviles') == 5
+    assert sum(f.servidor.asignador.disponibles('aulas_moviles') for f in fragmentos) == 5
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from franjas import FranjasReserva, semestre, vencimiento_por_defecto
+
+CATALOGO = {
+    'salones': {'prefijo': 'S', 'cantidad': 4},
+    'laboratorios': {'prefijo': 'L', 'cantidad': 2},
+    'aulas_moviles': {'prefijo': 'AM', 'cantidad': 1},
+}
+
+
+def test_franjas_tienen_pools_independientes():
+    franjas = FranjasReserva(CATALOGO)
+    assert franjas.obtener('lunes-07', vence=100).tomar('salones', 4) == ['S1', 'S2', 'S3', 'S4']
+    assert franjas.obtener('martes-07', vence=100).tomar('salones', 1) == ['S1']
+    assert franjas.obtener('miercoles-07', crear=False) is None
+
+    assert franjas.disponibilidad('lunes-07') == {'salones': 0, 'laboratorios': 2, 'aulas_moviles': 1}
+    assert franjas.libres('lunes-07') == {'salones': [], 'laboratorios': ['L1', 'L2'], 'aulas_moviles': ['AM1']}
+    # Una franja sin reservas se consulta sobre los pools vacíos compartidos, sin crearla
+    assert franjas.disponibilidad('miercoles-07')['salones'] == 4
+    assert franjas.libres('miercoles-07')['salones'] == ['S1', 'S2', 'S3', 'S4']
+    assert franjas.obtener('miercoles-07', crear=False) is None
+
+
+def test_vencidas_descarta_franjas_y_respeta_extensiones():
+    franjas = FranjasReserva(CATALOGO)
+    franjas.obtener('a', vence=10).tomar('salones', 2)
+    franjas.obtener('b', vence=20)
+    franjas.obtener('a', vence=30)   # una reserva posterior extiende la franja
+
+    assert franjas.vencidas(ahora=25) == ['b']
+    assert franjas.vence('a') == 30 and len(franjas) == 1
+    assert franjas.vencidas(ahora=30) == ['a']
+    assert len(franjas) == 0 and franjas.heap == []
+
+
+def test_restaurar_recrea_la_ocupacion():
+    franjas = FranjasReserva(CATALOGO)
+    franjas.restaurar('a', 50, {'salones': ['S2'], 'laboratorios': ['L1', 'L2']})
+    assert franjas.libres('a') == {'salones': ['S1', 'S3', 'S4'], 'laboratorios': [], 'aulas_moviles': ['AM1']}
+    assert franjas.disponibilidad('a') == {'salones': 3, 'laboratorios': 0, 'aulas_moviles': 1}
+
+
+def test_semestres_vencen_al_terminar():
+    assert semestre(datetime(2025, 3, 15)) == ('2025-1', datetime(2025, 7, 1).timestamp())
+    assert semestre(datetime(2025, 9, 1))[0] == '2025-2'
+    assert vencimiento_por_defecto('2025-2/lunes-07') == datetime(2026, 1, 1).timestamp()
+    assert vencimiento_por_defecto('sala-x', ahora=1000) > 1000
+
+
+def test_franja_descartada_deja_de_estar_vigente():
+    franjas = FranjasReserva(CATALOGO)
+    asignador = franjas.obtener('a', vence=10)
+    assert franjas.vigente('a', asignador)
+    franjas.vencidas(ahora=10)
+    assert not franjas.vigente('a', asignador)
+    # Quien la vuelva a pedir recibe pools nuevos
+    assert franjas.obtener('a', vence=20) is not asignador
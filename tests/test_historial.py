@@ -0,0 +1,119 @@
+import json
+
+from historial import HistorialSolicitudes
+
+
+def _config(tmp_path, **cambios):
+    config = {
+        'solicitudes_file': str(tmp_path / 'solicitudes.json'),
+        'no_atendidas_file': str(tmp_path / 'solicitudes_no_atendidas.json'),
+        'log_file': str(tmp_path / 'registro.wal.jsonl'),
+        'snapshot_file': str(tmp_path / 'registro.snapshot.json'),
+        'base_file': str(tmp_path / 'registro.sqlite3'),
+        'intervalo_fsync_ms': 5,
+        'snapshot_cada': 1000,
+        'commit_sincrono': True,
+        'max_cache': 4,
+        'bloque_orden': 10
+    }
+    config.update(cambios)
+    return config
+
+
+def _solicitud(facultad, programa, segundo, estado='completa'):
+    return {'facultad': facultad, 'programa': programa, 'estado': estado,
+            'timestamp': f"2025-03-01 10:00:{segundo:02d}"}
+
+
+def test_compacta_a_la_base_y_libera_memoria(tmp_path):
+    historial = HistorialSolicitudes(_config(tmp_path, snapshot_cada=10))
+    historial.cargar()
+    historial.iniciar()
+    for i in range(25):
+        historial.registrar('solicitudes', f"s{i}", _solicitud('Artes', 'Danza', i))
+    historial.cerrar()
+
+    assert historial.tamanios()['recientes'] < 10
+    assert historial.tamanios()['cache'] <= 4
+
+    otro = HistorialSolicitudes(_config(tmp_path))
+    otro.cargar()
+    assert len(otro.solicitudes) == 25
+    assert otro.obtener('solicitudes', 's3')['timestamp'] == '2025-03-01 10:00:03'
+    assert otro.obtener('solicitudes', 'nada') is None
+
+
+def test_consulta_por_indices_mezcla_base_y_memoria(tmp_path):
+    historial = HistorialSolicitudes(_config(tmp_path, snapshot_cada=3))
+    historial.cargar()
+    historial.iniciar()
+    historial.registrar('solicitudes', 'a', _solicitud('Artes', 'Danza', 1))
+    historial.registrar('solicitudes', 'b', _solicitud('Ciencias', 'Física', 2, 'parcial'))
+    historial.registrar('solicitudes', 'c', _solicitud('Artes', 'Música', 3, 'parcial'))
+    historial.registrar('solicitudes', 'd', _solicitud('Artes', 'Danza', 4))
+    # Una actualización en memoria reemplaza a la versión compactada
+    historial.registrar('solicitudes', 'c', _solicitud('Artes', 'Música', 3, 'completa'))
+
+    def ids(**filtros):
+        return [id_registro for id_registro, _ in historial.consultar(**filtros)]
+
+    assert ids(facultad='Artes') == ['d', 'c', 'a']
+    assert ids(estado='parcial') == ['b']
+    assert ids(programa='Danza', limite=1) == ['d']
+    assert ids(desde='2025-03-01 10:00:02', hasta='2025-03-01 10:00:03') == ['c', 'b']
+    historial.cerrar()
+
+
+def test_ordenes_crecientes_tras_reiniciar(tmp_path):
+    historial = HistorialSolicitudes(_config(tmp_path))
+    historial.cargar()
+    historial.iniciar()
+    primero = historial.nuevo_orden()
+    historial.registrar('solicitudes', 'a', _solicitud('Artes', 'Danza', 1))
+    historial.cerrar()
+
+    otro = HistorialSolicitudes(_config(tmp_path))
+    otro.cargar()
+    assert otro.nuevo_orden() > primero
+
+
+def test_ordenes_entregados_sin_registrar_no_se_repiten(tmp_path):
+    historial = HistorialSolicitudes(_config(tmp_path))
+    historial.cargar()
+    historial.iniciar()
+    entregados = [historial.nuevo_orden() for _ in range(25)]
+    historial.registrar('solicitudes', 'a', _solicitud('Artes', 'Danza', 1))
+    historial.cerrar()
+
+    otro = HistorialSolicitudes(_config(tmp_path))
+    otro.cargar()
+    assert otro.nuevo_orden() > max(entregados)
+
+
+def test_actualizar_un_registro_fuera_de_la_cache_conserva_su_orden(tmp_path):
+    historial = HistorialSolicitudes(_config(tmp_path, snapshot_cada=1))
+    historial.cargar()
+    historial.iniciar()
+    for i, id_registro in enumerate('abcd'):
+        historial.registrar('solicitudes', id_registro, _solicitud('Artes', 'Danza', i))
+    historial.cerrar()
+
+    # Tras reiniciar la caché está vacía: el orden se lee de la base
+    otro = HistorialSolicitudes(_config(tmp_path))
+    otro.cargar()
+    otro.iniciar()
+    otro.registrar('solicitudes', 'a', _solicitud('Artes', 'Danza', 0, 'parcial'))
+    assert [id_registro for id_registro, _ in otro.consultar()] == ['d', 'c', 'b', 'a']
+    otro.cerrar()
+
+
+def test_importa_el_snapshot_json_anterior(tmp_path):
+    (tmp_path / 'registro.snapshot.json').write_text(json.dumps({
+        'solicitudes': {'viejo': _solicitud('Artes', 'Danza', 1)},
+        'solicitudes_no_atendidas': {'alerta': {'pendiente': True, 'timestamp': '2025-03-01 10:00:01'}}
+    }))
+    historial = HistorialSolicitudes(_config(tmp_path))
+    historial.cargar()
+
+    assert historial.solicitudes['viejo']['programa'] == 'Danza'
+    assert [id_registro for id_registro, _ in historial.consultar('solicitudes_no_atendidas', estado='pendiente')] == ['alerta']
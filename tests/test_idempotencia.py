@@ -0,0 +1,91 @@
+import time
+from concurrent.futures import Future
+
+from idempotencia import CacheRespuestas, clave_de
+from persistencia import RegistroPersistente
+
+
+def test_clave_acotada_por_facultad():
+    assert clave_de({'facultad': 'Artes', 'clave_idempotencia': 'x'}) != clave_de({'facultad': 'Derecho', 'clave_idempotencia': 'x'})
+    assert clave_de({'facultad': 'Artes'}) is None
+
+
+def test_reenvio_en_proceso_espera_y_luego_recibe_la_guardada():
+    cache = CacheRespuestas({'ttl_s': 60, 'max_respuestas': 10})
+    assert cache.reservar('k') is None
+    en_proceso = cache.reservar('k')
+    assert isinstance(en_proceso, Future) and not en_proceso.done()
+
+    cache.completar('k', {'asignacion': {'salones': ['S1']}})
+    assert en_proceso.result(0) == {'asignacion': {'salones': ['S1']}}
+    assert cache.reservar('k') == {'asignacion': {'salones': ['S1']}}
+
+
+def test_errores_no_se_guardan():
+    cache = CacheRespuestas({'ttl_s': 60, 'max_respuestas': 10})
+    cache.reservar('k')
+    cache.completar('k', {'error': 'x'}, guardar=False)
+    assert cache.reservar('k') is None
+
+
+def test_vencimiento_y_lru():
+    cache = CacheRespuestas({'ttl_s': 0.01, 'max_respuestas': 2})
+    cache.guardar('a', 1)
+    time.sleep(0.02)
+    assert cache.reservar('a') is None and cache.copia() == {}
+
+    cache = CacheRespuestas({'ttl_s': 60, 'max_respuestas': 2})
+    for clave in ('a', 'b', 'c'):
+        cache.guardar(clave, clave)
+    assert list(cache.copia()) == ['b', 'c']
+    replica = CacheRespuestas({'ttl_s': 60, 'max_respuestas': 2})
+    replica.restaurar(cache.copia())
+    assert replica.reservar('c') == 'c'
+
+
+def _registro(tmp_path):
+    return RegistroPersistente({
+        'log_file': str(tmp_path / 'respuestas.wal.jsonl'),
+        'snapshot_file': str(tmp_path / 'respuestas.snapshot.json'),
+        'intervalo_fsync_ms': 5,
+        'snapshot_cada': 1000,
+        'commit_sincrono': True
+    }, colecciones=('respuestas',))
+
+
+def test_respuestas_sobreviven_a_un_reinicio(tmp_path):
+    config = {'ttl_s': 60, 'max_respuestas': 2}
+    cache = CacheRespuestas(config, _registro(tmp_path))
+    cache.cargar()
+    for clave in ('a', 'b', 'c'):
+        cache.reservar(clave)
+        cache.completar(clave, {'asignacion': {'salones': [clave]}})
+    cache.reservar('d')
+    cache.completar('d', {'error': 'x'}, guardar=False)
+    cache.cerrar()
+
+    # Tras el reinicio, el reenvío de 'c' recibe su respuesta sin procesarse otra vez
+    reiniciada = CacheRespuestas(config, _registro(tmp_path))
+    reiniciada.cargar()
+    assert reiniciada.reservar('c') == {'asignacion': {'salones': ['c']}}
+    assert list(reiniciada.copia()) == ['b', 'c']
+    assert reiniciada.reservar('a') is None and reiniciada.reservar('d') is None
+    # Lo que sale del LRU se borra del registro en el lote de la respuesta siguiente
+    reiniciada.completar('a', {'asignacion': {}})
+    reiniciada.guardar('e', {'asignacion': {}})
+    assert set(reiniciada.registro.datos['respuestas']) == {'a', 'c', 'e'}
+    assert reiniciada.descartadas == ['c'] and list(reiniciada.copia()) == ['a', 'e']
+    reiniciada.cerrar()
+
+
+def test_respuestas_vencidas_no_se_restauran(tmp_path):
+    cache = CacheRespuestas({'ttl_s': 0.05, 'max_respuestas': 10}, _registro(tmp_path))
+    cache.cargar()
+    cache.guardar('a', 1)
+    cache.cerrar()
+    time.sleep(0.06)
+
+    reiniciada = CacheRespuestas({'ttl_s': 0.05, 'max_respuestas': 10}, _registro(tmp_path))
+    reiniciada.cargar()
+    assert len(reiniciada) == 0 and reiniciada.reservar('a') is None
+    reiniciada.cerrar()
@@ -0,0 +1,50 @@
+from ingreso import ColaJusta
+
+
+def vaciar(cola):
+    salida = []
+    while len(cola):
+        salida.append(cola.siguiente())
+    return salida
+
+
+def test_turnos_alternan_entre_facultades():
+    cola = ColaJusta(max_total=100, max_por_flujo=100)
+    for i in range(4):
+        cola.agregar('inunda', f"i{i}")
+    cola.agregar('tranquila', 't0')
+    cola.agregar('tranquila', 't1')
+
+    assert vaciar(cola) == ['i0', 't0', 'i1', 't1', 'i2', 'i3']
+    assert cola.siguiente() is None
+
+
+def test_pesos_reparten_en_proporcion():
+    cola = ColaJusta(max_total=100, max_por_flujo=100, pesos={'a': 2, 'c': 0.5})
+    for i in range(12):
+        cola.agregar('a', 'a')
+        cola.agregar('b', 'b')
+        cola.agregar('c', 'c')
+
+    primeros = vaciar(cola)[:14]
+    assert primeros.count('a') == 8 and primeros.count('b') == 4 and primeros.count('c') == 2
+
+
+def test_admision_rechaza_con_cola_llena():
+    cola = ColaJusta(max_total=3, max_por_flujo=2)
+    assert cola.agregar('a', 1) and cola.agregar('a', 2)
+    assert not cola.agregar('a', 3)          # cupo de la facultad
+    assert cola.agregar('b', 4)
+    assert not cola.agregar('c', 5)          # cupo total
+    cola.siguiente()
+    assert cola.agregar('c', 5)
+
+
+def test_flujo_vaciado_no_acumula_credito():
+    cola = ColaJusta(max_total=100, max_por_flujo=100, pesos={'a': 3})
+    cola.agregar('a', 'a0')
+    assert cola.siguiente() == 'a0'
+    for i in range(3):
+        cola.agregar('a', f"a{i + 1}")
+        cola.agregar('b', f"b{i}")
+    assert vaciar(cola) == ['a1', 'a2', 'a3', 'b0', 'b1', 'b2']
@@ -0,0 +1,29 @@
+from metricas import Histograma, Metricas
+
+
+def test_histograma_percentiles_por_cubeta():
+    histograma = Histograma()
+    for _ in range(90):
+        histograma.observar(0.000_050)   # 50 µs -> cubeta [32, 64) µs
+    for _ in range(10):
+        histograma.observar(0.010)       # 10 ms -> cubeta [8192, 16384) µs
+
+    resumen = histograma.resumen()
+    assert resumen['cantidad'] == 100
+    assert resumen['p50_ms'] == 0.064
+    assert resumen['p95_ms'] == resumen['p99_ms'] == 16.384
+    assert resumen['max_ms'] == 10.0
+    assert resumen['cubetas_us'] == {'64': 90, '16384': 10}
+
+
+def test_metricas_contadores_y_medicion():
+    metricas = Metricas()
+    metricas.incrementar('solicitudes.asignacion')
+    metricas.incrementar('asignados.salones', 3)
+    with metricas.medir('asignar'):
+        pass
+
+    resumen = metricas.resumen()
+    assert resumen['contadores'] == {'solicitudes.asignacion': 1, 'asignados.salones': 3}
+    assert resumen['latencias']['asignar']['cantidad'] == 1
+    assert Histograma().resumen()['p99_ms'] == 0.0
@@ -0,0 +1,108 @@
+import os
+import time
+
+from asignador import AsignadorRecursos
+from franjas import FranjasReserva
+import ocupacion as modulo_ocupacion
+from ocupacion import EstadoOcupacion
+
+CATALOGO = {
+    'salones': {'prefijo': 'S', 'cantidad': 10},
+    'laboratorios': {'prefijo': 'L', 'cantidad': 4},
+    'aulas_moviles': {'prefijo': 'AM', 'cantidad': 2},
+}
+
+
+def _config(tmp_path, **cambios):
+    config = {
+        'snapshot_file': str(tmp_path / 'ocupacion.snapshot.bin'),
+        'diario_file': str(tmp_path / 'ocupacion.diario.bin'),
+        'intervalo_s': 0.01,
+        'snapshot_cada': 1000
+    }
+    config.update(cambios)
+    return config
+
+
+def _estado(asignador, franjas):
+    return (
+        {tipo: asignador.pool(tipo).ids_asignados() for tipo in AsignadorRecursos.TIPOS},
+        {franja: (franjas.vence(franja), {tipo: a.pool(tipo).ids_asignados() for tipo in AsignadorRecursos.TIPOS})
+         for franja, a in franjas.asignadores.items()}
+    )
+
+
+def _restaurado(tmp_path):
+    asignador, franjas = AsignadorRecursos(CATALOGO), FranjasReserva(CATALOGO)
+    ocupacion = EstadoOcupacion(_config(tmp_path))
+    aplicadas = ocupacion.restaurar(asignador, franjas)
+    ocupacion.cerrar()
+    return asignador, franjas, aplicadas
+
+
+def test_snapshot_y_diario_restauran_la_ocupacion(tmp_path):
+    asignador, franjas = AsignadorRecursos(CATALOGO), FranjasReserva(CATALOGO)
+    ocupacion = EstadoOcupacion(_config(tmp_path))
+    assert ocupacion.restaurar(asignador, franjas) == 0
+
+    vence = time.time() + 3600
+    ocupacion.tomados(None, None, asignador.tomar_varios({'salones': 3, 'laboratorios': 1}), asignador)
+    semestre = franjas.obtener('2025-1', vence)
+    ocupacion.tomados('2025-1', vence, semestre.tomar_varios({'salones': 5}), semestre)
+    ocupacion.guardar(asignador, franjas)
+
+    # Después del snapshot: solo en el diario
+    ocupacion.liberados(None, {'salones': asignador.liberar('salones', ['S2'])}, asignador)
+    ocupacion.tomados(None, None, {'aulas_moviles': asignador.tomar('aulas_moviles', 1)}, asignador)
+    ocupacion.tomados('2025-2', vence, franjas.obtener('2025-2', vence).tomar_varios({'salones': 1}),
+                      franjas.obtener('2025-2'))
+    ocupacion.cerrar()
+
+    restaurado, franjas_restauradas, aplicadas = _restaurado(tmp_path)
+    assert aplicadas == 3
+    assert _estado(restaurado, franjas_restauradas) == _estado(asignador, franjas)
+    # Las liberaciones del diario vuelven al final de la lista libre, como en vivo
+    assert restaurado.tomar('salones', 2) == asignador.tomar('salones', 2) == ['S4', 'S5']
+
+
+def test_vencimiento_y_diario_truncado(tmp_path):
+    asignador, franjas = AsignadorRecursos(CATALOGO), FranjasReserva(CATALOGO)
+    ocupacion = EstadoOcupacion(_config(tmp_path))
+    ocupacion.restaurar(asignador, franjas)
+    franja = franjas.obtener('taller', time.time() + 60)
+    ocupacion.tomados('taller', franjas.vence('taller'), franja.tomar_varios({'laboratorios': 2}), franja)
+    franjas.eliminar('taller')
+    ocupacion.vencidas(['taller'])
+    ocupacion.tomados(None, None, {'salones': asignador.tomar('salones', 2)}, asignador)
+    ocupacion.cerrar()
+
+    # Una caída a mitad de escritura deja una entrada incompleta al final
+    with open(tmp_path / 'ocupacion.diario.bin', 'ab') as f:
+        f.write(b'T\x00\x00')
+    restaurado, franjas_restauradas, aplicadas = _restaurado(tmp_path)
+    assert aplicadas == 3 and len(franjas_restauradas) == 0
+    assert restaurado.pool('salones').ids_asignados() == ['S1', 'S2']
+    assert _restaurado(tmp_path)[2] == 3
+
+
+def test_sincronizar_no_usa_el_descriptor_del_diario_cerrado(tmp_path, monkeypatch):
+    asignador, franjas = AsignadorRecursos(CATALOGO), FranjasReserva(CATALOGO)
+    ocupacion = EstadoOcupacion(_config(tmp_path))
+    ocupacion.restaurar(asignador, franjas)
+    ocupacion.tomados(None, None, {'salones': asignador.tomar('salones', 2)}, asignador)
+
+    # Mientras se espera al disco, un snapshot reemplaza el diario y otro hilo lo cierra
+    fsync = os.fsync
+
+    def fsync_tras_cerrar(descriptor):
+        monkeypatch.setattr(modulo_ocupacion.os, 'fsync', fsync)
+        ocupacion.guardar(asignador, franjas)
+        ocupacion.cerrar()
+        fsync(descriptor)
+
+    monkeypatch.setattr(modulo_ocupacion.os, 'fsync', fsync_tras_cerrar)
+    ocupacion.sincronizar()
+
+    restaurado, _, aplicadas = _restaurado(tmp_path)
+    assert aplicadas == 0
+    assert restaurado.pool('salones').ids_asignados() == ['S1', 'S2']
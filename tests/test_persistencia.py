@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+import persistencia
+from persistencia import RegistroPersistente
+
+
+def _config(tmp_path, **cambios):
+    config = {
+        'solicitudes_file': str(tmp_path / 'solicitudes.json'),
+        'no_atendidas_file': str(tmp_path / 'solicitudes_no_atendidas.json'),
+        'log_file': str(tmp_path / 'registro.wal.jsonl'),
+        'snapshot_file': str(tmp_path / 'registro.snapshot.json'),
+        'intervalo_fsync_ms': 5,
+        'snapshot_cada': 1000,
+        'commit_sincrono': True
+    }
+    config.update(cambios)
+    return config
+
+
+def _linea(coleccion, id_registro, datos):
+    return json.dumps({'coleccion': coleccion, 'id': id_registro, 'datos': datos})
+
+
+def test_reproduce_snapshot_y_log(tmp_path):
+    config = _config(tmp_path)
+    (tmp_path / 'registro.snapshot.json').write_text(json.dumps({
+        'solicitudes': {'a': 1, 'b': 2}, 'solicitudes_no_atendidas': {}
+    }))
+    (tmp_path / 'registro.wal.jsonl').write_text(
+        _linea('solicitudes', 'b', 20) + '\n' + _linea('solicitudes_no_atendidas', 'c', 3) + '\n'
+    )
+
+    registro = RegistroPersistente(config)
+    registro.cargar()
+
+    assert registro.solicitudes == {'a': 1, 'b': 20}
+    assert registro.solicitudes_no_atendidas == {'c': 3}
+    assert registro.registros_en_log == 2
+
+
+def test_descarta_y_recorta_linea_final_incompleta(tmp_path):
+    config = _config(tmp_path)
+    log = tmp_path / 'registro.wal.jsonl'
+    log.write_text(_linea('solicitudes', 'a', 1) + '\n' + '{"coleccion": "solici')
+
+    registro = RegistroPersistente(config)
+    registro.cargar()
+    assert registro.solicitudes == {'a': 1}
+
+    # Lo que se escriba después no debe quedar pegado a la línea truncada
+    registro.iniciar()
+    registro.registrar('solicitudes', 'b', 2)
+    registro.cerrar()
+
+    otro = RegistroPersistente(config)
+    otro.cargar()
+    assert otro.solicitudes == {'a': 1, 'b': 2}
+
+
+def test_linea_corrupta_en_medio_del_log_es_error(tmp_path):
+    config = _config(tmp_path)
+    (tmp_path / 'registro.wal.jsonl').write_text(
+        _linea('solicitudes', 'a', 1) + '\nbasura\n' + _linea('solicitudes', 'b', 2) + '\n'
+    )
+
+    with pytest.raises(ValueError):
+        RegistroPersistente(config).cargar()
+
+
+def test_compactacion_conserva_todo_y_trunca_el_log(tmp_path):
+    config = _config(tmp_path, snapshot_cada=10)
+    registro = RegistroPersistente(config)
+    registro.cargar()
+    registro.iniciar()
+    for i in range(25):
+        registro.registrar('solicitudes', f"s{i}", i)
+    registro.cerrar()
+
+    assert (tmp_path / 'registro.snapshot.json').exists()
+    assert len((tmp_path / 'registro.wal.jsonl').read_text().splitlines()) < 10
+
+    otro = RegistroPersistente(config)
+    otro.cargar()
+    assert otro.solicitudes == {f"s{i}": i for i in range(25)}
+
+
+def test_datos_none_borran_el_registro(tmp_path):
+    config = _config(tmp_path, snapshot_cada=3)
+    registro = RegistroPersistente(config)
+    registro.cargar()
+    registro.iniciar()
+    for i in range(4):
+        registro.registrar('solicitudes', f"s{i}", i)
+    registro.registrar_lote([('solicitudes', 's0', None), ('solicitudes', 's3', None)])
+    assert registro.solicitudes == {'s1': 1, 's2': 2}
+    registro.cerrar()
+
+    otro = RegistroPersistente(config)
+    otro.cargar()
+    assert otro.solicitudes == {'s1': 1, 's2': 2}
+
+
+def test_importa_archivos_del_formato_anterior(tmp_path):
+    config = _config(tmp_path)
+    (tmp_path / 'solicitudes.json').write_text(json.dumps({'viejo': {'x': 1}}))
+
+    registro = RegistroPersistente(config)
+    registro.cargar()
+
+    assert registro.solicitudes == {'viejo': {'x': 1}}
+    assert (tmp_path / 'registro.snapshot.json').exists()
+
+
+def test_fallo_de_fsync_no_confirma_hasta_reintentar(tmp_path, monkeypatch):
+    fsync_real = persistencia.os.fsync
+    fallos = []
+
+    def fsync_que_falla_una_vez(descriptor):
+        if not fallos:
+            fallos.append(descriptor)
+            raise OSError("disco lleno")
+        fsync_real(descriptor)
+
+    monkeypatch.setattr(persistencia.os, 'fsync', fsync_que_falla_una_vez)
+    config = _config(tmp_path)
+    registro = RegistroPersistente(config)
+    registro.cargar()
+    registro.iniciar()
+    registro.registrar('solicitudes', 'a', 1)
+    registro.cerrar()
+
+    assert fallos
+    lineas = (tmp_path / 'registro.wal.jsonl').read_text().splitlines()
+    assert [json.loads(linea)['id'] for linea in lineas] == ['a']
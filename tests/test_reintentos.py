@@ -0,0 +1,29 @@
+from reintentos import ColaReintentos
+
+
+def pendiente(creado, **faltantes):
+    return {'creado': creado, 'recursos_faltantes': faltantes}
+
+
+def test_extrae_del_mas_antiguo_al_mas_reciente():
+    cola = ColaReintentos()
+    cola.agregar('b', pendiente(20, salones=1))
+    cola.agregar('a', pendiente(10, salones=2))
+    cola.agregar('c', pendiente(30, laboratorios=1))
+    assert [id_solicitud for id_solicitud, _ in cola.extraer()] == ['a', 'b', 'c']
+    assert len(cola) == 0 and cola.extraer() == []
+
+
+def test_reemplazar_un_pendiente_no_lo_duplica():
+    cola = ColaReintentos()
+    cola.agregar('a', pendiente(10, salones=3))
+    cola.agregar('a', pendiente(10, salones=1))
+    assert cola.extraer() == [('a', pendiente(10, salones=1))]
+
+
+def test_aviso_de_liberacion():
+    cola = ColaReintentos()
+    assert not cola.esperar(0)
+    cola.avisar()
+    assert cola.esperar(0)
+    assert not cola.esperar(0)
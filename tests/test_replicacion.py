@@ -0,0 +1,148 @@
+import socket
+import threading
+import time
+
+import pytest
+import zmq
+
+import config
+from cliente import ClienteServidor
+from codec import JSON, detectar_codec
+from replicacion import PublicadorReplica, SuscriptorReplica
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _esperar(condicion, segundos=3.0):
+    limite = time.monotonic() + segundos
+    while not condicion():
+        if time.monotonic() > limite:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    # Puertos propios de la prueba; el cliente lee la configuración global
+    monkeypatch.setitem(config.REPLICA_CONFIG, 'puerto_eventos', _puerto_libre())
+    monkeypatch.setitem(config.REPLICA_CONFIG, 'puerto_sincronizacion', _puerto_libre())
+    return config.REPLICA_CONFIG
+
+
+@pytest.fixture
+def context():
+    context = zmq.Context()
+    yield context
+    context.term()
+
+
+class ServidorFalso:
+    """ROUTER que responde cada solicitud con su puerto, más su publicador de réplica"""
+    def __init__(self, context, identidad=None):
+        self.socket = context.socket(zmq.ROUTER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.puerto = self.socket.bind_to_random_port('tcp://127.0.0.1')
+        self.publicador = PublicadorReplica(context, lambda: {'secuencia': 0}, identidad=self.puerto)
+        self.detenido = threading.Event()
+        self.hilo = None
+
+    def iniciar(self):
+        self.publicador.iniciar()
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+
+    def _bucle(self):
+        while not self.detenido.is_set():
+            if self.socket.poll(20):
+                identidad, vacio, cuerpo = self.socket.recv_multipart()
+                mensaje = detectar_codec(cuerpo).decodificar(cuerpo)
+                self.socket.send_multipart([identidad, vacio, JSON.codificar({
+                    'id_peticion': mensaje['id_peticion'], 'servidor': self.puerto
+                })])
+
+    def caer(self):
+        """Deja de publicar y de responder (lo que le llegue se pierde)"""
+        self.publicador.cerrar()
+        self.detenido.set()
+        if self.hilo:
+            self.hilo.join()
+
+    def cerrar(self):
+        self.caer()
+        self.socket.close()
+
+
+def test_respaldo_aplica_estado_y_eventos_y_detecta_la_caida(context, replica):
+    aplicados = []
+    estado = {'secuencia': 0, 'recursos': ['S1']}
+    publicador = PublicadorReplica(context, lambda: dict(estado, secuencia=publicador.secuencia), replica)
+    publicador.iniciar()
+
+    suscriptor = SuscriptorReplica(context, '127.0.0.1', lambda e: aplicados.append(('estado', e['recursos'])),
+                                   lambda tipo, datos: aplicados.append((tipo, datos)), replica)
+    hilo = threading.Thread(target=suscriptor.seguir, daemon=True)
+    hilo.start()
+    assert _esperar(lambda: suscriptor.secuencia is not None)
+
+    # Los eventos publicados tras la sincronización llegan en orden
+    for i in range(3):
+        publicador.publicar('asignacion', {'n': i})
+    assert _esperar(lambda: suscriptor.secuencia == 3)
+    assert aplicados == [('estado', ['S1'])] + [('asignacion', {'n': i}) for i in range(3)]
+
+    # Sin heartbeats, seguir() termina: el respaldo puede promoverse
+    publicador.cerrar()
+    hilo.join(3)
+    assert not hilo.is_alive()
+
+
+def test_cliente_conmuta_aunque_el_respaldo_publique_en_el_mismo_puerto(context, replica):
+    primario = ServidorFalso(context)
+    respaldo = ServidorFalso(context)
+    primario.iniciar()
+    cliente = ClienteServidor('127.0.0.1', primario.puerto, context=context,
+                              respaldos=[('127.0.0.1', respaldo.puerto)])
+    cliente.timeout_reintento = 5
+    cliente.iniciar()
+    try:
+        assert cliente.enviar({'facultad': 'Artes'}).result(3)['servidor'] == primario.puerto
+        assert _esperar(lambda: cliente.ultimo_heartbeat is not None)
+
+        # El primario cae y el respaldo se promueve enseguida en el mismo puerto de eventos
+        primario.caer()
+        respaldo.iniciar()
+        pendiente = cliente.enviar({'facultad': 'Artes'})
+        assert pendiente.result(3)['servidor'] == respaldo.puerto
+        assert cliente.actual == 1
+
+        # Ya en el respaldo, sus heartbeats lo mantienen ahí
+        time.sleep(0.6)
+        assert cliente.actual == 1
+    finally:
+        cliente.cerrar()
+        primario.cerrar()
+        respaldo.cerrar()
+
+
+def test_cliente_abandona_un_servidor_que_nunca_envia_heartbeats(context, replica):
+    primario = ServidorFalso(context)
+    respaldo = ServidorFalso(context)
+    primario.iniciar()
+    cliente = ClienteServidor('127.0.0.1', primario.puerto, context=context,
+                              respaldos=[('127.0.0.1', respaldo.puerto)])
+    cliente.iniciar()
+    try:
+        assert _esperar(lambda: cliente.ultimo_heartbeat is not None)
+        primario.caer()
+        assert _esperar(lambda: cliente.actual == 1)
+        # El respaldo no se promovió: el cliente no queda fijo en él
+        assert _esperar(lambda: cliente.actual == 0)
+    finally:
+        cliente.cerrar()
+        primario.cerrar()
+        respaldo.cerrar()
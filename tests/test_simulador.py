@@ -0,0 +1,48 @@
+from simulador import ProgramaVirtual, clasificar, liberacion, nombres_facultades, percentil, repartir
+
+
+def secuencia(programa, cantidad):
+    return [programa.siguiente() for _ in range(cantidad)]
+
+
+def test_misma_semilla_misma_secuencia():
+    a = secuencia(ProgramaVirtual('Artes', 3, semilla=7), 20)
+    b = secuencia(ProgramaVirtual('Artes', 3, semilla=7), 20)
+    assert a == b
+    assert a != secuencia(ProgramaVirtual('Artes', 4, semilla=7), 20)
+    assert a != secuencia(ProgramaVirtual('Artes', 3, semilla=8), 20)
+    assert len({solicitud['id_peticion'] for _, solicitud in a}) == 20
+    assert all(3 <= espera <= 10 for espera, _ in a)
+
+
+def test_secuencia_no_depende_del_orden_de_los_programas():
+    # Intercalar otro programa (como hace el loop de un proceso) no altera la secuencia
+    a, otro = ProgramaVirtual('Artes', 1, semilla=1), ProgramaVirtual('Artes', 2, semilla=1)
+    intercalada = []
+    for _ in range(10):
+        otro.siguiente()
+        intercalada.append(a.siguiente())
+    assert intercalada == secuencia(ProgramaVirtual('Artes', 1, semilla=1), 10)
+
+
+def test_repartir_cubre_cada_programa_una_vez():
+    facultades = nombres_facultades(7)
+    assert facultades[-1] == 'Facultad-6' and len(set(facultades)) == 7
+    reparto = repartir(facultades, 10, 3)
+    assert len(reparto) == 3
+    programas = sorted((facultad, programa) for asignados in reparto
+                       for facultad, numeros in asignados.items() for programa in numeros)
+    assert programas == sorted((facultad, programa) for facultad in facultades for programa in range(10))
+    assert len(repartir(facultades[:1], 2, 4)) == 2
+
+
+def test_clasificar_respuestas_y_liberacion():
+    assert clasificar({'tipo': 'ocupado', 'reintentar_ms': 50}) == 'ocupado'
+    assert clasificar({'error': 'facultad no válida'}) == 'error'
+    assert clasificar({'asignacion': {'salones': ['S1'], 'no_asignados': {'salones': 1}}}) == 'parcial'
+    assert clasificar({'asignacion': {'salones': ['S1']}}) == 'completa'
+
+    devolucion = liberacion('Artes', {'salones': ['S1'], 'laboratorios': ['L2']}, '2025-1')
+    assert devolucion == {'tipo': 'liberacion', 'facultad': 'Artes', 'salones': ['S1'],
+                          'laboratorios': ['L2'], 'aulas_moviles': [], 'franja': '2025-1'}
+    assert percentil([1, 2, 3, 4, 5], 50) == 3 and percentil([], 99) is None
@@ -0,0 +1,67 @@
+from tablero import Demanda, formatear
+
+
+def test_tasas_suavizadas():
+    demanda = Demanda(alfa=0.5)
+    demanda.inicio = 0.0
+    for _ in range(8):
+        demanda.registrar('Artes', {'salones': 2, 'laboratorios': 1}, 1)
+    demanda.cerrar_intervalo(ahora=2.0)
+    assert demanda.tasa_solicitudes == 2.0
+    tasas = demanda.tasa_facultades['Artes']
+    assert tasas['pedidos_por_s'] == {'salones': 4.0, 'laboratorios': 2.0}
+    assert tasas['faltantes_por_s'] == 2.0
+
+    demanda.registrar('Derecho', {'salones': 4}, 0)
+    demanda.cerrar_intervalo(ahora=4.0)
+    assert demanda.tasa_solicitudes == 1.25
+    assert demanda.tasa_facultades['Artes']['pedidos_por_s']['salones'] == 2.0
+    # La suma de las facultades es la tasa total
+    assert sum(tasas['solicitudes_por_s'] for tasas in demanda.tasa_facultades.values()) == 1.25
+
+
+def test_agotamiento_por_consumo_neto():
+    demanda = Demanda(alfa=1.0)
+    demanda.inicio = 0.0
+    demanda.tomados(None, {'salones': ['S1', 'S2', 'S3', 'S4'], 'laboratorios': []})
+    demanda.liberados(None, 'salones', 2)
+    demanda.tomados('2025-1', {'laboratorios': ['L1']})
+    demanda.liberados('2025-1', 'laboratorios', 1)
+    demanda.cerrar_intervalo(ahora=1.0)
+
+    resumen = demanda.resumen([
+        (None, {'salones': {'asignados': 80, 'total': 100}, 'aulas_moviles': {'asignados': 5, 'total': 5}}),
+        ('2025-1', {'laboratorios': {'asignados': 3, 'total': 60}})
+    ])
+    pools = {(pool['franja'], pool['tipo']): pool for pool in resumen['pools']}
+    assert pools[(None, 'salones')]['consumo_por_s'] == 2.0
+    assert pools[(None, 'salones')]['agotamiento_s'] == 10.0
+    assert pools[(None, 'salones')]['utilizacion'] == 0.8
+    # Agotado sin consumo: 0; sin consumo neto y con libres: sin estimación
+    assert pools[(None, 'aulas_moviles')]['agotamiento_s'] == 0.0
+    assert pools[('2025-1', 'laboratorios')]['agotamiento_s'] is None
+
+
+def test_facultades_inactivas_y_franjas_vencidas_salen_del_tablero():
+    demanda = Demanda(alfa=1.0)
+    demanda.inicio = 0.0
+    demanda.registrar('Artes', {'salones': 1}, 0)
+    demanda.tomados('2025-1', {'salones': ['S1']})
+    demanda.cerrar_intervalo(ahora=1.0)
+    assert 'Artes' in demanda.tasa_facultades
+
+    demanda.olvidar(['2025-1'])
+    demanda.cerrar_intervalo(ahora=2.0)
+    assert demanda.tasa_facultades == {}
+    assert demanda.tasa_consumo == {}
+
+
+def test_formatear():
+    demanda = Demanda(alfa=1.0)
+    demanda.inicio = 0.0
+    demanda.registrar('Ingeniería', {'salones': 3}, 0)
+    demanda.tomados(None, {'salones': ['S1']})
+    demanda.cerrar_intervalo(ahora=1.0)
+    texto = formatear(demanda.resumen([(None, {'salones': {'asignados': 1, 'total': 11}})]))
+    assert '(permanentes)' in texto and 'Ingeniería' in texto
+    assert '0m 10s' in texto